@@ -6,9 +6,11 @@ Provides high-performance API routes for searching and admin functions
 import os
 import time
 import json
+import asyncio
 import traceback
 from typing import Dict, Any, List, Optional, Union
 import logging
+import numpy as np
 from fastapi import FastAPI, Depends, HTTPException, Query, Form, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -19,8 +21,15 @@ from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # Import custom modules
-from faiss_index_manager import FAISSIndexManager
-from vector_embeddings_manager import cached_get_embedding, get_embeddings_manager
+from index_backend import create_index_manager
+from nic_hierarchy import DEFAULT_ROLLUP_TOP_N, MAX_ROLLUP_TOP_N, hierarchy_descriptions
+from index_generation import IndexGenerations
+from embedding_sidecar import load_documents
+from response_cache import ResponseCache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS
+from multi_field_index import MultiFieldIndex, VECTOR_FIELDS, parse_field_weights
+from runtime_config import apply_runtime_config, get_runtime_config
+from async_executor import ExecutorSaturatedError, get_search_executor
+from vector_embeddings_manager import cached_get_embedding, get_embeddings_manager, get_manager_registry
 from flask_compat import configure_templates
 
 # Configure logging
@@ -35,6 +44,9 @@ templates = configure_templates(templates)
 # Load environment variables
 load_dotenv()
 
+# Size the FAISS and torch thread pools of this worker from the CPU budget (see start_api.py --cpu-budget)
+apply_runtime_config()
+
 # Configure the application
 app = FastAPI(
     title="NIC Code Semantic Search API",
@@ -62,13 +74,36 @@ json_file_path = os.path.join(os.path.dirname(__file__), "output.json")
 # Global variable to store data from JSON file
 json_data = []
 
+# Documents keyed by their ID, for constant time lookups of search results
+documents_by_id = {}
+
+# Description of every Section / Division / Group / Class code, for hierarchy roll-ups
+code_descriptions = {}
+
+# Search mode settings: how many extra results to fetch and the minimum similarity
+SEARCH_MULTIPLIERS = {
+    "standard": 2,
+    "strict": 3,
+    "relaxed": 4
+}
+SIMILARITY_THRESHOLDS = {
+    "standard": 0.5,
+    "strict": 0.7,
+    "relaxed": 0.3
+}
+
+# Maximum number of queries accepted by the batch search endpoint
+MAX_BATCH_QUERIES = 1000
+
 # Load JSON data
 def load_json_data():
     """Load data from local JSON file"""
-    global json_data
+    global json_data, documents_by_id, code_descriptions
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            json_data = json.load(file)
+        # Documents are kept without their embeddings, the vectors live in the FAISS index
+        json_data = load_documents(json_file_path)
+        documents_by_id = {str(doc.get("_id")): doc for doc in json_data}
+        code_descriptions = hierarchy_descriptions(json_data)
         logger.info(f"Loaded {len(json_data)} records from JSON file")
         return True
     except Exception as e:
@@ -76,8 +111,45 @@ def load_json_data():
         logger.error(traceback.format_exc())
         return False
 
-# Initialize FAISS manager with the JSON file path
-faiss_manager = FAISSIndexManager(json_file_path=json_file_path)
+def create_faiss_manager(index_path=None, id_map_path=None, params_path=None):
+    """Create the index manager for the JSON file and the given index files (default: the default files), configured through the environment"""
+    # The backend (INDEX_BACKEND), the index type and query-time knobs can be configured through the environment
+    return create_index_manager(
+        json_file_path=json_file_path,
+        index_path=index_path,
+        id_map_path=id_map_path,
+        params_path=params_path,
+        index_type=os.environ.get("FAISS_INDEX_TYPE", "flat"),
+        # Optional learned dimensionality reduction ("pca" or "opq") applied before indexing
+        index_params={
+            "transform": os.environ.get("FAISS_TRANSFORM") or None,
+            "transform_dim": int(os.environ["FAISS_TRANSFORM_DIM"]) if os.environ.get("FAISS_TRANSFORM_DIM") else None
+        },
+        nprobe=int(os.environ["FAISS_NPROBE"]) if os.environ.get("FAISS_NPROBE") else None,
+        ef_search=int(os.environ["FAISS_EF_SEARCH"]) if os.environ.get("FAISS_EF_SEARCH") else None,
+        rerank_factor=int(os.environ["FAISS_RERANK_FACTOR"]) if os.environ.get("FAISS_RERANK_FACTOR") else None,
+        # Memory-map the index so that all uvicorn workers share it through the page cache
+        mmap=os.environ.get("FAISS_MMAP", "false").lower() in ("1", "true", "yes"),
+        warmup=os.environ.get("FAISS_WARMUP", "false").lower() in ("1", "true", "yes")
+    )
+
+# Versioned index generations: searches pin the active generation,
+# rebuilds run in the background and are swapped in when complete
+index_generations = IndexGenerations(create_faiss_manager)
+
+# Per-field sub-indexes (hierarchy descriptions, inclusions) for fused multi-field scoring,
+# built with `python multi_field_index.py --build`; MULTI_FIELD_WEIGHTS makes fusion the default
+multi_field_index = MultiFieldIndex(index_dir=os.path.join(os.path.dirname(__file__), "multi_field_index"),
+                                    json_file_path=json_file_path)
+default_field_weights = parse_field_weights(os.environ.get("MULTI_FIELD_WEIGHTS"))
+
+# Complete /search responses keyed on the normalized query and its parameters,
+# dropped automatically when a rebuild swaps in a new index generation or documents
+# are added, updated or removed incrementally
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+    ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS))
+)
 
 # Ensure index is loaded on startup
 @app.on_event("startup")
@@ -91,6 +163,7 @@ async def startup_event():
     logger.info(f"Loaded {len(json_data)} documents from JSON file")
     
     # Load FAISS index or build a new one
+    faiss_manager = index_generations.active_manager
     if not faiss_manager.load_index():
         # If index doesn't exist or fails to load, build it
         logger.info("Building FAISS index on startup from JSON data")
@@ -101,13 +174,37 @@ async def startup_event():
             return
     else:
         logger.info("FAISS index loaded successfully")
+    
+    # The multi-field index is optional
+    multi_field_index.load()
 
 # Pydantic models for request/response validation
-class SearchRequest(BaseModel):
+class HierarchyFilters(BaseModel):
+    section: Optional[str] = Field(None, description="Only return NIC codes of this Section (e.g. 'C')")
+    division: Optional[str] = Field(None, description="Only return NIC codes of this Division (e.g. '10')")
+    group: Optional[str] = Field(None, description="Only return NIC codes of this Group (e.g. '107')")
+    class_code: Optional[str] = Field(None, description="Only return NIC codes of this Class (e.g. '1071')")
+    
+    def get_filters(self) -> Dict[str, str]:
+        """Get the hierarchy filters in the form expected by FAISSIndexManager.search"""
+        filters = {"section": self.section, "division": self.division, "group": self.group, "class": self.class_code}
+        return {level: code for level, code in filters.items() if code}
+
+class SearchRequest(HierarchyFilters):
     query: str = Field(..., description="The search query text")
     result_count: int = Field(10, description="Number of results to return", ge=1, le=100)
     search_mode: str = Field("standard", description="Search mode: 'standard', 'strict', or 'relaxed'")
     show_metrics: bool = Field(False, description="Include performance metrics in the response")
+    rollup: bool = Field(False, description="Also return the best Sections, Divisions, Groups and Classes for the query")
+    rollup_top_n: int = Field(DEFAULT_ROLLUP_TOP_N, description="Number of roll-up nodes to return per level", ge=1, le=MAX_ROLLUP_TOP_N)
+    field_weights: Optional[Dict[str, float]] = Field(None, description="Fuse the similarities of several vector fields with these weights, e.g. {'description': 0.7, 'class': 0.3}")
+
+class BatchSearchRequest(HierarchyFilters):
+    queries: List[str] = Field(..., description="The search query texts")
+    result_count: int = Field(10, description="Number of results to return per query", ge=1, le=100)
+    search_mode: str = Field("standard", description="Search mode: 'standard', 'strict', or 'relaxed'")
+    show_metrics: bool = Field(False, description="Include performance metrics in the response")
+    field_weights: Optional[Dict[str, float]] = Field(None, description="Fuse the similarities of several vector fields with these weights")
 
 class SearchResult(BaseModel):
     id: str
@@ -139,10 +236,16 @@ class SearchResponse(BaseModel):
     results: List[Dict[str, Any]]  # Changed from List[SearchResult] for flexibility
     count: int
     metrics: Optional[Dict[str, Any]] = None  # Changed from SearchMetrics for flexibility
+    rollup: Optional[Dict[str, List[Dict[str, Any]]]] = None  # Best nodes per hierarchy level
 
     class Config:
         arbitrary_types_allowed = True
 
+class BatchSearchResponse(BaseModel):
+    results: List[List[Dict[str, Any]]]  # One result list per query, in request order
+    count: int
+    metrics: Optional[Dict[str, Any]] = None
+
 class IndexStats(BaseModel):
     vector_count: int
     index_type: str
@@ -150,23 +253,74 @@ class IndexStats(BaseModel):
     index_file_exists: bool
     id_map_file_exists: bool
     id_map_size: Optional[int] = None
+    index_params: Optional[Dict[str, Any]] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    index_load_stats: Optional[Dict[str, Any]] = None
     embedding_cache_size: Optional[int] = None
     embedding_cache_hit_rate: Optional[str] = None
     embedding_requests: Optional[int] = None
+    embedding_memory_cache: Optional[Dict[str, Any]] = None
+    embedding_store_size: Optional[int] = None
+    embedding_micro_batching: Optional[Dict[str, Any]] = None
+    embedding_models: Optional[Dict[str, Any]] = None
+    search_executor: Optional[Dict[str, Any]] = None
+    response_cache_size: Optional[int] = None
+    response_cache_hit_rate: Optional[str] = None
+    response_cache_requests: Optional[int] = None
+    index_version: Optional[int] = None
+    multi_field_index: Optional[Dict[str, Any]] = None
+
+class IndexStatusResponse(BaseModel):
+    version: int
+    index_path: str
+    activated_at: float
+    vector_count: int
+    in_flight_searches: int
+    retiring_generations: List[Dict[str, Any]]
+    build: Dict[str, Any]
+
+class RuntimeConfigResponse(BaseModel):
+    plan: Optional[Dict[str, int]] = None
+    cpu_count: int
+    pid: int
+    faiss_threads: Optional[int] = None
+    torch_threads: Optional[int] = None
+    torch_interop_threads: Optional[int] = None
+    environment: Dict[str, Optional[str]]
 
 class StatusResponse(BaseModel):
     status: str
     message: str
     time_taken: Optional[float] = None
+    version: Optional[int] = None
 
 # Get documents by IDs from local JSON data
 def get_documents_by_ids(doc_ids):
     """Get documents by ID from local JSON data"""
-    documents = []
-    for doc in json_data:
-        if str(doc.get("_id")) in doc_ids:
-            documents.append(doc)
-    return documents
+    return [documents_by_id[doc_id] for doc_id in doc_ids if doc_id in documents_by_id]
+
+def get_field_weights(requested: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    """
+    Get the fusion weights of a search
+    
+    Args:
+        requested: Weights given in the request
+        
+    Returns:
+        Weights per vector field, or None to search the FAISS index alone
+    """
+    weights = requested or default_field_weights
+    if not weights:
+        return None
+    unknown = set(weights) - set(VECTOR_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown vector fields: {', '.join(sorted(unknown))}. Must be among: {', '.join(VECTOR_FIELDS)}")
+    if not multi_field_index.is_loaded:
+        if requested:
+            raise HTTPException(status_code=400, detail="Multi-field index not available, build it with: python multi_field_index.py --build")
+        return None
+    return weights
 
 # Format search results using local JSON data
 def format_search_results(raw_results: List[tuple]) -> List[Dict[str, Any]]:
@@ -222,6 +376,30 @@ def format_search_results(raw_results: List[tuple]) -> List[Dict[str, Any]]:
         
     return results
 
+def format_rollup(rollup: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Add descriptions and percentages to the nodes of a hierarchy roll-up
+    
+    Args:
+        rollup: Best nodes per level as returned by FAISSIndexManager.search_rollup
+        
+    Returns:
+        Dictionary {level: [{"code", "description", "score", "score_percent", "hits"}, ...]}
+    """
+    return {
+        level: [
+            {
+                "code": node["code"],
+                "description": code_descriptions.get(level, {}).get(node["code"], ""),
+                "score": node["score"],
+                "score_percent": round(node["score"] * 100, 2),
+                "hits": node["hits"]
+            }
+            for node in nodes
+        ]
+        for level, nodes in rollup.items()
+    }
+
 # API Routes
 @app.get("/ui", response_class=RedirectResponse, include_in_schema=False)
 async def legacy_ui():
@@ -234,7 +412,14 @@ async def search(
     query: Optional[str] = Form(None),
     result_count: Optional[int] = Form(10),
     search_mode: Optional[str] = Form("standard"),
-    show_metrics: Optional[bool] = Form(False)
+    show_metrics: Optional[bool] = Form(False),
+    rollup: Optional[bool] = Form(False),
+    rollup_top_n: Optional[int] = Form(DEFAULT_ROLLUP_TOP_N),
+    field_weights: Optional[str] = Form(None),
+    section: Optional[str] = Form(None),
+    division: Optional[str] = Form(None),
+    group: Optional[str] = Form(None),
+    class_code: Optional[str] = Form(None)
 ):
     """
     Search NIC codes using semantic search
@@ -246,6 +431,13 @@ async def search(
     - **result_count**: Number of results to return (1-100)
     - **search_mode**: Search mode - "standard", "strict", or "relaxed"
     - **show_metrics**: Whether to include performance metrics in the response
+    - **section** / **division** / **group** / **class_code**: Optional NIC hierarchy filters;
+      only codes under the given Section, Division, Group and Class are searched
+    - **rollup**: Also aggregate the scores of the nearest codes up the hierarchy and
+      return the best **rollup_top_n** Sections, Divisions, Groups and Classes
+    - **field_weights**: Rank by the weighted similarity of several vector fields (description,
+      class, group, division, inclusion) instead of the description alone; form data takes
+      "description=0.7,class=0.3"
     
     Returns matched NIC codes with similarity scores and detailed information.
     """
@@ -269,7 +461,14 @@ async def search(
                 query=data.get('query'),
                 result_count=data.get('result_count', 10),
                 search_mode=data.get('search_mode', 'standard'),
-                show_metrics=data.get('show_metrics', False)
+                show_metrics=data.get('show_metrics', False),
+                rollup=data.get('rollup', False),
+                rollup_top_n=data.get('rollup_top_n', DEFAULT_ROLLUP_TOP_N),
+                field_weights=data.get('field_weights'),
+                section=data.get('section'),
+                division=data.get('division'),
+                group=data.get('group'),
+                class_code=data.get('class_code', data.get('class'))
             )
         except Exception as e:
             logger.error(f"Error parsing JSON request: {str(e)}")
@@ -280,6 +479,8 @@ async def search(
             # Convert boolean string to actual boolean if needed
             if isinstance(show_metrics, str):
                 show_metrics = show_metrics.lower() == 'true'
+            if isinstance(rollup, str):
+                rollup = rollup.lower() == 'true'
                 
             # Create request object from form data
             try:
@@ -287,7 +488,14 @@ async def search(
                     query=query,
                     result_count=int(result_count),
                     search_mode=search_mode,
-                    show_metrics=show_metrics
+                    show_metrics=show_metrics,
+                    rollup=rollup,
+                    rollup_top_n=int(rollup_top_n),
+                    field_weights=parse_field_weights(field_weights) or None,
+                    section=section,
+                    division=division,
+                    group=group,
+                    class_code=class_code
                 )
             except ValueError as e:
                 raise HTTPException(status_code=400, detail=f"Invalid form data: {str(e)}")
@@ -300,40 +508,73 @@ async def search(
     valid_modes = ["standard", "strict", "relaxed"]
     if search_request.search_mode not in valid_modes:
         raise HTTPException(status_code=400, detail=f"Invalid search mode. Must be one of: {', '.join(valid_modes)}")
+    field_weights = get_field_weights(search_request.field_weights)
+    
+    # Serve repeated queries from the response cache
+    cache_key = response_cache.make_key(
+        search_request.query,
+        result_count=search_request.result_count,
+        search_mode=search_request.search_mode,
+        filters=search_request.get_filters(),
+        rollup=search_request.rollup_top_n if search_request.rollup else 0,
+        field_weights=field_weights or {}
+    )
+    index_version = index_generations.cache_version
+    cached_response = response_cache.get(cache_key, index_version)
+    if cached_response is not None:
+        response = dict(cached_response)
+        if search_request.show_metrics:
+            response["metrics"] = {
+                "total_time_ms": round((time.time() - start_time) * 1000, 2),
+                "embedding_time_ms": 0.0,
+                "index_time_ms": 0.0,
+                "results_count": response["count"],
+                "cached": True
+            }
+        return response
     
     try:
         logger.info(f"Processing search: '{search_request.query}', mode: {search_request.search_mode}")
         
-        # Get query embedding
-        model_name = 'all-MiniLM-L6-v2'
+        # Get query embedding; concurrent requests are encoded together in one batch
+        # while the event loop keeps serving other requests. Encoding and searching run
+        # on the bounded search executor, which rejects requests beyond its limit.
+        search_executor = get_search_executor()
         embedding_start = time.time()
-        query_embedding = cached_get_embedding(search_request.query, model_name)
+        query_embedding = await get_embeddings_manager().aget_embedding(search_request.query)
         embedding_time = time.time() - embedding_start
         
         # Perform search
         index_start = time.time()
         
         # Adjust search parameters based on mode
-        search_multiplier = {
-            "standard": 2,
-            "strict": 3,
-            "relaxed": 4
-        }.get(search_request.search_mode, 2)
-        
-        # Get more results than requested to filter later if needed
-        raw_results = faiss_manager.search(query_embedding, top_k=search_request.result_count * search_multiplier)
-        index_time = time.time() - index_start
+        search_multiplier = SEARCH_MULTIPLIERS.get(search_request.search_mode, 2)
+        
+        # Get more results than requested to filter later if needed; hierarchy
+        # filters are applied inside FAISS so all of them are in the requested slice
+        with index_generations.acquire() as faiss_manager:
+            if field_weights:
+                raw_results = await search_executor.run(multi_field_index.search, query_embedding,
+                                                        top_k=search_request.result_count * search_multiplier,
+                                                        weights=field_weights, filters=search_request.get_filters())
+            else:
+                raw_results = await faiss_manager.asearch(query_embedding, top_k=search_request.result_count * search_multiplier,
+                                                          filters=search_request.get_filters(), executor=search_executor)
+            index_time = time.time() - index_start
+            
+            rollup_start = time.time()
+            rollup = None
+            if search_request.rollup:
+                rollup = format_rollup(await search_executor.run(faiss_manager.search_rollup, query_embedding,
+                                                                 top_n=search_request.rollup_top_n,
+                                                                 filters=search_request.get_filters()))
+            rollup_time = time.time() - rollup_start
         
         # Debug log raw results
         logger.info(f"Raw search results: {len(raw_results)} items found")
         
         # Filter by similarity threshold based on search mode
-        thresholds = {
-            "standard": 0.5,
-            "strict": 0.7,
-            "relaxed": 0.3
-        }
-        threshold = thresholds.get(search_request.search_mode, 0.5)
+        threshold = SIMILARITY_THRESHOLDS.get(search_request.search_mode, 0.5)
         
         filtered_results = [(doc_id, sim) for doc_id, sim in raw_results if sim >= threshold]
         logger.info(f"Filtered results: {len(filtered_results)} items after threshold {threshold}")
@@ -353,6 +594,10 @@ async def search(
             "results": formatted_results,
             "count": len(formatted_results)
         }
+        if rollup is not None:
+            response["rollup"] = rollup
+        if formatted_results:
+            response_cache.put(cache_key, index_version, dict(response))
         
         # Include performance metrics if requested
         if search_request.show_metrics:
@@ -362,23 +607,120 @@ async def search(
                 "index_time_ms": round(index_time * 1000, 2),
                 "results_count": len(raw_results)
             }
+            if rollup is not None:
+                response["metrics"]["rollup_time_ms"] = round(rollup_time * 1000, 2)
         
         return response
         
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Search rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(search_request: BatchSearchRequest):
+    """
+    Search NIC codes for many queries at once
+    
+    All queries are embedded in a single model call and searched with a single
+    FAISS call, which is much faster than calling /search in a loop.
+    
+    - **queries**: List of search query texts
+    - **result_count**: Number of results to return per query (1-100)
+    - **search_mode**: Search mode - "standard", "strict", or "relaxed"
+    - **show_metrics**: Whether to include performance metrics in the response
+    - **section** / **division** / **group** / **class_code**: Optional NIC hierarchy filters applied to all queries
+    
+    Returns one list of matched NIC codes per query, in request order.
+    """
+    start_time = time.time()
+    
+    if not search_request.queries or any(not query or not query.strip() for query in search_request.queries):
+        raise HTTPException(status_code=400, detail="All queries must be non-empty")
+    if len(search_request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries are allowed per batch")
+    if search_request.search_mode not in SIMILARITY_THRESHOLDS:
+        raise HTTPException(status_code=400, detail=f"Invalid search mode. Must be one of: {', '.join(SIMILARITY_THRESHOLDS)}")
+    field_weights = get_field_weights(search_request.field_weights)
+    
+    try:
+        logger.info(f"Processing batch search: {len(search_request.queries)} queries, mode: {search_request.search_mode}")
+        
+        # Embed all queries in one encode call, on the bounded search executor
+        search_executor = get_search_executor()
+        embedding_start = time.time()
+        embeddings = await search_executor.run(
+            get_embeddings_manager().get_embeddings_batch,
+            search_request.queries, batch_size=len(search_request.queries)
+        )
+        embedding_time = time.time() - embedding_start
+        
+        # Search all queries in one FAISS call
+        index_start = time.time()
+        search_multiplier = SEARCH_MULTIPLIERS[search_request.search_mode]
+        if field_weights:
+            doc_ids, scores = await search_executor.run(
+                multi_field_index.search_batch,
+                np.vstack(embeddings), top_k=search_request.result_count * search_multiplier,
+                weights=field_weights, filters=search_request.get_filters()
+            )
+        else:
+            with index_generations.acquire() as faiss_manager:
+                doc_ids, scores = await search_executor.run(
+                    faiss_manager.search_batch,
+                    np.vstack(embeddings), top_k=search_request.result_count * search_multiplier,
+                    filters=search_request.get_filters()
+                )
+        index_time = time.time() - index_start
+        
+        # Filter by similarity threshold (NaN scores of empty slots never pass) and format per query
+        threshold = SIMILARITY_THRESHOLDS[search_request.search_mode]
+        keep = scores >= threshold
+        results = []
+        for row_ids, row_scores, row_keep in zip(doc_ids, scores, keep):
+            filtered_results = list(zip(row_ids[row_keep].tolist(), row_scores[row_keep].tolist()))
+            results.append(format_search_results(filtered_results)[:search_request.result_count])
+        
+        response = {
+            "results": results,
+            "count": len(results)
+        }
+        
+        if search_request.show_metrics:
+            response["metrics"] = {
+                "total_time_ms": round((time.time() - start_time) * 1000, 2),
+                "embedding_time_ms": round(embedding_time * 1000, 2),
+                "index_time_ms": round(index_time * 1000, 2),
+                "results_count": int(np.count_nonzero(doc_ids != ""))
+            }
+        
+        return response
+        
+    except ExecutorSaturatedError as e:
+        logger.warning(f"Batch search rejected: {str(e)}")
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+    except Exception as e:
+        logger.error(f"Batch search error: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Batch search error: {str(e)}")
+
 @app.post("/rebuild-index", response_model=StatusResponse, tags=["Admin"])
-async def rebuild_index():
+async def rebuild_index(wait: bool = Query(False, description="Wait for the rebuild to finish before responding")):
     """
     Admin endpoint to rebuild the FAISS index
     
     This will rebuild the FAISS index from scratch using all documents in JSON data.
     Use this when you've added new documents or updated existing ones.
     
-    Returns success status and time taken to rebuild the index.
+    The index is built in the background into a new generation while searches keep
+    using the current one; the new generation is swapped in once it is complete.
+    Poll /index-status for the build progress, or pass wait=true to block until the
+    rebuild is done.
+    
+    Returns the status of the rebuild and, when waiting, the time taken and the new version.
     """
     try:
         # Make sure JSON data is loaded
@@ -386,22 +728,49 @@ async def rebuild_index():
             load_json_data()
             
         start_time = time.time()
-        success = faiss_manager.build_index(force_rebuild=True)
+        future = index_generations.start_rebuild()
+        if future is None:
+            raise HTTPException(status_code=409, detail="An index rebuild is already in progress")
+        
+        if not wait:
+            return {
+                "status": "accepted",
+                "message": "FAISS index rebuild started in the background"
+            }
+        
+        success = await asyncio.wrap_future(future)
         build_time = time.time() - start_time
         
         if success:
             return {
                 "status": "success", 
                 "message": "FAISS index rebuilt successfully",
-                "time_taken": round(build_time, 2)
+                "time_taken": round(build_time, 2),
+                "version": index_generations.version
             }
         else:
             raise HTTPException(status_code=500, detail="Failed to rebuild index")
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Error rebuilding index: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+@app.get("/index-status", response_model=IndexStatusResponse, tags=["Admin"])
+async def index_status():
+    """
+    Admin endpoint to get the active index version and the background rebuild progress
+    
+    Returns:
+    - The version of the active index generation and when it was activated
+    - The number of searches currently using it
+    - Retired generations still serving in-flight searches
+    - The state of the last or current rebuild (building, done or failed) and its
+      progress (stage, processed and total vectors)
+    """
+    return index_generations.get_status()
+
 @app.get("/get-index-stats", response_model=IndexStats, tags=["Admin"])
 async def get_index_stats():
     """
@@ -409,39 +778,59 @@ async def get_index_stats():
     
     Returns information about the current state of the FAISS index including:
     - Vector count
-    - Index type
+    - Index type and build parameters
+    - Query-time parameters (nprobe for IVF indexes, ef_search for HNSW)
+    - Load mode (heap or mmap), load time and resident memory
     - Dimension
     - File existence
-    - Embedding cache statistics
+    - Embedding cache and response cache statistics
     """
     try:
-        if not faiss_manager.index:
-            success = faiss_manager.load_index()
-            if not success:
+        # Pin the active generation so that a concurrent swap cannot retire it mid-request
+        with index_generations.acquire() as faiss_manager:
+            # Single-flight: concurrent requests wait for one load instead of loading in parallel
+            if not faiss_manager.ensure_index(build=False):
                 raise HTTPException(
                     status_code=500, 
                     detail="Index not loaded and could not be loaded from disk"
                 )
         
-        # Get embedding manager stats
-        embedding_manager = get_embeddings_manager()
-        embedding_stats = embedding_manager.get_stats() if hasattr(embedding_manager, 'get_stats') else {}
-        
-        stats = {
-            "vector_count": faiss_manager.index.ntotal,
-            "index_type": "Flat Inner Product (Cosine Similarity)",
-            "dimension": faiss_manager.index.d,
-            "index_file_exists": os.path.exists(faiss_manager.index_path),
-            "id_map_file_exists": os.path.exists(faiss_manager.id_map_path),
-            "embedding_cache_size": embedding_stats.get("cache_size", 0),
-            "embedding_cache_hit_rate": f"{embedding_stats.get('hit_rate', 0):.2%}",
-            "embedding_requests": embedding_stats.get("total_requests", 0)
-        }
+            # Get embedding manager stats
+            embedding_manager = get_embeddings_manager()
+            embedding_stats = embedding_manager.get_stats() if hasattr(embedding_manager, 'get_stats') else {}
+            cache_stats = response_cache.get_stats()
+        
+            index_info = faiss_manager.get_index_info()
         
-        if hasattr(faiss_manager, "id_map") and faiss_manager.id_map is not None:
-            stats["id_map_size"] = len(faiss_manager.id_map)
+            stats = {
+                "vector_count": faiss_manager.index.ntotal,
+                "index_type": index_info.get("description", "Unknown"),
+                "dimension": faiss_manager.index.d,
+                "index_file_exists": os.path.exists(faiss_manager.index_path),
+                "id_map_file_exists": os.path.exists(faiss_manager.get_id_map_path()),
+                "index_params": index_info.get("build_params"),
+                "nprobe": index_info.get("nprobe"),
+                "ef_search": index_info.get("ef_search"),
+                "index_load_stats": faiss_manager.get_memory_stats(),
+                "embedding_cache_size": embedding_stats.get("cache_size", 0),
+                "embedding_cache_hit_rate": f"{embedding_stats.get('hit_rate', 0):.2%}",
+                "embedding_requests": embedding_stats.get("total_requests", 0),
+                "embedding_memory_cache": embedding_stats.get("memory_cache"),
+                "embedding_store_size": embedding_stats.get("store_size"),
+                "embedding_micro_batching": embedding_stats.get("micro_batching"),
+                "embedding_models": get_manager_registry().get_stats(),
+                "search_executor": get_search_executor().get_stats(),
+                "response_cache_size": cache_stats["size"],
+                "response_cache_hit_rate": f"{cache_stats['hit_rate']:.2%}",
+                "response_cache_requests": cache_stats["total_requests"],
+                "index_version": index_generations.version,
+                "multi_field_index": multi_field_index.get_stats() or None
+            }
         
-        return stats
+            if hasattr(faiss_manager, "id_map") and faiss_manager.id_map is not None:
+                stats["id_map_size"] = len(faiss_manager.id_map)
+        
+            return stats
     except HTTPException:
         raise
     except Exception as e:
@@ -454,19 +843,29 @@ async def clear_embedding_cache():
     """
     Admin endpoint to clear the embedding cache
     
-    Clears the in-memory and disk cache of embeddings to free up memory.
-    Use this if you're experiencing memory issues or want to force re-calculation
-    of embeddings.
+    Clears the in-memory caches and the persistent embedding stores (shared by all
+    workers) of every model to free up memory. Use this if you're experiencing memory issues or
+    want to force re-calculation of embeddings.
     """
     try:
-        from vector_embeddings_manager import clear_cache
-        clear_cache()
+        get_manager_registry().clear_caches()
+        cached_get_embedding.cache_clear()
         return {"status": "success", "message": "Embedding cache cleared successfully"}
     except Exception as e:
         error_msg = f"Error clearing embedding cache: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+@app.get("/runtime-config", response_model=RuntimeConfigResponse, tags=["Admin"])
+async def runtime_config():
+    """
+    Get the effective thread configuration of the worker serving the request
+    
+    Shows the CPU budget split (workers, threads per worker) and the thread counts
+    FAISS and torch actually use in this process.
+    """
+    return get_runtime_config()
+
 # API health check endpoint
 @app.get("/health", response_model=StatusResponse, tags=["System"])
 async def health_check():
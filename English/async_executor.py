@@ -0,0 +1,182 @@
+"""
+Bounded executor for the CPU-bound work of async request handlers
+Runs query encoding and index searches on a small dedicated thread pool so that the
+event loop only awaits them, and limits the requests admitted at once: a request that
+finds max_pending requests already queued or running is rejected right away
+(ExecutorSaturatedError, answered with 503) instead of waiting in an unbounded queue.
+Under overload the latency of admitted requests therefore stays bounded, and clients
+get a quick signal to back off.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from runtime_config import CPU_BUDGET_ENV, get_worker_count, plan_threads
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Threads of the executor (capped by the worker's CPU share) and requests admitted at once
+DEFAULT_MAX_THREADS = 4
+DEFAULT_MAX_PENDING = 64
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when the executor already holds max_pending requests"""
+
+def get_executor_config() -> Dict[str, int]:
+    """
+    Get the search executor configuration from the environment
+
+    SEARCH_EXECUTOR_THREADS sets the threads (default: the worker's CPU share, at most 4)
+    and SEARCH_MAX_PENDING the requests queued or running at once.
+
+    Returns:
+        Dictionary with max_workers and max_pending
+    """
+    threads_per_worker = plan_threads(os.environ.get(CPU_BUDGET_ENV) or None, get_worker_count())["threads_per_worker"]
+    return {
+        "max_workers": int(os.environ.get("SEARCH_EXECUTOR_THREADS") or min(DEFAULT_MAX_THREADS, threads_per_worker)),
+        "max_pending": int(os.environ.get("SEARCH_MAX_PENDING", DEFAULT_MAX_PENDING))
+    }
+
+class BoundedExecutor:
+    """
+    Thread pool with admission control for asyncio callers
+
+    At most max_pending calls are queued or running at once; further calls raise
+    ExecutorSaturatedError without being queued.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_THREADS, max_pending: int = DEFAULT_MAX_PENDING,
+                 name: str = "search-executor"):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Threads running calls
+            max_pending: Calls admitted at once (queued or running)
+            name: Prefix of the thread names
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending))
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+
+        # Stats
+        self.completed = 0
+        self.rejected = 0
+        self.runs = 0
+        self.peak_pending = 0
+        self.total_queue_time = 0.0
+        self.total_run_time = 0.0
+
+    def _admit(self) -> None:
+        """Take a slot or reject the call"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturatedError(f"{self.name} is saturated ({self.pending} requests pending)")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        """Free the slot of a finished (or cancelled) call"""
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def _timed(self, submitted: float, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        """Run a call on a pool thread, recording its queueing and running time"""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.runs += 1
+                self.total_queue_time += start - submitted
+                self.total_run_time += time.perf_counter() - start
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking call on the pool and await its result
+
+        Args:
+            fn: Function to call
+            *args, **kwargs: Its arguments
+
+        Returns:
+            Result of the call
+
+        Raises:
+            ExecutorSaturatedError: If max_pending calls are already admitted
+        """
+        self._admit()
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), fn, args, kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def track(self, submit: Callable[[], Future]) -> Any:
+        """
+        Admit work executed elsewhere (e.g. by the micro-batcher) under the same limit
+
+        Args:
+            submit: Function queuing the work and returning its concurrent future
+
+        Returns:
+            Result of the future
+
+        Raises:
+            ExecutorSaturatedError: If max_pending calls are already admitted
+        """
+        self._admit()
+        try:
+            future = submit()
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the pool threads"""
+        self._executor.shutdown(wait=wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the pending, completed and rejected calls and the average queueing and running time on the pool"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "mean_queue_ms": self.total_queue_time / self.runs * 1000 if self.runs else 0.0,
+                "mean_run_ms": self.total_run_time / self.runs * 1000 if self.runs else 0.0
+            }
+
+# Executor instance for application-wide use
+search_executor = None
+_executor_lock = threading.Lock()
+
+def get_search_executor() -> BoundedExecutor:
+    """Get the application-wide executor of the search handlers, created from get_executor_config"""
+    global search_executor
+    if search_executor is None:
+        with _executor_lock:
+            if search_executor is None:
+                config = get_executor_config()
+                search_executor = BoundedExecutor(config["max_workers"], config["max_pending"])
+                logger.info(f"Search executor: {search_executor.max_workers} threads, "
+                            f"at most {search_executor.max_pending} pending requests")
+    return search_executor
@@ -0,0 +1,255 @@
+"""
+Benchmark the latency of async search handlers as the number of concurrent clients grows
+In-process mode (default) runs a search handler on one event loop, like a FastAPI
+worker, against a synthetic FAISS corpus: encoding (a real sentence-transformers model
+with --model, else a calibrated matrix workload that releases the GIL like torch) then
+a flat search. It compares the old handler, which ran both on the event loop, with the
+handler that awaits them on the bounded search executor, and reports per concurrency
+level the throughput, p50/p99 latency of admitted searches, rejections (503) and the
+p99 latency of a cheap probe request (e.g. /health) served by the same loop. An inline
+handler never yields, so its own latency excludes the time requests wait for the loop;
+that wait shows up in the probe latency.
+
+With --url the same levels are run over HTTP against a running API (POST /search).
+"""
+
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import faiss
+from async_executor import BoundedExecutor, ExecutorSaturatedError, DEFAULT_MAX_PENDING
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Dimension of all-MiniLM-L6-v2 embeddings
+DEFAULT_DIMENSION = 384
+DEFAULT_CLIENTS = (1, 2, 4, 8, 16, 32, 64, 128)
+PROBE_INTERVAL = 0.01
+
+def percentiles(latencies):
+    """p50 and p99 of latencies in seconds, in ms"""
+    if not latencies:
+        return 0.0, 0.0
+    return (round(float(np.percentile(latencies, 50)) * 1000, 2),
+            round(float(np.percentile(latencies, 99)) * 1000, 2))
+
+class SyntheticWorkload:
+    """Query encoding and flat search over a random normalized corpus"""
+
+    def __init__(self, corpus_size, dimension, encode_ms, top_k, model_name=None):
+        self.model = None
+        if model_name:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(model_name)
+            dimension = self.model.get_sentence_embedding_dimension()
+        else:
+            self._calibrate(encode_ms)
+        rng = np.random.default_rng(42)
+        corpus = rng.standard_normal((corpus_size, dimension)).astype('float32')
+        faiss.normalize_L2(corpus)
+        self.index = faiss.IndexFlatIP(dimension)
+        self.index.add(corpus)
+        self.dimension = dimension
+        self.top_k = top_k
+        self.counter = 0
+
+    def _calibrate(self, encode_ms):
+        """Size a matrix product to take about encode_ms on one thread"""
+        size = 64
+        while True:
+            a = np.ones((size, size), dtype='float32')
+            start = time.perf_counter()
+            a @ a
+            elapsed = (time.perf_counter() - start) * 1000
+            if elapsed >= encode_ms or size >= 4096:
+                break
+            size = int(size * 1.25)
+        self.matrix = np.ones((size, size), dtype='float32')
+
+    def encode(self, text):
+        """Embed a query (distinct texts, so no cache is involved)"""
+        if self.model is not None:
+            return self.model.encode(text, convert_to_numpy=True).astype('float32')
+        self.matrix @ self.matrix
+        vector = np.random.default_rng(len(text)).standard_normal(self.dimension).astype('float32')
+        return vector / np.linalg.norm(vector)
+
+    def search(self, vector):
+        """Flat inner product search of one query"""
+        return self.index.search(vector.reshape(1, -1), self.top_k)
+
+    def next_query(self):
+        self.counter += 1
+        return f"benchmark query number {self.counter}"
+
+async def run_level(workload, mode, clients, duration, executor):
+    """
+    Run concurrent clients against one handler variant on this event loop
+
+    Args:
+        workload: SyntheticWorkload
+        mode: "inline" (work on the event loop) or "executor" (bounded executor)
+        clients: Number of concurrent clients, each sending requests back to back
+        duration: Seconds to run
+        executor: BoundedExecutor of the executor mode
+
+    Returns:
+        Dictionary with the throughput, latencies, rejections and probe latencies
+    """
+    async def handler():
+        text = workload.next_query()
+        if mode == "inline":
+            return workload.search(workload.encode(text))
+        vector = await executor.run(workload.encode, text)
+        return await executor.run(workload.search, vector)
+
+    latencies, probe_latencies = [], []
+    rejected = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal rejected
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await handler()
+                latencies.append(time.perf_counter() - start)
+            except ExecutorSaturatedError:
+                rejected += 1
+                # A client backs off after a 503, like one honouring Retry-After
+                await asyncio.sleep(0.01)
+            # Yield like a network round trip would
+            await asyncio.sleep(0)
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            probe_latencies.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+    await asyncio.gather(probe(), *(client() for _ in range(clients)))
+    p50, p99 = percentiles(latencies)
+    _, probe_p99 = percentiles(probe_latencies)
+    return {
+        "mode": mode,
+        "clients": clients,
+        "qps": round(len(latencies) / duration, 1),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "rejected": rejected,
+        "probe_p99_ms": probe_p99
+    }
+
+def run_http_level(url, clients, duration, timeout=30.0):
+    """
+    Run concurrent HTTP clients against POST {url}/search
+
+    Returns:
+        Dictionary with the throughput, latencies and rejections
+    """
+    latencies, errors = [], []
+    rejected = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    counter = iter(range(10 ** 9))
+
+    def client():
+        nonlocal rejected
+        while time.perf_counter() < deadline:
+            with lock:
+                number = next(counter)
+            # Distinct queries so the response cache is not measured
+            body = json.dumps({"query": f"manufacture of product {number}", "result_count": 5}).encode('utf-8')
+            request = urllib.request.Request(f"{url.rstrip('/')}/search", data=body,
+                                             headers={"Content-Type": "application/json"})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except urllib.error.HTTPError as e:
+                with lock:
+                    if e.code == 503:
+                        rejected += 1
+                    else:
+                        errors.append(e.code)
+                time.sleep(0.01)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    p50, p99 = percentiles(latencies)
+    return {
+        "mode": "http",
+        "clients": clients,
+        "qps": round(len(latencies) / duration, 1),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "rejected": rejected,
+        "errors": len(errors)
+    }
+
+def print_report(rows):
+    """Print the benchmark rows as a table"""
+    header = f"{'mode':<9} {'clients':>7} {'qps':>8} {'p50 ms':>9} {'p99 ms':>9} {'rejected':>9} {'probe p99':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        probe = f"{row['probe_p99_ms']:.2f}" if "probe_p99_ms" in row else "-"
+        print(f"{row['mode']:<9} {row['clients']:>7} {row['qps']:>8.1f} {row['p50_ms']:>9.2f} "
+              f"{row['p99_ms']:>9.2f} {row['rejected']:>9} {probe:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search latency under increasing concurrency")
+    parser.add_argument("--clients", type=int, nargs="+", default=list(DEFAULT_CLIENTS), help="Concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per level")
+    parser.add_argument("--url", help="Benchmark a running API over HTTP instead (e.g. http://localhost:8000)")
+    parser.add_argument("--modes", nargs="+", choices=["inline", "executor"], default=["inline", "executor"],
+                        help="Handler variants of the in-process mode")
+    parser.add_argument("--corpus-size", type=int, default=100000, help="Vectors of the synthetic corpus")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION, help="Vector dimension (the model's with --model)")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per search")
+    parser.add_argument("--encode-ms", type=float, default=5.0, help="Duration of the simulated encode")
+    parser.add_argument("--model", help="Encode with this sentence-transformers model instead of the simulated encode")
+    parser.add_argument("--executor-threads", type=int, default=4, help="Threads of the bounded executor")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING, help="Requests admitted at once")
+    parser.add_argument("--output", help="Write the raw report to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    if args.url:
+        for clients in args.clients:
+            rows.append(run_http_level(args.url, clients, args.duration))
+            print_report(rows[-1:])
+    else:
+        workload = SyntheticWorkload(args.corpus_size, args.dimension, args.encode_ms, args.top_k, args.model)
+        for mode in args.modes:
+            for clients in args.clients:
+                executor = BoundedExecutor(args.executor_threads, args.max_pending, name="benchmark-executor")
+                rows.append(asyncio.run(run_level(workload, mode, clients, args.duration, executor)))
+                executor.shutdown()
+                print_report(rows[-1:])
+
+    print()
+    print_report(rows)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
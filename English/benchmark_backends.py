@@ -0,0 +1,176 @@
+"""
+Benchmark the NumPy brute-force backend against FAISS
+Generates synthetic normalized corpora of increasing size and compares the exact
+NumPy search (numpy_index_manager.NumpyFlatIndex) with the FAISS flat index used by
+FAISSIndexManager, and optionally FAISS HNSW, on build time, memory, query latency for
+single and batched queries, and recall against exact search
+"""
+
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import faiss
+from numpy_index_manager import NumpyFlatIndex, DEFAULT_SEARCH_BLOCK_ROWS
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Dimension of all-MiniLM-L6-v2 embeddings
+DEFAULT_DIMENSION = 384
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+BACKENDS = ("numpy", "faiss_flat", "faiss_hnsw")
+
+def make_corpus(num_vectors, dimension, seed=42):
+    """
+    Generate a clustered, normalized float32 corpus (closer to text embeddings than uniform noise)
+
+    Args:
+        num_vectors: Number of vectors
+        dimension: Dimension of the vectors
+        seed: Random seed
+
+    Returns:
+        np.ndarray: (num_vectors, dimension) matrix
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, num_vectors // 100), dimension)).astype('float32')
+    corpus = np.empty((num_vectors, dimension), dtype='float32')
+    # Generated in chunks to bound the temporary memory of the largest corpora
+    for start in range(0, num_vectors, 100000):
+        end = min(start + 100000, num_vectors)
+        labels = rng.integers(0, len(centers), end - start)
+        corpus[start:end] = centers[labels] + 0.5 * rng.standard_normal((end - start, dimension)).astype('float32')
+    faiss.normalize_L2(corpus)
+    return corpus
+
+def build_backend(backend, corpus, block_rows=DEFAULT_SEARCH_BLOCK_ROWS):
+    """
+    Build the index of a backend over the corpus
+
+    Args:
+        backend: One of BACKENDS
+        corpus: Normalized corpus matrix
+        block_rows: Corpus rows scored at a time by the NumPy backend
+
+    Returns:
+        Tuple of (search function (queries, k) -> (scores, ids), index bytes)
+    """
+    if backend == "numpy":
+        index = NumpyFlatIndex(corpus, np.arange(len(corpus), dtype=np.int64), block_rows)
+        return index.search, corpus.nbytes
+    if backend == "faiss_flat":
+        index = faiss.IndexFlatIP(corpus.shape[1])
+    else:
+        index = faiss.IndexHNSWFlat(corpus.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 40
+        index.hnsw.efSearch = 64
+    index.add(corpus)
+    return index.search, faiss.serialize_index(index).nbytes
+
+def time_queries(search, queries, top_k, batch_size):
+    """
+    Time the search of all queries in batches
+
+    Args:
+        search: Search function of build_backend
+        queries: Normalized query matrix
+        top_k: Number of results per query
+        batch_size: Queries per search call
+
+    Returns:
+        Tuple of (milliseconds per query, ids of all queries)
+    """
+    results = []
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        results.append(search(queries[offset:offset + batch_size], top_k)[1])
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(queries), np.concatenate(results)
+
+def benchmark_backends(sizes=DEFAULT_SIZES, dimension=DEFAULT_DIMENSION, backends=BACKENDS,
+                       num_queries=100, top_k=10, batch_size=32, threads=None):
+    """
+    Compare the backends on corpora of several sizes
+
+    Args:
+        sizes: Corpus sizes
+        dimension: Vector dimension
+        backends: Backends to compare
+        num_queries: Number of queries per corpus
+        top_k: Number of results per query
+        batch_size: Queries per call for the batched measurement
+        threads: Number of FAISS OpenMP threads (default: FAISS default)
+
+    Returns:
+        list: One report entry per corpus size and backend
+    """
+    if threads:
+        faiss.omp_set_num_threads(threads)
+
+    rows = []
+    for size in sizes:
+        corpus = make_corpus(size, dimension)
+        rng = np.random.default_rng(7)
+        # Perturbed corpus vectors, so every query has close neighbours
+        queries = corpus[rng.integers(0, size, num_queries)] + 0.05 * rng.standard_normal((num_queries, dimension)).astype('float32')
+        faiss.normalize_L2(queries)
+        exact_ids = NumpyFlatIndex(corpus, np.arange(size, dtype=np.int64)).search(queries, top_k)[1]
+
+        for backend in backends:
+            build_start = time.perf_counter()
+            search, index_bytes = build_backend(backend, corpus)
+            build_time = time.perf_counter() - build_start
+
+            single_ms, _ = time_queries(search, queries, top_k, 1)
+            batch_ms, ids = time_queries(search, queries, top_k, batch_size)
+            recall = np.mean([len(np.intersect1d(ids[i], exact_ids[i])) / top_k for i in range(num_queries)])
+
+            rows.append({
+                "corpus_size": size,
+                "backend": backend,
+                "build_time_s": round(build_time, 3),
+                "index_bytes": int(index_bytes),
+                "single_query_ms": round(single_ms, 3),
+                "batched_query_ms": round(batch_ms, 3),
+                f"recall@{top_k}": round(float(recall), 4)
+            })
+        del corpus
+    return rows
+
+def print_report(rows, top_k, batch_size):
+    """Print the benchmark rows as a table"""
+    header = (f"{'vectors':>9} {'backend':>11} {'build s':>8} {'MB':>8} {'ms/query':>9} "
+              f"{f'ms/q (x{batch_size})':>12} {f'recall@{top_k}':>10}")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['corpus_size']:>9} {row['backend']:>11} {row['build_time_s']:>8} "
+              f"{row['index_bytes'] / 1e6:>8.1f} {row['single_query_ms']:>9} {row['batched_query_ms']:>12} "
+              f"{row[f'recall@{top_k}']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy brute-force backend against FAISS")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Corpus sizes")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION, help="Vector dimension")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS, help="Backends to compare")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries per corpus")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per call for the batched measurement")
+    parser.add_argument("--threads", type=int, help="Number of FAISS OpenMP threads")
+    parser.add_argument("--output", help="Write the raw report to this JSON file")
+    args = parser.parse_args()
+
+    rows = benchmark_backends(args.sizes, args.dimension, args.backends, num_queries=args.queries,
+                              top_k=args.top_k, batch_size=args.batch_size, threads=args.threads)
+    print_report(rows, args.top_k, args.batch_size)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
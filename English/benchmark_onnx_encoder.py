@@ -0,0 +1,113 @@
+"""
+Benchmark the query encoders on the CPU: torch against ONNX Runtime float32 and int8
+Measures single-query latency (p50/p95, the search path) and batched throughput
+(sentences per second, the index building path) of each backend with the same
+number of threads, and the size of each model
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+from onnx_encoder import (DEFAULT_ONNX_DIR, ENCODER_CONFIG_FILE, ONNX_MODEL_FILE, QUANTIZED_MODEL_FILE,
+                          OnnxEncoder, TorchEncoder, export_onnx, get_model_dir)
+from test_onnx_parity import DEFAULT_MODELS
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx_fp32", "onnx_int8")
+
+def load_encoder(backend, model_name, model_dir, num_threads):
+    """Load the encoder of a backend"""
+    if backend == "torch":
+        return TorchEncoder(model_name, num_threads=num_threads)
+    return OnnxEncoder(model_dir, quantized=backend == "onnx_int8", num_threads=num_threads)
+
+def benchmark_encoder(encoder, queries, num_queries=200, batch_size=32, batches=10):
+    """
+    Measure the latency of single queries and the throughput of batches
+
+    Args:
+        encoder: TorchEncoder or OnnxEncoder
+        queries: Sample queries, cycled
+        num_queries: Number of timed single queries
+        batch_size: Sentences per batch
+        batches: Number of timed batches
+
+    Returns:
+        Dictionary with p50/p95/mean latency in ms and sentences per second
+    """
+    for query in queries[:3]:
+        encoder.encode(query)
+
+    latencies = []
+    for i in range(num_queries):
+        start = time.perf_counter()
+        encoder.encode(queries[i % len(queries)])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = [queries[i % len(queries)] for i in range(batch_size)]
+    start = time.perf_counter()
+    for _ in range(batches):
+        encoder.encode(batch, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "sentences_per_second": round(batch_size * batches / elapsed, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark torch against ONNX Runtime float32 and int8 query encoders")
+    parser.add_argument("--models", nargs="+", choices=sorted(DEFAULT_MODELS), default=sorted(DEFAULT_MODELS),
+                        help="Models to benchmark (default: both query encoders)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Backends to compare")
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR, help=f"Directory of the exported models (default: {DEFAULT_ONNX_DIR})")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Intra-op threads of every backend (default: all cores)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of timed single queries")
+    parser.add_argument("--batch-size", type=int, default=32, help="Sentences per batch")
+    parser.add_argument("--batches", type=int, default=10, help="Number of timed batches")
+    parser.add_argument("--output", help="Write the raw report to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    for model_name in args.models:
+        model_dir = get_model_dir(model_name, args.onnx_dir)
+        if any(backend != "torch" for backend in args.backends) and \
+                not os.path.exists(os.path.join(model_dir, ENCODER_CONFIG_FILE)):
+            if not export_onnx(model_name, model_dir, quantize=True):
+                logger.error(f"Could not export {model_name}, skipping it")
+                continue
+        model_files = {"onnx_fp32": ONNX_MODEL_FILE, "onnx_int8": QUANTIZED_MODEL_FILE}
+        for backend in args.backends:
+            encoder = load_encoder(backend, model_name, model_dir, args.threads)
+            row = {"model": model_name, "backend": backend, "threads": args.threads}
+            row.update(benchmark_encoder(encoder, DEFAULT_MODELS[model_name], args.queries,
+                                         args.batch_size, args.batches))
+            if backend in model_files:
+                row["model_mb"] = round(os.path.getsize(os.path.join(model_dir, model_files[backend])) / 1e6, 1)
+            rows.append(row)
+            del encoder
+
+    header = f"{'model':<28} {'backend':<10} {'p50 ms':>8} {'p95 ms':>8} {'sent/s':>9} {'speedup':>8} {'MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        torch_row = next((r for r in rows if r["model"] == row["model"] and r["backend"] == "torch"), None)
+        speedup = f"{torch_row['p50_ms'] / max(row['p50_ms'], 1e-6):.2f}x" if torch_row else "-"
+        print(f"{row['model']:<28} {row['backend']:<10} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['sentences_per_second']:>9.1f} {speedup:>8} {row.get('model_mb', '-'):>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the PCA / OPQ transform stage of the FAISS index
+Builds the index in memory at several target dimensions and compares the memory
+footprint and query latency against the recall loss (before and after exact
+re-ranking) relative to exact search on the native vectors
+"""
+
+import json
+import logging
+import argparse
+from faiss_index_manager import FAISSIndexManager, DEFAULT_JSON_PATH, INDEX_TYPES
+from vector_transform import TRANSFORM_TYPES
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def benchmark_pca(json_path, index_type="flat", transform="pca", dimensions=(256, 192, 128, 64),
+                  num_queries=200, top_k=10, rerank_factor=None):
+    """
+    Compare an index type without a transform and with a transform at several dimensions
+
+    Args:
+        json_path: Path to the JSON data file
+        index_type: Index type to benchmark
+        transform: Transform type ("pca" or "opq")
+        dimensions: Target dimensions of the transform (larger than native ones are skipped)
+        num_queries: Number of sample queries
+        top_k: Number of results per query
+        rerank_factor: Candidates per result re-scored exactly
+
+    Returns:
+        list: One report entry per configuration
+    """
+    rows = []
+    native_entry = None
+    for transform_dim in (None,) + tuple(dimensions):
+        index_params = {"transform": transform, "transform_dim": transform_dim} if transform_dim else {}
+        manager = FAISSIndexManager(json_file_path=json_path, index_type=index_type,
+                                    index_params=index_params, rerank_factor=rerank_factor)
+        report = manager.memory_recall_report([index_type], num_queries=num_queries, top_k=top_k)
+        if not report:
+            logger.error(f"No report for transform dimension {transform_dim}")
+            continue
+        entry = report[0]
+        if native_entry is None:
+            native_entry = entry
+        elif transform_dim > native_entry["index_dimension"]:
+            continue
+        entry["memory_saving"] = round(1 - entry["index_bytes"] / native_entry["index_bytes"], 3)
+        entry["speedup"] = round(native_entry["query_time_ms"] / max(entry["query_time_ms"], 1e-6), 2)
+        rows.append(entry)
+    return rows
+
+def print_report(rows, top_k):
+    """Print the benchmark rows as a table"""
+    header = f"{'dim':>6} {'bytes/vec':>10} {'saving':>8} {'ms/query':>9} {'speedup':>8} {f'recall@{top_k}':>10} {'reranked':>9} {'rerank ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        reranked = row.get(f"reranked_recall@{top_k}")
+        rerank_ms = row.get("reranked_query_time_ms")
+        print(f"{row['index_dimension']:>6} {row['bytes_per_vector']:>10} {row['memory_saving']:>8.1%} "
+              f"{row['query_time_ms']:>9} {row['speedup']:>8} {row[f'recall@{top_k}']:>10} "
+              f"{reranked if reranked is not None else '-':>9} {rerank_ms if rerank_ms is not None else '-':>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PCA / OPQ transform stage of the FAISS index")
+    parser.add_argument("--json", default=DEFAULT_JSON_PATH, help="Path to the JSON data file")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES, help="Index type to benchmark")
+    parser.add_argument("--transform", default="pca", choices=TRANSFORM_TYPES, help="Transform type (opq requires ivf_pq)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 192, 128, 64], help="Target dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sample queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--rerank-factor", type=int, help="Candidates per result re-scored exactly")
+    parser.add_argument("--output", help="Write the raw report to this JSON file")
+    args = parser.parse_args()
+
+    rows = benchmark_pca(args.json, args.index_type, args.transform, args.dims,
+                         num_queries=args.queries, top_k=args.top_k, rerank_factor=args.rerank_factor)
+    print_report(rows, args.top_k)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark the split of a CPU budget between worker processes and library threads
+Runs the per-request work of the API (optionally embedding the query with
+SentenceTransformer, then searching a FAISS flat index) in several worker processes
+at once, each with its FAISS / torch thread pools sized by runtime_config, and reports
+the throughput and latency of every split. The library defaults (every worker using
+every core) are included for comparison.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+from runtime_config import apply_runtime_config, get_cpu_count, plan_threads
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_SIZE = 50000
+DEFAULT_DIMENSION = 384
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+def default_splits(cpu_budget):
+    """
+    Get the (workers, threads per worker) splits of a budget: powers of two workers
+
+    Args:
+        cpu_budget: Number of CPUs
+
+    Returns:
+        list: (workers, threads) tuples
+    """
+    splits = []
+    workers = 1
+    while workers <= cpu_budget:
+        splits.append((workers, cpu_budget // workers))
+        workers *= 2
+    if splits[-1][0] != cpu_budget:
+        splits.append((cpu_budget, 1))
+    return splits
+
+def worker_main(plan, corpus_path, model_name, duration, top_k, barrier, results, seed):
+    """
+    Serve queries in a worker process for a fixed time
+
+    Args:
+        plan: Thread plan applied in the worker (None keeps the library defaults)
+        corpus_path: Path to the .npy corpus
+        model_name: SentenceTransformer model embedding every query, None to search random vectors
+        duration: Seconds to serve queries
+        top_k: Number of results per query
+        barrier: Barrier starting all workers at the same time
+        results: Queue receiving the latencies of the worker
+        seed: Random seed of the queries
+    """
+    config = apply_runtime_config(plan) if plan else None
+    import faiss
+    corpus = np.load(corpus_path)
+    index = faiss.IndexFlatIP(corpus.shape[1])
+    index.add(corpus)
+    model = None
+    if model_name:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        model.encode("warm up", show_progress_bar=False)
+
+    rng = np.random.default_rng(seed)
+    words = ["software", "bakery", "textile", "repair", "retail", "transport", "farming", "mining", "consulting", "printing"]
+    latencies = []
+    barrier.wait()
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        start = time.perf_counter()
+        if model is not None:
+            query = model.encode(" ".join(rng.choice(words, 3)), show_progress_bar=False, convert_to_numpy=True)
+            query = np.asarray(query, dtype='float32').reshape(1, -1)
+        else:
+            query = rng.standard_normal((1, corpus.shape[1])).astype('float32')
+        faiss.normalize_L2(query)
+        index.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+    results.put({"latencies": latencies, "config": config})
+
+def run_split(workers, plan, corpus_path, model_name, duration, top_k):
+    """
+    Run one split and measure it
+
+    Args:
+        workers: Number of worker processes
+        plan: Thread plan of every worker (None: library defaults)
+        corpus_path: Path to the .npy corpus
+        model_name: Model embedding the queries, or None
+        duration: Seconds of measurement
+        top_k: Number of results per query
+
+    Returns:
+        dict: Throughput and latency percentiles of the split
+    """
+    # Spawned workers start without inherited OpenMP state
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker_main, args=(plan, corpus_path, model_name, duration, top_k, barrier, results, seed))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outputs = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = np.concatenate([output["latencies"] for output in outputs]) * 1000
+    return {
+        "workers": workers,
+        "threads_per_worker": plan["threads_per_worker"] if plan else "default",
+        "faiss_threads": outputs[0]["config"]["faiss_threads"] if plan else None,
+        "queries": int(len(latencies)),
+        "throughput_qps": round(len(latencies) / duration, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+    }
+
+def benchmark_thread_split(cpu_budget=None, splits=None, corpus_size=DEFAULT_CORPUS_SIZE, dimension=DEFAULT_DIMENSION,
+                           model_name=None, duration=5.0, top_k=10, include_defaults=True):
+    """
+    Compare the throughput of several splits of a CPU budget
+
+    Args:
+        cpu_budget: Number of CPUs to split (default: all usable CPUs)
+        splits: (workers, threads) tuples (default: default_splits)
+        corpus_size: Number of vectors in the index
+        dimension: Vector dimension (the model's dimension when model_name is given)
+        model_name: SentenceTransformer model embedding every query, None to search random vectors
+        duration: Seconds of measurement per split
+        top_k: Number of results per query
+        include_defaults: Also run every worker count with the library default thread pools
+
+    Returns:
+        list: One report entry per configuration
+    """
+    cpu_budget = cpu_budget or get_cpu_count()
+    splits = splits or default_splits(cpu_budget)
+
+    rng = np.random.default_rng(42)
+    corpus = rng.standard_normal((corpus_size, dimension)).astype('float32')
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_path = os.path.join(tmp_dir, "corpus.npy")
+        np.save(corpus_path, corpus)
+        del corpus
+
+        rows = []
+        for workers, threads in splits:
+            plan = plan_threads(workers * threads, workers)
+            rows.append(run_split(workers, plan, corpus_path, model_name, duration, top_k))
+            if include_defaults and workers > 1:
+                rows.append(run_split(workers, None, corpus_path, model_name, duration, top_k))
+    return rows
+
+def print_report(rows):
+    """Print the benchmark rows as a table"""
+    header = f"{'workers':>8} {'threads':>8} {'queries':>8} {'qps':>9} {'p50 ms':>8} {'p95 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['workers']:>8} {row['threads_per_worker']:>8} {row['queries']:>8} {row['throughput_qps']:>9} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark splits of a CPU budget between workers and FAISS / torch threads")
+    parser.add_argument("--cpu-budget", type=int, help="CPUs to split (default: all usable CPUs)")
+    parser.add_argument("--splits", nargs="+", help="Splits as WORKERSxTHREADS, e.g. 1x8 2x4 8x1")
+    parser.add_argument("--corpus-size", type=int, default=DEFAULT_CORPUS_SIZE, help="Number of vectors in the index")
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION, help="Vector dimension (must match the model with --embed)")
+    parser.add_argument("--embed", action="store_true", help=f"Embed every query with {DEFAULT_MODEL} (needs sentence-transformers)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of measurement per split")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--no-defaults", action="store_true", help="Skip the runs with the library default thread pools")
+    parser.add_argument("--output", help="Write the raw report to this JSON file")
+    args = parser.parse_args()
+
+    splits = [tuple(int(part) for part in split.lower().split("x")) for split in args.splits] if args.splits else None
+    rows = benchmark_thread_split(args.cpu_budget, splits, args.corpus_size, args.dimension,
+                                  DEFAULT_MODEL if args.embed else None, args.duration, args.top_k,
+                                  include_defaults=not args.no_defaults)
+    print_report(rows)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
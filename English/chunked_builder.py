@@ -0,0 +1,224 @@
+"""
+Chunked, parallel construction of FAISS indexes
+Normalizes the embedding matrix block by block on a thread pool, then adds it to the
+index in fixed-size chunks with progress reporting. The partially built index is
+checkpointed every few chunks, so that an interrupted build of a large corpus can be
+resumed from the last checkpoint instead of starting over.
+"""
+import os
+import json
+import time
+import zlib
+import logging
+import traceback
+import numpy as np
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Files of a build in progress, next to the index
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+PARTIAL_INDEX_SUFFIX = ".partial"
+
+# Vectors added between two checkpoints of the partial index
+DEFAULT_CHECKPOINT_ROWS = 1000000
+
+# Minimum interval between two progress log lines in seconds
+PROGRESS_LOG_INTERVAL = 10.0
+
+def build_fingerprint(source_path: str, model_name: str, index_params: Dict[str, Any],
+                      ids_array: np.ndarray, dimension: int) -> Dict[str, Any]:
+    """
+    Describe the inputs of a build, a checkpoint is only resumed with the same inputs
+
+    Args:
+        source_path: Path to the JSON file the vectors were read from
+        model_name: Embedding model of the vectors
+        index_params: Index type and parameters of the build
+        ids_array: FAISS ids of the vectors, in the order they are added
+        dimension: Dimension of the vectors
+
+    Returns:
+        JSON serializable fingerprint
+    """
+    stat = os.stat(source_path) if os.path.exists(source_path) else None
+    return {
+        "source": os.path.basename(source_path),
+        "source_size": stat.st_size if stat else None,
+        "source_mtime_ns": stat.st_mtime_ns if stat else None,
+        "model_name": model_name,
+        "index_params": index_params,
+        "num_vectors": int(len(ids_array)),
+        "dimension": int(dimension),
+        "ids_crc32": zlib.crc32(np.ascontiguousarray(ids_array).tobytes())
+    }
+
+class ChunkedIndexBuilder:
+    """Adds vectors to a FAISS index in chunks, with parallel normalization and checkpoints"""
+
+    def __init__(self, index_path: str, chunk_size: int, threads: Optional[int] = None,
+                 checkpoint_rows: Optional[int] = DEFAULT_CHECKPOINT_ROWS,
+                 progress_callback: Optional[Callable[[str, int, int], None]] = None):
+        """
+        Initialize the builder
+
+        Args:
+            index_path: Path of the index being built, the checkpoint files are stored next to it
+            chunk_size: Number of vectors normalized and added at a time
+            threads: Threads normalizing the vectors (default: the FAISS OpenMP thread count)
+            checkpoint_rows: Vectors added between checkpoints (0 or None disables checkpoints)
+            progress_callback: Called with (stage, processed, total) as the build advances
+        """
+        self.chunk_size = max(1, int(chunk_size))
+        self.threads = max(1, int(threads or faiss.omp_get_max_threads()))
+        self.checkpoint_rows = int(checkpoint_rows or 0)
+        self.checkpoint_path = index_path + CHECKPOINT_SUFFIX
+        self.partial_index_path = index_path + PARTIAL_INDEX_SUFFIX
+        self.progress_callback = progress_callback
+        self.stats = {}
+
+    def _report(self, stage: str, processed: int, total: int) -> None:
+        if self.progress_callback is not None:
+            self.progress_callback(stage, processed, total)
+
+    def normalize(self, matrix: np.ndarray) -> None:
+        """
+        L2-normalize the rows of a float32 matrix in place, one chunk per task
+
+        faiss.normalize_L2 releases the GIL, so the chunks are normalized in parallel.
+
+        Args:
+            matrix: Writable, C-contiguous float32 matrix
+        """
+        num_rows = matrix.shape[0]
+        starts = range(0, num_rows, self.chunk_size)
+        normalize_start = time.time()
+
+        def normalize_chunk(start: int) -> int:
+            # A row slice of a C-contiguous matrix is contiguous, normalized without a copy
+            block = matrix[start:start + self.chunk_size]
+            faiss.normalize_L2(block)
+            return len(block)
+
+        done = 0
+        if self.threads == 1 or len(starts) == 1:
+            for start in starts:
+                done += normalize_chunk(start)
+                self._report("normalizing", done, num_rows)
+        else:
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                for rows in executor.map(normalize_chunk, starts):
+                    done += rows
+                    self._report("normalizing", done, num_rows)
+        self.stats["normalize_time_s"] = round(time.time() - normalize_start, 3)
+        logger.info(f"Normalized {num_rows} vectors in {len(starts)} chunks on {self.threads} threads "
+                    f"in {self.stats['normalize_time_s']:.2f} seconds")
+
+    def load_checkpoint(self, fingerprint: Dict[str, Any]) -> Tuple[Any, int, Optional[Dict[str, Any]]]:
+        """
+        Load the partial index of an interrupted build with the same inputs
+
+        Args:
+            fingerprint: Fingerprint of the current build (see build_fingerprint)
+
+        Returns:
+            Tuple of (partial index, number of vectors already added, build parameters),
+            or (None, 0, None) if there is no usable checkpoint
+        """
+        if not os.path.exists(self.checkpoint_path) or not os.path.exists(self.partial_index_path):
+            logger.info("No build checkpoint found, starting from the beginning")
+            return None, 0, None
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("fingerprint") != fingerprint:
+                logger.warning("Build checkpoint was made from different inputs, starting from the beginning")
+                return None, 0, None
+            index = faiss.read_index(self.partial_index_path)
+            rows_added = int(checkpoint["rows_added"])
+            if index.ntotal != rows_added:
+                logger.warning(f"Partial index holds {index.ntotal} vectors, checkpoint expects {rows_added}; starting from the beginning")
+                return None, 0, None
+            logger.info(f"Resuming build from checkpoint at {rows_added}/{fingerprint['num_vectors']} vectors")
+            return index, rows_added, checkpoint.get("build_params")
+        except Exception as e:
+            logger.error(f"Error loading build checkpoint: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None, 0, None
+
+    def save_checkpoint(self, index: Any, rows_added: int, fingerprint: Dict[str, Any],
+                        build_params: Dict[str, Any]) -> None:
+        """
+        Atomically write the partial index and the number of vectors it holds
+
+        Args:
+            index: Partially built index
+            rows_added: Number of vectors added so far
+            fingerprint: Fingerprint of the build
+            build_params: Resolved build parameters of the index
+        """
+        tmp_index_path = f"{self.partial_index_path}.tmp"
+        faiss.write_index(index, tmp_index_path)
+        os.replace(tmp_index_path, self.partial_index_path)
+        tmp_checkpoint_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_checkpoint_path, 'w') as f:
+            json.dump({"rows_added": rows_added, "fingerprint": fingerprint, "build_params": build_params,
+                       "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
+        os.replace(tmp_checkpoint_path, self.checkpoint_path)
+        logger.info(f"Checkpointed partial index at {rows_added} vectors")
+
+    def clear_checkpoint(self) -> None:
+        """Remove the checkpoint files of a finished or abandoned build"""
+        for path in (self.checkpoint_path, self.partial_index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def add(self, index: Any, matrix: np.ndarray, ids_array: np.ndarray, start_row: int = 0,
+            fingerprint: Optional[Dict[str, Any]] = None, build_params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Add normalized vectors to a trained index in chunks
+
+        FAISS parallelizes within each chunk (assignment and encoding of IVF indexes),
+        chunks are added in order so that a checkpoint always holds a prefix of the rows.
+
+        Args:
+            index: Trained index accepting add_with_ids
+            matrix: Normalized float32 vectors
+            ids_array: FAISS id of every row
+            start_row: First row to add (rows before it are already in a resumed index)
+            fingerprint: Fingerprint of the build, required for checkpoints
+            build_params: Resolved build parameters, stored with the checkpoints
+
+        Returns:
+            The index
+        """
+        num_rows = matrix.shape[0]
+        add_start = time.time()
+        last_log = add_start
+        last_checkpoint = start_row
+        for start in range(start_row, num_rows, self.chunk_size):
+            self._report("adding", start, num_rows)
+            end = min(start + self.chunk_size, num_rows)
+            index.add_with_ids(matrix[start:end], ids_array[start:end])
+
+            if self.checkpoint_rows and fingerprint is not None and end < num_rows and end - last_checkpoint >= self.checkpoint_rows:
+                self.save_checkpoint(index, end, fingerprint, build_params or {})
+                last_checkpoint = end
+
+            now = time.time()
+            if now - last_log >= PROGRESS_LOG_INTERVAL:
+                rate = (end - start_row) / max(now - add_start, 1e-9)
+                logger.info(f"Added {end}/{num_rows} vectors ({rate:.0f} vectors/s, "
+                            f"about {(num_rows - end) / max(rate, 1e-9):.0f} s left)")
+                last_log = now
+        self.stats.update({
+            "add_time_s": round(time.time() - add_start, 3),
+            "resumed_from": start_row,
+            "chunk_size": self.chunk_size,
+            "threads": self.threads
+        })
+        return index
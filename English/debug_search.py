@@ -67,10 +67,10 @@ def test_faiss_index():
         
         # Check if index exists and is loaded
         logger.info(f"FAISS index path: {faiss_manager.index_path}")
-        logger.info(f"FAISS ID map path: {faiss_manager.id_map_path}")
+        logger.info(f"FAISS ID map path: {faiss_manager.get_id_map_path()}")
         
         index_exists = os.path.exists(faiss_manager.index_path)
-        id_map_exists = os.path.exists(faiss_manager.id_map_path)
+        id_map_exists = os.path.exists(faiss_manager.get_id_map_path())
         
         logger.info(f"Index file exists: {index_exists}")
         logger.info(f"ID map file exists: {id_map_exists}")
@@ -75,7 +75,7 @@ def diagnose_search_pipeline(query="bakery", json_path="output.json"):
         
         # Check existing index
         index_path = index_manager.index_path
-        id_map_path = index_manager.id_map_path
+        id_map_path = index_manager.get_id_map_path()
         
         logger.info(f"Index path: {index_path}")
         logger.info(f"ID map path: {id_map_path}")
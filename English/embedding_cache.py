@@ -0,0 +1,371 @@
+"""
+Bounded in-process embedding cache
+Holds query embeddings in one preallocated float32 slab sized from a memory budget,
+so the cache costs a fixed amount of memory however many distinct queries arrive.
+When the slab is full an eviction policy picks the entry to drop: LRU, LFU, or LRU
+behind a TinyLFU admission filter, which keeps one-off queries from evicting
+frequently repeated ones by comparing their estimated frequencies in a count-min
+sketch.
+"""
+import os
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Eviction policies
+CACHE_POLICIES = ("lru", "lfu", "tinylfu")
+DEFAULT_CACHE_POLICY = "lru"
+
+# Memory budget of the slab (16 MB: about 10,900 MiniLM embeddings of 384 dimensions)
+DEFAULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Counters per row of the count-min sketch, relative to the cache capacity
+SKETCH_WIDTH_FACTOR = 4
+SKETCH_DEPTH = 4
+# Sketch counters saturate at this value (4 bits, as in the TinyLFU paper)
+SKETCH_MAX_COUNT = 15
+# Counters are halved after this many increments per cache entry, so old popularity fades
+SKETCH_SAMPLE_FACTOR = 10
+
+def get_cache_config() -> Dict[str, Any]:
+    """
+    Get the embedding cache configuration from the environment
+
+    EMBEDDING_CACHE_POLICY selects the eviction policy, EMBEDDING_CACHE_MB the memory
+    budget of the slab and EMBEDDING_CACHE_SIZE an optional limit on the number of entries.
+
+    Returns:
+        Dictionary with policy, max_bytes and max_entries
+    """
+    policy = os.environ.get("EMBEDDING_CACHE_POLICY", DEFAULT_CACHE_POLICY).lower()
+    if policy not in CACHE_POLICIES:
+        logger.warning(f"Unknown EMBEDDING_CACHE_POLICY '{policy}', using {DEFAULT_CACHE_POLICY}")
+        policy = DEFAULT_CACHE_POLICY
+    max_mb = os.environ.get("EMBEDDING_CACHE_MB")
+    max_entries = os.environ.get("EMBEDDING_CACHE_SIZE")
+    return {
+        "policy": policy,
+        "max_bytes": int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_CACHE_MAX_BYTES,
+        "max_entries": int(max_entries) if max_entries else None
+    }
+
+class CountMinSketch:
+    """Approximate access counts of keys, with periodic halving (aging)"""
+
+    def __init__(self, width: int, depth: int = SKETCH_DEPTH, sample_size: Optional[int] = None):
+        """
+        Initialize the sketch
+
+        Args:
+            width: Counters per row
+            depth: Number of rows (independent hash functions)
+            sample_size: Increments after which all counters are halved (default: 10 x width)
+        """
+        self.width = max(16, int(width))
+        self.depth = depth
+        self.table = np.zeros((depth, self.width), dtype=np.uint8)
+        self.sample_size = sample_size or SKETCH_SAMPLE_FACTOR * self.width
+        self.increments = 0
+        self._rows = np.arange(depth)
+
+    def _columns(self, key: str) -> np.ndarray:
+        # Double hashing derives the row hashes from two halves of one 64-bit hash
+        value = hash(key) & 0xFFFFFFFFFFFFFFFF
+        low, high = value & 0xFFFFFFFF, (value >> 32) | 1
+        return (low + self._rows * high) % self.width
+
+    def increment(self, key: str) -> None:
+        """Count one access of a key"""
+        columns = self._columns(key)
+        counters = self.table[self._rows, columns]
+        # Conservative update: only the smallest counters grow
+        smallest = counters.min()
+        if smallest < SKETCH_MAX_COUNT:
+            self.table[self._rows, columns] = np.where(counters == smallest, smallest + 1, counters)
+        self.increments += 1
+        if self.increments >= self.sample_size:
+            self.table >>= 1
+            self.increments //= 2
+
+    def estimate(self, key: str) -> int:
+        """Estimated number of recent accesses of a key"""
+        return int(self.table[self._rows, self._columns(key)].min())
+
+    def clear(self) -> None:
+        self.table[:] = 0
+        self.increments = 0
+
+class LRUPolicy:
+    """Evicts the least recently used entry"""
+
+    name = "lru"
+
+    def __init__(self, capacity: int):
+        self.order = OrderedDict()
+
+    def record(self, key: str) -> None:
+        """Note a lookup of a key, whether or not it is cached"""
+
+    def touch(self, key: str) -> None:
+        """Note a hit on a cached key"""
+        self.order.move_to_end(key)
+
+    def insert(self, key: str) -> None:
+        self.order[key] = None
+
+    def remove(self, key: str) -> None:
+        del self.order[key]
+
+    def victim(self) -> str:
+        """Key that would be evicted next"""
+        return next(iter(self.order))
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Whether a new key may replace the victim"""
+        return True
+
+    def clear(self) -> None:
+        self.order.clear()
+
+class LFUPolicy:
+    """Evicts the least frequently used entry, the least recently used one among ties (O(1) per operation)"""
+
+    name = "lfu"
+
+    def __init__(self, capacity: int):
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 0
+
+    def record(self, key: str) -> None:
+        """Note a lookup of a key, whether or not it is cached"""
+
+    def touch(self, key: str) -> None:
+        """Note a hit on a cached key: move it to the next frequency bucket"""
+        count = self.counts[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def insert(self, key: str) -> None:
+        self.counts[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_count = 1
+
+    def remove(self, key: str) -> None:
+        count = self.counts.pop(key)
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = min(self.buckets) if self.buckets else 0
+
+    def victim(self) -> str:
+        """Key that would be evicted next"""
+        return next(iter(self.buckets[self.min_count]))
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Whether a new key may replace the victim"""
+        return True
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self.buckets.clear()
+        self.min_count = 0
+
+class TinyLFUPolicy(LRUPolicy):
+    """LRU eviction behind a TinyLFU admission filter"""
+
+    name = "tinylfu"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.sketch = CountMinSketch(SKETCH_WIDTH_FACTOR * capacity)
+
+    def record(self, key: str) -> None:
+        """Count every lookup, so keys build up frequency before they are cached"""
+        self.sketch.increment(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Admit a new key only if it was requested more often than the LRU victim"""
+        return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+    def clear(self) -> None:
+        super().clear()
+        self.sketch.clear()
+
+POLICY_CLASSES = {policy.name: policy for policy in (LRUPolicy, LFUPolicy, TinyLFUPolicy)}
+
+class EmbeddingCache:
+    """
+    Fixed-memory cache of float32 embeddings keyed by text hash
+
+    The slab is allocated on the first insert, when the embedding dimension is known:
+    capacity = min(max_entries, max_bytes // (4 * dimension)). Entries are rows of the
+    slab; lookups return copies, so evicting a row never changes a returned vector.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MAX_BYTES, max_entries: Optional[int] = None,
+                 policy: str = DEFAULT_CACHE_POLICY):
+        """
+        Initialize the cache
+
+        Args:
+            max_bytes: Memory budget of the slab
+            max_entries: Maximum number of entries (default: limited by max_bytes only)
+            policy: Eviction policy ("lru", "lfu" or "tinylfu")
+        """
+        if policy not in POLICY_CLASSES:
+            raise ValueError(f"Unknown cache policy '{policy}'. Must be one of: {', '.join(CACHE_POLICIES)}")
+        self.max_bytes = int(max_bytes)
+        self.max_entries = max_entries
+        self.policy_name = policy
+        self.policy = None
+        self.slab = None
+        self.capacity = 0
+        self.slots = {}
+        self.free_slots = []
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.insertions = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    def _allocate(self, dimension: int) -> None:
+        """Allocate the slab for embeddings of a dimension (drops all entries)"""
+        capacity = max(1, self.max_bytes // (4 * dimension))
+        if self.max_entries:
+            capacity = min(capacity, int(self.max_entries))
+        self.capacity = capacity
+        self.slab = np.empty((capacity, dimension), dtype=np.float32)
+        self.slots = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.policy = POLICY_CLASSES[self.policy_name](capacity)
+        logger.info(f"Allocated embedding cache slab of {capacity} x {dimension} float32 "
+                    f"({self.slab.nbytes / (1024 * 1024):.1f} MB, {self.policy_name} eviction)")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up an embedding
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Copy of the cached embedding, or None
+        """
+        with self._lock:
+            if self.policy is not None:
+                self.policy.record(key)
+            slot = self.slots.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.policy.touch(key)
+            return self.slab[slot].copy()
+
+    def put(self, key: str, embedding: np.ndarray) -> bool:
+        """
+        Insert an embedding, evicting an entry if the cache is full
+
+        Args:
+            key: Cache key
+            embedding: Embedding vector
+
+        Returns:
+            bool: True if the embedding is cached, False if the admission filter rejected it
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        with self._lock:
+            if self.slab is None or self.slab.shape[1] != len(embedding):
+                self._allocate(len(embedding))
+            if key in self.slots:
+                self.slab[self.slots[key]] = embedding
+                return True
+            if not self.free_slots:
+                victim = self.policy.victim()
+                if not self.policy.admit(key, victim):
+                    self.rejections += 1
+                    return False
+                self.policy.remove(victim)
+                self.free_slots.append(self.slots.pop(victim))
+                self.evictions += 1
+            slot = self.free_slots.pop()
+            self.slab[slot] = embedding
+            self.slots[key] = slot
+            self.policy.insert(key)
+            self.insertions += 1
+            return True
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.slots
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters (the slab is kept)"""
+        with self._lock:
+            if self.slab is not None:
+                self.slots = {}
+                self.free_slots = list(range(self.capacity - 1, -1, -1))
+                self.policy.clear()
+            self._reset_counters()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the size, memory use and eviction / admission counters of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy_name,
+            "size": len(self.slots),
+            "capacity": self.capacity,
+            "slab_bytes": int(self.slab.nbytes) if self.slab is not None else 0,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "insertions": self.insertions,
+            "evictions": self.evictions,
+            "admission_rejections": self.rejections
+        }
+
+# For command line usage: compare the hit rates of the policies on a synthetic query stream
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate the embedding cache policies on Zipf-distributed queries")
+    parser.add_argument("--queries", type=int, default=200000, help="Number of lookups")
+    parser.add_argument("--distinct", type=int, default=100000, help="Number of distinct queries")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the query popularity")
+    parser.add_argument("--capacity", type=int, default=2000, help="Cache entries")
+    parser.add_argument("--dimension", type=int, default=384, help="Embedding dimension")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    stream = rng.zipf(args.zipf, args.queries) % args.distinct
+    vector = np.zeros(args.dimension, dtype=np.float32)
+    print(f"{'policy':<8} {'hit rate':>9} {'evictions':>10} {'rejections':>11}")
+    for policy in CACHE_POLICIES:
+        cache = EmbeddingCache(max_bytes=args.capacity * args.dimension * 4, policy=policy)
+        for query in stream:
+            key = f"q{query}"
+            if cache.get(key) is None:
+                cache.put(key, vector)
+        stats = cache.get_stats()
+        print(f"{policy:<8} {stats['hit_rate']:>9.2%} {stats['evictions']:>10} {stats['admission_rejections']:>11}")
@@ -0,0 +1,219 @@
+"""
+Columnar embedding sidecar files for the JSON data files
+Stores the embeddings of a JSON data file as a contiguous float32 .npy matrix, the
+row -> _id mapping as a .npy array and the remaining document fields as a JSON file
+without embeddings, so that none of them has to be parsed from JSON float lists again
+"""
+import os
+import json
+import time
+import logging
+import traceback
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from json_stream import JSONArrayStream
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Embedding fields of the English and Hindi data files
+ENGLISH_EMBEDDING_FIELD = "Vector-Embedding_SubClass"
+HINDI_EMBEDDING_FIELD = "embeddings"
+
+# Sidecar file suffixes, e.g. output.json -> output.vectors.npy, output.ids.npy, output.docs.json
+VECTORS_SUFFIX = ".vectors.npy"
+IDS_SUFFIX = ".ids.npy"
+DOCS_SUFFIX = ".docs.json"
+
+# Number of embeddings written at a time while exporting
+DEFAULT_EXPORT_CHUNK_SIZE = 4096
+
+def get_sidecar_paths(json_file_path: str) -> Dict[str, str]:
+    """
+    Get the sidecar file paths of a JSON data file
+
+    Args:
+        json_file_path: Path to the JSON data file
+
+    Returns:
+        Dictionary with the "vectors", "ids" and "docs" paths
+    """
+    stem = os.path.splitext(json_file_path)[0]
+    return {
+        "vectors": stem + VECTORS_SUFFIX,
+        "ids": stem + IDS_SUFFIX,
+        "docs": stem + DOCS_SUFFIX
+    }
+
+def is_sidecar_fresh(json_file_path: str, include_docs: bool = False) -> bool:
+    """
+    Check whether the sidecar files exist and are newer than the JSON data file
+
+    Args:
+        json_file_path: Path to the JSON data file
+        include_docs: Also require the documents file
+
+    Returns:
+        bool: True if the sidecar can be used instead of the JSON file
+    """
+    paths = get_sidecar_paths(json_file_path)
+    required = [paths["vectors"], paths["ids"]] + ([paths["docs"]] if include_docs else [])
+    if not all(os.path.exists(path) for path in required):
+        return False
+    if not os.path.exists(json_file_path):
+        # The sidecar is all we have
+        return True
+    source_mtime = os.path.getmtime(json_file_path)
+    return all(os.path.getmtime(path) >= source_mtime for path in required)
+
+def export_sidecar(json_file_path: str, embedding_field: str = ENGLISH_EMBEDDING_FIELD,
+                   chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE, write_docs: bool = True) -> int:
+    """
+    Export the embeddings of a JSON data file to sidecar files
+
+    The JSON file is parsed incrementally and the embeddings are written to disk in
+    chunks, so memory use does not grow with the size of the file.
+
+    Args:
+        json_file_path: Path to the JSON data file
+        embedding_field: Name of the embedding field of the documents
+        chunk_size: Number of embeddings written at a time
+        write_docs: Also write the documents without their embedding field
+
+    Returns:
+        int: Number of exported embeddings
+    """
+    paths = get_sidecar_paths(json_file_path)
+    raw_path = paths["vectors"] + ".raw"
+    start_time = time.time()
+    doc_ids = []
+    chunk = []
+    dimension = None
+
+    docs_file = None
+    try:
+        with open(raw_path, 'wb') as raw_file:
+            if write_docs:
+                docs_file = open(paths["docs"] + ".tmp", 'w', encoding='utf-8')
+                docs_file.write("[")
+
+            for position, doc in enumerate(JSONArrayStream(json_file_path)):
+                embedding = doc.pop(embedding_field, None)
+                if docs_file is not None:
+                    docs_file.write(("," if position else "") + json.dumps(doc, ensure_ascii=False))
+
+                if not isinstance(embedding, list) or len(embedding) == 0:
+                    continue
+                if dimension is None:
+                    dimension = len(embedding)
+                elif len(embedding) != dimension:
+                    raise ValueError(f"Document {doc.get('_id')} has an embedding of dimension {len(embedding)}, expected {dimension}")
+
+                doc_ids.append(str(doc.get("_id", len(doc_ids))))
+                chunk.append(embedding)
+                if len(chunk) >= chunk_size:
+                    raw_file.write(np.asarray(chunk, dtype='float32').tobytes())
+                    chunk.clear()
+            if chunk:
+                raw_file.write(np.asarray(chunk, dtype='float32').tobytes())
+
+            if docs_file is not None:
+                docs_file.write("]")
+                docs_file.close()
+
+        if not doc_ids:
+            logger.error(f"No '{embedding_field}' embeddings found in {json_file_path}")
+            return 0
+
+        # Copy the raw rows into a .npy file now that the final shape is known
+        raw_vectors = np.memmap(raw_path, dtype='float32', mode='r', shape=(len(doc_ids), dimension))
+        vectors = np.lib.format.open_memmap(paths["vectors"] + ".tmp", mode='w+', dtype='float32', shape=raw_vectors.shape)
+        for row in range(0, len(doc_ids), chunk_size):
+            vectors[row:row + chunk_size] = raw_vectors[row:row + chunk_size]
+        vectors.flush()
+        del vectors, raw_vectors
+
+        with open(paths["ids"] + ".tmp", 'wb') as f:
+            np.save(f, np.array(doc_ids, dtype=str))
+
+        # Publish all files only once they are complete
+        os.replace(paths["vectors"] + ".tmp", paths["vectors"])
+        os.replace(paths["ids"] + ".tmp", paths["ids"])
+        if write_docs:
+            os.replace(paths["docs"] + ".tmp", paths["docs"])
+
+        logger.info(f"Exported {len(doc_ids)} embeddings of dimension {dimension} from {json_file_path} "
+                    f"to {paths['vectors']} in {time.time() - start_time:.2f} seconds")
+        return len(doc_ids)
+    finally:
+        if docs_file is not None and not docs_file.closed:
+            docs_file.close()
+        for path in (raw_path, paths["vectors"] + ".tmp", paths["ids"] + ".tmp", paths["docs"] + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def load_sidecar(json_file_path: str, mmap: bool = True) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Load the embedding matrix and the row -> _id array of a JSON data file
+
+    Args:
+        json_file_path: Path to the JSON data file the sidecar was exported from
+        mmap: Memory-map the embedding matrix instead of reading it
+
+    Returns:
+        Tuple of (document IDs, float32 embedding matrix), or (None, None) on error
+    """
+    paths = get_sidecar_paths(json_file_path)
+    try:
+        doc_ids = np.load(paths["ids"])
+        vectors = np.load(paths["vectors"], mmap_mode='r' if mmap else None)
+        if len(doc_ids) != vectors.shape[0]:
+            raise ValueError(f"Sidecar files differ in length: {len(doc_ids)} ids / {vectors.shape[0]} vectors")
+        logger.info(f"Loaded {vectors.shape[0]} embeddings of dimension {vectors.shape[1]} from {paths['vectors']}")
+        return doc_ids, vectors
+    except Exception as e:
+        logger.error(f"Error loading embedding sidecar: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None, None
+
+def load_documents(json_file_path: str, embedding_field: str = ENGLISH_EMBEDDING_FIELD) -> List[Dict[str, Any]]:
+    """
+    Load the documents of a JSON data file without their embeddings
+
+    Uses the sidecar documents file when it is fresh, otherwise parses the JSON file
+    and drops the embedding field so the vectors are not kept in memory twice.
+
+    Args:
+        json_file_path: Path to the JSON data file
+        embedding_field: Name of the embedding field of the documents
+
+    Returns:
+        List of documents
+    """
+    docs_path = get_sidecar_paths(json_file_path)["docs"]
+    if is_sidecar_fresh(json_file_path, include_docs=True):
+        with open(docs_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    for doc in documents:
+        doc.pop(embedding_field, None)
+    return documents
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the embeddings of a JSON data file to .npy sidecar files")
+    parser.add_argument("json", help="Path to the JSON data file (e.g. output.json or output_hindi.json)")
+    parser.add_argument("--field", help="Embedding field (default: detected from the file name)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_EXPORT_CHUNK_SIZE, help="Embeddings written at a time")
+    parser.add_argument("--no-docs", action="store_true", help="Do not write the documents file")
+    args = parser.parse_args()
+
+    field = args.field or (HINDI_EMBEDDING_FIELD if "hindi" in os.path.basename(args.json).lower() else ENGLISH_EMBEDDING_FIELD)
+    count = export_sidecar(args.json, field, chunk_size=args.chunk_size, write_docs=not args.no_docs)
+    if count:
+        print(f"Exported {count} embeddings to {get_sidecar_paths(args.json)['vectors']}")
+    else:
+        print("Failed to export embeddings")
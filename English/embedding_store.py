@@ -0,0 +1,248 @@
+"""
+Persistent embedding store shared by worker processes
+Keeps one float32 vector per text key in an SQLite database in WAL mode: every new
+embedding is a single-row append, lookups read only the requested rows, a crash
+loses at most the last uncommitted insert, and SQLite's file locking lets several
+worker processes read and write the same store at once. Replaces the pickled dict
+of the embedding cache, which is migrated on first use.
+"""
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+import numpy as np
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# File name suffixes of the store and of the legacy pickle cache
+STORE_SUFFIX = "_cache.sqlite3"
+LEGACY_PICKLE_SUFFIX = "_cache.pkl"
+
+# Seconds a writer waits for the lock held by another process
+DEFAULT_BUSY_TIMEOUT = 30.0
+
+# Keys looked up per SELECT (stays below SQLite's bound parameter limit)
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    dimension INTEGER NOT NULL,
+    vector BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def get_store_path(cache_dir: str, model_name: str) -> str:
+    """
+    Get the path of the embedding store of a model
+
+    Args:
+        cache_dir: Directory of the embedding cache
+        model_name: Name of the embedding model
+
+    Returns:
+        str: Path of the SQLite file
+    """
+    return os.path.join(cache_dir, f"{model_name.replace('/', '_')}{STORE_SUFFIX}")
+
+class EmbeddingStore:
+    """
+    Key -> float32 vector store backed by SQLite
+
+    Every thread gets its own connection; in WAL mode readers never block the
+    writer or each other, and writers in other processes wait up to busy_timeout.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        """
+        Open (creating if needed) an embedding store
+
+        Args:
+            path: Path of the SQLite file
+            busy_timeout: Seconds to wait for a lock held by another connection
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection of the calling thread, opening it on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode: statements outside _transaction commit by themselves
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode a crash can only lose the last commits, never corrupt the file
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one write transaction, taking the database lock up front"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _decode(dimension: int, blob: bytes) -> np.ndarray:
+        """Copy a stored vector into a writable float32 array"""
+        return np.frombuffer(blob, dtype=np.float32, count=dimension).copy()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Look up the vector of a key
+
+        Args:
+            key: Cache key
+
+        Returns:
+            float32 vector, or None if the key is not stored
+        """
+        row = self._connection().execute("SELECT dimension, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        return self._decode(*row) if row else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up the vectors of several keys
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            Dictionary of the keys found and their vectors
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        connection = self._connection()
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for key, dimension, blob in connection.execute(
+                    f"SELECT key, dimension, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                found[key] = self._decode(dimension, blob)
+        return found
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        """
+        Store the vector of a key (a key that is already stored keeps its vector)
+
+        Args:
+            key: Cache key
+            vector: Embedding vector
+        """
+        self.put_many([(key, vector)])
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> int:
+        """
+        Store several vectors in one transaction
+
+        Args:
+            items: (key, vector) pairs
+
+        Returns:
+            int: Number of pairs written
+        """
+        rows = []
+        for key, vector in items:
+            vector = np.ascontiguousarray(vector, dtype=np.float32).ravel()
+            rows.append((key, len(vector), vector.tobytes()))
+        if not rows:
+            return 0
+        with self._transaction() as connection:
+            # Concurrent workers embedding the same text store identical vectors, the first one wins
+            connection.executemany("INSERT OR IGNORE INTO embeddings (key, dimension, vector) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def __contains__(self, key: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM embeddings WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self) -> None:
+        """Delete all vectors, for every process sharing the store"""
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM embeddings")
+        logger.info(f"Cleared embedding store {self.path}")
+
+    def get_meta(self, name: str) -> Optional[str]:
+        """Get a metadata value of the store"""
+        row = self._connection().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str) -> None:
+        """Set a metadata value of the store"""
+        with self._transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def migrate_pickle(self, pickle_path: str) -> int:
+        """
+        Import a legacy pickled {key: vector} cache and rename it to *.migrated
+
+        Safe to call from several processes at once: the import runs in one
+        transaction and the rename succeeds for exactly one of them.
+
+        Args:
+            pickle_path: Path of the pickle file
+
+        Returns:
+            int: Number of entries imported, or -1 on error
+        """
+        if not os.path.exists(pickle_path):
+            return 0
+        try:
+            with open(pickle_path, 'rb') as f:
+                legacy_cache = pickle.load(f)
+            imported = self.put_many(legacy_cache.items())
+            try:
+                os.replace(pickle_path, pickle_path + ".migrated")
+            except FileNotFoundError:
+                # Another worker migrated the same file first
+                pass
+            self.set_meta("migrated_from", os.path.basename(pickle_path))
+            self.set_meta("migrated_at", time.strftime("%Y-%m-%dT%H:%M:%S"))
+            logger.info(f"Migrated {imported} embeddings from {pickle_path} to {self.path}")
+            return imported
+        except Exception as e:
+            logger.error(f"Error migrating embedding cache {pickle_path}: {str(e)}")
+            logger.error(traceback.format_exc())
+            return -1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of stored vectors and the size of the store files"""
+        file_bytes = sum(os.path.getsize(path) for path in (self.path, self.path + "-wal") if os.path.exists(path))
+        return {"entries": len(self), "file_bytes": file_bytes}
+
+    def close(self) -> None:
+        """Close the connections of all threads"""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
@@ -3,13 +3,27 @@ FAISS Index Manager for semantic search
 Handles building, saving, loading and querying the FAISS index
 """
 import os
+import sys
 import time
 import json
 import logging
+import threading
 import traceback
+import tracemalloc
 import numpy as np
 import faiss
 from typing import List, Tuple, Dict, Any, Optional
+from id_map import IDMap, stable_faiss_ids
+from json_stream import JSONArrayStream
+from embedding_sidecar import get_sidecar_paths, is_sidecar_fresh, load_sidecar
+from rerank_store import RerankStore
+from nic_hierarchy import (DEFAULT_ROLLUP_CANDIDATES, DEFAULT_ROLLUP_TOP_N, HIERARCHY_LEVELS,
+                           NICHierarchy, document_codes)
+from vector_transform import TRANSFORM_TYPES, create_transform, get_transform, train_index
+from index_manifest import check_manifest, create_manifest, describe_file, load_manifest, save_manifest
+from rw_lock import ReadWriteLock, write_locked
+from chunked_builder import DEFAULT_CHECKPOINT_ROWS, ChunkedIndexBuilder, build_fingerprint
+from async_executor import BoundedExecutor, get_search_executor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -17,16 +31,137 @@ logger = logging.getLogger(__name__)
 
 # Default paths for index and ID map
 DEFAULT_INDEX_PATH = "faiss_index.bin"
-DEFAULT_ID_MAP_PATH = "faiss_id_map.json"
+DEFAULT_ID_MAP_PATH = "faiss_id_map.npy"
+# ID maps written before the binary format are still loaded if no .npy map exists
+LEGACY_ID_MAP_PATH = "faiss_id_map.json"
+DEFAULT_PARAMS_PATH = "faiss_index_params.json"
 DEFAULT_JSON_PATH = "output.json"
 
+# Name of the embedding field used to build the index
+EMBEDDING_FIELD = "Vector-Embedding_SubClass"
+
+# Embedding model the vectors of the JSON file were created with (recorded in the manifest)
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Manifest of the build inputs, e.g. faiss_index.bin -> faiss_index_manifest.json
+MANIFEST_SUFFIX = "_manifest.json"
+
+# NIC hierarchy codes of the indexed documents, e.g. faiss_index.bin -> faiss_index_hierarchy.npy
+HIERARCHY_SUFFIX = "_hierarchy.npy"
+
+# Incremental changes are appended to a delta log next to the index
+# (<index_path>.delta.jsonl) and folded into the index files by compact()
+DELTA_LOG_SUFFIX = ".delta.jsonl"
+DEFAULT_COMPACT_THRESHOLD = 1000
+
+# Number of embeddings copied into the preallocated buffer at a time by streaming builds
+DEFAULT_STREAM_CHUNK_SIZE = 4096
+
+# Supported index types
+# flat:     exact brute-force inner product (the original behaviour)
+# ivf_flat: inverted file with uncompressed vectors, probes `nprobe` lists per query
+# hnsw:     graph based index, explores `ef_search` candidates per query
+# ivf_pq:   inverted file with product-quantized vectors, smallest memory footprint
+# sq_fp16:  exhaustive scan over 16-bit float codes (half the memory of flat), exactly re-ranked
+# sq_int8:  exhaustive scan over 8-bit codes (a quarter of the memory of flat), exactly re-ranked
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq_fp16", "sq_int8")
+DEFAULT_INDEX_TYPE = "flat"
+
+INDEX_TYPE_DESCRIPTIONS = {
+    "flat": "Flat Inner Product (Cosine Similarity)",
+    "ivf_flat": "IVF-Flat Inner Product (Cosine Similarity)",
+    "hnsw": "HNSW Inner Product (Cosine Similarity)",
+    "ivf_pq": "IVF-PQ Inner Product (Approximate Cosine Similarity)",
+    "sq_fp16": "FP16 Scalar-Quantized Inner Product (Re-ranked Cosine Similarity)",
+    "sq_int8": "INT8 Scalar-Quantized Inner Product (Re-ranked Cosine Similarity)"
+}
+
+# FAISS quantizer types of the scalar-quantized index types
+SQ_QUANTIZER_TYPES = {
+    "sq_fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq_int8": faiss.ScalarQuantizer.QT_8bit
+}
+
+# Scalar-quantized and transformed indexes fetch rerank_factor * top_k candidates and
+# re-score them exactly from the float32 vectors, e.g. faiss_index.bin -> faiss_index_vectors.npy
+DEFAULT_RERANK_FACTOR = 4
+RERANK_SUFFIX = "_vectors.npy"
+
+# Default build parameters, None means "derive from the corpus size"
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,                # Number of IVF lists (default: 4 * sqrt(n))
+    "hnsw_m": 32,                 # Number of neighbours per HNSW node
+    "ef_construction": 40,        # HNSW candidate list size during build
+    "pq_m": 16,                   # Number of PQ sub-quantizers (must divide the dimension)
+    "pq_nbits": 8,                # Bits per PQ code
+    "training_sample_size": None, # Vectors used for training (default: derived from nlist / pq_nbits)
+    "training_seed": 42,          # Seed for the training sample selection
+    "transform": None,            # Learned reduction applied before indexing: "pca" or "opq" (ivf_pq only)
+    "transform_dim": None         # Dimension after the transform (default: half the dimension for pca)
+}
+
+# Default query-time parameters
+DEFAULT_NPROBE = 8
+DEFAULT_EF_SEARCH = 64
+
+# FAISS recommends at least ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# Read flags for memory-mapped loading. IO_FLAG_MMAP_IFC maps the vector codes
+# zero-copy (faiss >= 1.8), older versions only support IO_FLAG_MMAP.
+MMAP_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+# Chunk size used when paging the index file into the OS page cache
+WARMUP_CHUNK_SIZE = 4 * 1024 * 1024
+
+def get_peak_rss() -> Optional[int]:
+    """
+    Get the peak resident set size of the current process in bytes
+    
+    Returns:
+        int: Peak RSS in bytes, or None if it cannot be determined on this platform
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+def get_process_rss() -> Optional[int]:
+    """
+    Get the resident set size of the current process in bytes
+    
+    Returns:
+        int: RSS in bytes, or None if it cannot be determined on this platform
+    """
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    # Fall back to the peak RSS where the current RSS is not available
+    return get_peak_rss()
+
 class FAISSIndexManager:
     """Manages FAISS index operations for semantic search"""
     
     def __init__(self, 
                 json_file_path: Optional[str] = None,
                 index_path: Optional[str] = None, 
-                id_map_path: Optional[str] = None):
+                id_map_path: Optional[str] = None,
+                index_type: Optional[str] = None,
+                index_params: Optional[Dict[str, Any]] = None,
+                params_path: Optional[str] = None,
+                nprobe: Optional[int] = None,
+                ef_search: Optional[int] = None,
+                mmap: bool = False,
+                warmup: bool = False,
+                compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+                model_name: Optional[str] = None,
+                verify_manifest: bool = True,
+                rerank_factor: Optional[int] = None):
         """
         Initialize the FAISS index manager
         
@@ -34,17 +169,89 @@ class FAISSIndexManager:
             json_file_path: Path to the JSON data file
             index_path: Path to save/load the FAISS index
             id_map_path: Path to save/load the ID map
+            index_type: Type of index to build ("flat", "ivf_flat", "hnsw" or "ivf_pq")
+            index_params: Build parameters overriding DEFAULT_INDEX_PARAMS
+            params_path: Path to save/load the build parameters of the index
+            nprobe: Default number of IVF lists probed per query
+            ef_search: Default HNSW search depth per query
+            mmap: Memory-map the index file instead of reading it into private memory,
+                  so that several worker processes share its pages through the OS page cache
+            warmup: Page the index into memory right after loading it
+            compact_threshold: Number of delta log records after which incremental
+                               changes are compacted into the index files
+            model_name: Embedding model of the vectors, recorded in the index manifest
+            verify_manifest: Refuse to load an index whose manifest shows that the JSON file,
+                             the model or the index parameters changed since it was built
+            rerank_factor: Candidates per result re-scored exactly for scalar-quantized indexes
+                           (1 disables re-ranking)
         """
         # Store paths
         self.index_path = index_path or DEFAULT_INDEX_PATH
         self.id_map_path = id_map_path or DEFAULT_ID_MAP_PATH
+        self.params_path = params_path or DEFAULT_PARAMS_PATH
         self.json_file_path = json_file_path or DEFAULT_JSON_PATH
         
+        # Index configuration
+        self.index_type = (index_type or DEFAULT_INDEX_TYPE).lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type '{index_type}'. Must be one of: {', '.join(INDEX_TYPES)}")
+        self.index_params = dict(DEFAULT_INDEX_PARAMS)
+        self.index_params.update(index_params or {})
+        self.nprobe = nprobe or DEFAULT_NPROBE
+        self.ef_search = ef_search or DEFAULT_EF_SEARCH
+        
+        # Resolved parameters of the index currently loaded (persisted next to the index)
+        self.build_params = None
+        
+        # Load mode and statistics of the last load
+        self.mmap = mmap
+        self.warmup = warmup
+        self.load_stats = {}
+        
+        # Delta log of incremental changes not yet compacted into the index files
+        self.delta_log_path = self.index_path + DELTA_LOG_SUFFIX
+        self.compact_threshold = compact_threshold
+        self.pending_deltas = 0
+        
+        # Time and memory statistics of the last build
+        self.build_stats = {}
+        
+        # Manifest of the build inputs and the result of the last check against it
+        self.model_name = model_name or DEFAULT_EMBEDDING_MODEL
+        self.manifest_path = os.path.splitext(self.index_path)[0] + MANIFEST_SUFFIX
+        self.verify_manifest = verify_manifest
+        self.manifest_status = {}
+        
+        # NIC hierarchy codes used to restrict searches to a Section / Division / Group / Class
+        self.hierarchy_path = os.path.splitext(self.index_path)[0] + HIERARCHY_SUFFIX
+        self.hierarchy = None
+        
+        # Memory-mapped float32 vectors used to re-rank the candidates of scalar-quantized indexes
+        self.rerank_factor = rerank_factor or DEFAULT_RERANK_FACTOR
+        self.rerank_path = os.path.splitext(self.index_path)[0] + RERANK_SUFFIX
+        self.rerank_store = None
+        
+        # Stage of the build in progress, polled by admin endpoints while building in the background
+        self.build_progress = {"stage": "idle", "processed": 0, "total": 0}
+        
         # Initialize index and ID map
         self.index = None
         self.id_map = None
         
-        logger.info(f"FAISS Index Manager initialized with json_file_path={self.json_file_path}, index_path={self.index_path}, id_map_path={self.id_map_path}")
+        # Searches share the index under the read lock; loading, building and incremental
+        # changes take the write lock. load_count counts the loads, which ensure_index
+        # makes single-flight under concurrent first searches.
+        self.rw_lock = ReadWriteLock()
+        self.load_count = 0
+        # Incremented whenever the searchable contents change (load, build, incremental
+        # change), so that caches of search responses can tell that they are stale
+        self.data_version = 0
+        # Set by close() once the index generation of this manager is retired
+        self.closed = False
+        # Searches hold only the read lock while deriving missing hierarchy codes
+        self._hierarchy_lock = threading.Lock()
+        
+        logger.info(f"FAISS Index Manager initialized with json_file_path={self.json_file_path}, index_path={self.index_path}, id_map_path={self.id_map_path}, index_type={self.index_type}")
     
     def load_json_data(self) -> List[Dict[str, Any]]:
         """
@@ -63,6 +270,7 @@ class FAISSIndexManager:
             logger.error(traceback.format_exc())
             return []
     
+    @write_locked
     def load_index(self) -> bool:
         """
         Load the FAISS index and ID map from disk
@@ -72,21 +280,72 @@ class FAISSIndexManager:
         """
         try:
             # Check if the files exist
-            if not os.path.exists(self.index_path) or not os.path.exists(self.id_map_path):
-                logger.warning(f"Index or ID map file not found: {self.index_path} / {self.id_map_path}")
+            id_map_path = self.get_id_map_path()
+            if not os.path.exists(self.index_path) or not os.path.exists(id_map_path):
+                logger.warning(f"Index or ID map file not found: {self.index_path} / {id_map_path}")
                 return False
             
-            # Load the index
-            self.index = faiss.read_index(self.index_path)
-            logger.info(f"Loaded FAISS index with {self.index.ntotal} vectors and dimension {self.index.d}")
+            # Make sure the index was built from the current inputs (a stat in the common case)
+            if self.verify_manifest:
+                check_start = time.time()
+                fresh, reason = self.check_manifest()
+                if not fresh and reason != "no manifest":
+                    logger.warning(f"Not loading stale index {self.index_path}: {reason}")
+                    return False
+                if not fresh:
+                    logger.warning(f"Index {self.index_path} has no manifest, cannot check whether it is up to date")
+                logger.info(f"Index manifest check: {reason} ({(time.time() - check_start) * 1000:.1f} ms)")
             
-            # Load the ID map
-            with open(self.id_map_path, 'r') as f:
-                # Convert string keys to integers, since JSON serializes all keys as strings
-                id_map_raw = json.load(f)
-                self.id_map = {int(k): v for k, v in id_map_raw.items()}
-                
-            logger.info(f"Loaded ID map with {len(self.id_map)} entries")
+            # Load the index, either into private memory or memory-mapped
+            rss_before = get_process_rss()
+            load_start = time.time()
+            if self.mmap:
+                self.index = faiss.read_index(self.index_path, MMAP_READ_FLAGS)
+            else:
+                self.index = faiss.read_index(self.index_path)
+            load_time = time.time() - load_start
+            logger.info(f"Loaded FAISS index with {self.index.ntotal} vectors and dimension {self.index.d} "
+                        f"({'mmap' if self.mmap else 'heap'}, {load_time * 1000:.1f} ms)")
+            
+            warmup_time = self._warmup_index() if self.warmup else None
+            rss_after = get_process_rss()
+            
+            # Load the ID map (binary .npy, or the legacy JSON dict)
+            self.id_map = IDMap.load(id_map_path, mmap=self.mmap)
+            logger.info(f"Loaded ID map with {len(self.id_map)} entries from {id_map_path}")
+            
+            # Load the build parameters; indexes built before they were persisted are flat
+            self.build_params = self._load_build_params()
+            logger.info(f"Index type: {self.build_params['index_type']}")
+            
+            # Load the hierarchy codes; indexes built before they were persisted derive them on first use
+            self.hierarchy = NICHierarchy.load(self.hierarchy_path) if os.path.exists(self.hierarchy_path) else None
+            if self.hierarchy is not None and not self.hierarchy.covers(self.id_map.faiss_ids):
+                # e.g. derived with stable ids for a legacy positional index by an earlier version
+                logger.warning(f"Hierarchy {self.hierarchy_path} does not match the ids of the index, deriving it again")
+                self.hierarchy = None
+            
+            # Scalar-quantized and transformed indexes re-rank from the memory-mapped float32 vectors
+            self.rerank_store = None
+            if self._uses_rerank_store(self.build_params):
+                if os.path.exists(self.rerank_path):
+                    self.rerank_store = RerankStore.load(self.rerank_path, mmap=True)
+                else:
+                    logger.warning(f"Re-ranking vectors {self.rerank_path} not found, results use the approximate scores")
+            
+            # Re-apply incremental changes made since the last compaction
+            self.pending_deltas = self._replay_delta_log()
+            
+            self.load_stats = {
+                "load_mode": "mmap" if self.mmap else "heap",
+                "load_time_ms": round(load_time * 1000, 2),
+                "warmup_time_ms": round(warmup_time * 1000, 2) if warmup_time is not None else None,
+                "index_file_bytes": os.path.getsize(self.index_path),
+                "rerank_file_bytes": os.path.getsize(self.rerank_path) if self.rerank_store is not None else None,
+                "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            }
+            self.load_count += 1
+            self.data_version += 1
             
             return True
             
@@ -95,12 +354,326 @@ class FAISSIndexManager:
             logger.error(traceback.format_exc())
             return False
     
-    def build_index(self, force_rebuild: bool = False) -> bool:
+    def get_id_map_path(self) -> str:
+        """
+        Get the path of the ID map file to load
+        
+        Returns:
+            The configured ID map path, or the legacy JSON map next to it if only that exists
+        """
+        if os.path.exists(self.id_map_path) or self.id_map_path.endswith(".json"):
+            return self.id_map_path
+        legacy_path = os.path.join(os.path.dirname(self.id_map_path), LEGACY_ID_MAP_PATH)
+        if os.path.exists(legacy_path):
+            return legacy_path
+        return self.id_map_path
+    
+    def _warmup_index(self) -> float:
+        """
+        Page the index into memory so that the first queries do not pay for page faults
+        
+        The index file is read sequentially to pull it into the OS page cache (shared
+        between all processes mapping it) and a probe query touches the index structures.
+        
+        Returns:
+            float: Time spent warming up in seconds
+        """
+        warmup_start = time.time()
+        try:
+            with open(self.index_path, 'rb') as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                while f.read(WARMUP_CHUNK_SIZE):
+                    pass
+            
+            if self.index.ntotal > 0:
+                probe = np.zeros((1, self.index.d), dtype='float32')
+                self.index.search(probe, 1)
+        except Exception as e:
+            logger.warning(f"Error warming up FAISS index: {str(e)}")
+        
+        warmup_time = time.time() - warmup_start
+        logger.info(f"Index warm-up completed in {warmup_time * 1000:.1f} ms")
+        return warmup_time
+    
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """
+        Get load time and memory statistics of the loaded index
+        
+        Returns:
+            Dictionary with the load mode, load/warm-up times, index file size and RSS figures
+        """
+        stats = dict(self.load_stats)
+        stats["process_rss_bytes"] = get_process_rss()
+        stats["load_count"] = self.load_count
+        return stats
+    
+    def memory_recall_report(self, index_types: Optional[List[str]] = None, num_queries: int = 200,
+                             top_k: int = 10, noise: float = 0.05, seed: int = 42) -> List[Dict[str, Any]]:
+        """
+        Compare the memory footprint and recall of index types on the corpus
+        
+        Every index type is built in memory from the embeddings of the JSON file
+        (nothing is written to disk) and searched with perturbed copies of randomly
+        chosen corpus vectors. Recall@k is measured against exact flat search. For
+        scalar-quantized types and indexes with a transform (see the "transform"
+        index parameter) the recall after exact re-ranking is reported too; their
+        float32 vectors are memory-mapped, so they cost disk space and page cache
+        rather than private memory.
+        
+        Args:
+            index_types: Index types to compare (default: all)
+            num_queries: Number of sample queries
+            top_k: Number of results per query
+            noise: Standard deviation of the noise added to the sample queries
+            seed: Seed for the query sample
+            
+        Returns:
+            One dictionary per index type with its size, bytes per vector, recall and query time
+        """
+        if is_sidecar_fresh(self.json_file_path):
+            _, embedding_matrix, _ = self._load_sidecar_matrix()
+        else:
+            _, embedding_matrix, _ = self._load_embedding_matrix()
+        if embedding_matrix is None:
+            return []
+        faiss.normalize_L2(embedding_matrix)
+        num_vectors, dimension = embedding_matrix.shape
+        top_k = min(top_k, num_vectors)
+        
+        # Perturbed corpus vectors as queries, exact flat search as the ground truth
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(num_vectors, size=min(num_queries, num_vectors), replace=False)
+        queries = embedding_matrix[rows] + rng.normal(0, noise, (len(rows), dimension)).astype('float32')
+        faiss.normalize_L2(queries)
+        exact_index = faiss.IndexFlatIP(dimension)
+        exact_index.add(embedding_matrix)
+        _, truth = exact_index.search(queries, top_k)
+        del exact_index
+        
+        def recall(found: np.ndarray) -> float:
+            hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+            return round(hits / truth.size, 4)
+        
+        report = []
+        for index_type in index_types or INDEX_TYPES:
+            candidate = FAISSIndexManager(json_file_path=self.json_file_path, index_type=index_type,
+                                          index_params=self.index_params, nprobe=self.nprobe,
+                                          ef_search=self.ef_search, rerank_factor=self.rerank_factor)
+            build_start = time.time()
+            index, build_params = candidate._create_index(dimension, num_vectors)
+            if not index.is_trained:
+                train_index(index, candidate._select_training_sample(embedding_matrix, build_params))
+            index.add(embedding_matrix)
+            build_time = time.time() - build_start
+            candidate.index, candidate.build_params = index, build_params
+            
+            search_params = candidate._search_parameters()
+            search_start = time.time()
+            _, found = index.search(queries, top_k, params=search_params)
+            query_time = (time.time() - search_start) / len(queries)
+            
+            index_bytes = int(faiss.serialize_index(index).nbytes)
+            entry = {
+                "index_type": index_type,
+                "transform": build_params.get("transform"),
+                "index_dimension": build_params.get("transform_dim", dimension),
+                "index_bytes": index_bytes,
+                "bytes_per_vector": round(index_bytes / num_vectors, 1),
+                f"recall@{top_k}": recall(found),
+                "query_time_ms": round(query_time * 1000, 3),
+                "build_time_s": round(build_time, 3)
+            }
+            
+            if self._uses_rerank_store(build_params):
+                rerank_store = RerankStore.from_vectors(np.arange(num_vectors), embedding_matrix)
+                search_start = time.time()
+                _, candidates = index.search(queries, min(top_k * self.rerank_factor, num_vectors), params=search_params)
+                _, reranked = rerank_store.rerank(queries, candidates, top_k)
+                entry[f"reranked_recall@{top_k}"] = recall(reranked)
+                entry["reranked_query_time_ms"] = round((time.time() - search_start) / len(queries) * 1000, 3)
+                entry["rerank_file_bytes"] = rerank_store.nbytes
+            
+            report.append(entry)
+            logger.info(f"Memory/recall report: {entry}")
+        return report
+    
+    def _load_embedding_matrix(self) -> Tuple[Optional[List[str]], Optional[np.ndarray], List[Tuple[str, ...]]]:
+        """
+        Load document IDs and embeddings by parsing the whole JSON file at once
+        
+        Returns:
+            Tuple of (document IDs, float32 embedding matrix, hierarchy codes), or
+            (None, None, []) if no embeddings were found
+        """
+        # Load data from JSON file
+        json_data = self.load_json_data()
+        if not json_data:
+            logger.error("No data available to build index")
+            return None, None, []
+        
+        logger.info(f"Building index from {len(json_data)} documents")
+        
+        # Extract document IDs and embeddings
+        doc_ids = []
+        embeddings = []
+        codes = []
+        
+        for i, doc in enumerate(json_data):
+            # Check if document has an embedding field
+            if EMBEDDING_FIELD in doc and doc[EMBEDDING_FIELD]:
+                # Get document ID and embedding
+                doc_id = str(doc["_id"])
+                embedding = doc[EMBEDDING_FIELD]
+                
+                # Validate embedding
+                if isinstance(embedding, list) and len(embedding) > 0:
+                    doc_ids.append(doc_id)
+                    embeddings.append(embedding)
+                    codes.append(document_codes(doc))
+        
+        if len(embeddings) == 0:
+            logger.error("No valid embeddings found in data. Make sure the JSON contains 'Vector-Embedding_SubClass' fields.")
+            return None, None, []
+            
+        logger.info(f"Found {len(embeddings)} valid embeddings out of {len(json_data)} documents")
+            
+        # Convert to numpy array
+        return doc_ids, np.array(embeddings).astype('float32'), codes
+    
+    def _stream_embedding_matrix(self, chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE) -> Tuple[Optional[List[str]], Optional[np.ndarray], List[Tuple[str, ...]]]:
+        """
+        Load document IDs and embeddings while parsing the JSON file incrementally
+        
+        Documents are decoded one at a time and their embeddings are copied in chunks
+        into a preallocated float32 buffer, so the parsed JSON is never held in memory.
+        The buffer is sized from the file size once the first chunk shows the average
+        document size, and grown if the estimate was too small.
+        
+        Args:
+            chunk_size: Number of embeddings converted and copied into the buffer at a time
+            
+        Returns:
+            Tuple of (document IDs, float32 embedding matrix, hierarchy codes), or
+            (None, None, []) if no embeddings were found
+        """
+        if not os.path.exists(self.json_file_path):
+            logger.error(f"JSON file not found: {self.json_file_path}")
+            return None, None, []
+        
+        file_size = os.path.getsize(self.json_file_path)
+        stream = JSONArrayStream(self.json_file_path)
+        doc_ids = []
+        codes = []
+        chunk = []
+        buffer = None
+        num_rows = 0
+        
+        def flush_chunk():
+            nonlocal buffer, num_rows
+            chunk_matrix = np.asarray(chunk, dtype='float32')
+            if buffer is None:
+                # Estimate the number of documents from the size of the ones parsed so far
+                bytes_per_doc = max(1, stream.position / max(1, stream.count))
+                capacity = max(len(chunk), int(file_size / bytes_per_doc * 1.05))
+                buffer = np.empty((capacity, chunk_matrix.shape[1]), dtype='float32')
+                logger.info(f"Preallocated embedding buffer for {capacity} vectors of dimension {chunk_matrix.shape[1]}")
+            elif num_rows + len(chunk) > buffer.shape[0]:
+                capacity = int((num_rows + len(chunk)) * 1.25)
+                logger.info(f"Growing embedding buffer to {capacity} vectors")
+                grown = np.empty((capacity, buffer.shape[1]), dtype='float32')
+                grown[:num_rows] = buffer[:num_rows]
+                buffer = grown
+            buffer[num_rows:num_rows + len(chunk)] = chunk_matrix
+            num_rows += len(chunk)
+            chunk.clear()
+        
+        for doc in stream:
+            embedding = doc.get(EMBEDDING_FIELD)
+            if isinstance(embedding, list) and len(embedding) > 0:
+                doc_ids.append(str(doc["_id"]))
+                codes.append(document_codes(doc))
+                chunk.append(embedding)
+                if len(chunk) >= chunk_size:
+                    flush_chunk()
+        if chunk:
+            flush_chunk()
+        
+        if num_rows == 0:
+            logger.error("No valid embeddings found in data. Make sure the JSON contains 'Vector-Embedding_SubClass' fields.")
+            return None, None, []
+        
+        logger.info(f"Streamed {num_rows} valid embeddings out of {stream.count} documents")
+        # A leading slice of a C-contiguous buffer is itself contiguous, no copy needed
+        return doc_ids, buffer[:num_rows], codes
+    
+    def _load_sidecar_matrix(self) -> Tuple[Optional[List[str]], Optional[np.ndarray], List[Tuple[str, ...]]]:
+        """
+        Load document IDs and embeddings from the .npy sidecar of the JSON file
+        
+        Returns:
+            Tuple of (document IDs, float32 embedding matrix, hierarchy codes), or (None, None, []) on error
+        """
+        doc_ids, vectors = load_sidecar(self.json_file_path, mmap=True)
+        if vectors is None:
+            return None, None, []
+        doc_ids = doc_ids.tolist()
+        codes = self._source_document_codes(doc_ids)
+        # Copy out of the memory map in one call, the copy is normalized in place
+        return doc_ids, np.array(vectors, dtype='float32'), codes
+    
+    def _iter_source_documents(self):
+        """
+        Iterate over the documents of the JSON file without keeping them in memory
+        
+        Uses the documents file of the embedding sidecar when it is up to date,
+        which is much smaller than the JSON file with its embeddings.
+        
+        Returns:
+            Iterator over the documents
+        """
+        if is_sidecar_fresh(self.json_file_path, include_docs=True):
+            return iter(JSONArrayStream(get_sidecar_paths(self.json_file_path)["docs"]))
+        return iter(JSONArrayStream(self.json_file_path))
+    
+    def _source_document_codes(self, doc_ids: List[str]) -> List[Tuple[str, ...]]:
+        """
+        Get the hierarchy codes of documents from the JSON file
+        
+        Args:
+            doc_ids: Document IDs
+            
+        Returns:
+            Hierarchy code tuple of every document (empty codes for unknown documents)
+        """
+        codes_by_id = {str(doc.get("_id")): document_codes(doc) for doc in self._iter_source_documents()}
+        empty_codes = ("",) * len(HIERARCHY_LEVELS)
+        return [codes_by_id.get(doc_id, empty_codes) for doc_id in doc_ids]
+    
+    @write_locked
+    def build_index(self, force_rebuild: bool = False, streaming: bool = False,
+                    chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE, track_memory: bool = False,
+                    use_sidecar: bool = True, threads: Optional[int] = None, resume: bool = False,
+                    checkpoint_rows: Optional[int] = DEFAULT_CHECKPOINT_ROWS) -> bool:
         """
         Build or rebuild the FAISS index
         
+        The embeddings are read from the .npy sidecar of the JSON file when it is
+        up to date (see embedding_sidecar.py), otherwise from the JSON file itself.
+        They are normalized in chunks on a thread pool and added to the index in
+        chunks, checkpointing the partial index every checkpoint_rows vectors
+        (see chunked_builder.py).
+        
         Args:
             force_rebuild: Force rebuild even if the index exists
+            streaming: Parse the JSON file incrementally instead of loading it at once
+            chunk_size: Number of embeddings copied at a time when streaming, and normalized
+                        and added to the index at a time
+            track_memory: Trace Python memory allocations to report the peak memory of the build
+            use_sidecar: Read the embeddings from an up to date .npy sidecar if there is one
+            threads: Threads normalizing the embeddings (default: the FAISS OpenMP thread count)
+            resume: Continue from the checkpoint of an interrupted build with the same inputs
+            checkpoint_rows: Vectors added between checkpoints of the partial index (0 disables them)
             
         Returns:
             bool: True if successfully built, False otherwise
@@ -111,134 +684,1019 @@ class FAISSIndexManager:
                 logger.info("Index already loaded, skipping build")
                 return True
             
-            # Check if files exist and we're not forcing a rebuild
-            if not force_rebuild and os.path.exists(self.index_path) and os.path.exists(self.id_map_path):
+            # Check if files exist and we're not forcing a rebuild; an index that is
+            # up to date with its manifest is loaded instead of rebuilt
+            if not force_rebuild and os.path.exists(self.index_path) and os.path.exists(self.get_id_map_path()):
                 logger.info("Index files exist, attempting to load instead of rebuild")
-                return self.load_index()
-            
-            # Load data from JSON file
-            json_data = self.load_json_data()
-            if not json_data:
-                logger.error("No data available to build index")
-                return False
-            
-            logger.info(f"Building index from {len(json_data)} documents")
+                if self.load_index():
+                    return True
+                logger.info("Existing index could not be loaded or is stale, rebuilding")
             
-            # Extract document IDs and embeddings
-            doc_ids = []
-            embeddings = []
+            build_start = time.time()
+            if track_memory:
+                tracemalloc.start()
+            self._set_build_progress("loading")
             
-            for i, doc in enumerate(json_data):
-                # Check if document has an embedding field
-                embedding_field_name = "Vector-Embedding_SubClass"
-                
-                if embedding_field_name in doc and doc[embedding_field_name]:
-                    # Get document ID and embedding
-                    doc_id = str(doc["_id"])
-                    embedding = doc[embedding_field_name]
-                    
-                    # Validate embedding
-                    if isinstance(embedding, list) and len(embedding) > 0:
-                        doc_ids.append(doc_id)
-                        embeddings.append(embedding)
-            
-            if len(embeddings) == 0:
-                logger.error("No valid embeddings found in data. Make sure the JSON contains 'Vector-Embedding_SubClass' fields.")
+            # Load document IDs and embeddings from the sidecar or the JSON file
+            build_mode = "streaming" if streaming else "in_memory"
+            if use_sidecar and is_sidecar_fresh(self.json_file_path):
+                build_mode = "sidecar"
+                doc_ids, embedding_matrix, codes = self._load_sidecar_matrix()
+            elif streaming:
+                doc_ids, embedding_matrix, codes = self._stream_embedding_matrix(chunk_size)
+            else:
+                doc_ids, embedding_matrix, codes = self._load_embedding_matrix()
+            if embedding_matrix is None:
+                self._set_build_progress("failed")
                 return False
-                
-            logger.info(f"Found {len(embeddings)} valid embeddings out of {len(json_data)} documents")
-                
-            # Convert to numpy array
-            embedding_matrix = np.array(embeddings).astype('float32')
             
             # Get dimensions
             num_vectors = embedding_matrix.shape[0]
             dimension = embedding_matrix.shape[1]
             
+            # Stable FAISS ids derived from the document IDs (not row positions),
+            # so that documents can later be updated or removed in place
+            ids_array = stable_faiss_ids(doc_ids)
+            unique_ids, first_rows = np.unique(ids_array, return_index=True)
+            if len(unique_ids) < num_vectors:
+                logger.warning(f"Skipping {num_vectors - len(unique_ids)} documents with duplicate IDs")
+                first_rows.sort()
+                embedding_matrix = embedding_matrix[first_rows]
+                ids_array = ids_array[first_rows]
+                doc_ids = [doc_ids[row] for row in first_rows]
+                codes = [codes[row] for row in first_rows]
+                num_vectors = len(first_rows)
+            
             logger.info(f"Building index with {num_vectors} vectors of dimension {dimension}")
             
             # Create inner product (cosine similarity) index
             # We normalize the vectors to use the inner product as cosine similarity
-            faiss.normalize_L2(embedding_matrix)
-            self.index = faiss.IndexFlatIP(dimension)
+            builder = ChunkedIndexBuilder(self.index_path, chunk_size, threads=threads,
+                                          checkpoint_rows=checkpoint_rows, progress_callback=self._set_build_progress)
+            builder.normalize(embedding_matrix)
+            fingerprint = build_fingerprint(self.json_file_path, self.model_name,
+                                            dict(self.index_params, index_type=self.index_type), ids_array, dimension)
+            index, start_row, build_params = builder.load_checkpoint(fingerprint) if resume else (None, 0, None)
+            if not resume:
+                builder.clear_checkpoint()
+            
+            if index is None:
+                base_index, build_params = self._create_index(dimension, num_vectors)
+                
+                # Train the index (and its transform) on a sample of the vectors if required (IVF, PQ, PCA)
+                if not base_index.is_trained:
+                    training_sample = self._select_training_sample(embedding_matrix, build_params)
+                    logger.info(f"Training {self.index_type} index on {len(training_sample)} vectors")
+                    self._set_build_progress("training", 0, len(training_sample))
+                    train_start = time.time()
+                    train_index(base_index, training_sample)
+                    logger.info(f"Index trained in {time.time() - train_start:.2f} seconds")
+                
+                # IVF indexes store the ids themselves (and can only remove vectors that way),
+                # the other index types are wrapped in an IndexIDMap
+                if isinstance(self._unwrap_index(base_index), faiss.IndexIVF):
+                    index = base_index
+                else:
+                    index = faiss.IndexIDMap(base_index)
             
-            # Add vectors to index with IDs
-            self.index = faiss.IndexIDMap(self.index)
-            ids_array = np.arange(num_vectors).astype('int64')
-            self.index.add_with_ids(embedding_matrix, ids_array)
+            # Add vectors to index with IDs in chunks, reporting progress and checkpointing
+            builder.add(index, embedding_matrix, ids_array, start_row, fingerprint, build_params)
             
-            # Create ID map
-            self.id_map = {int(idx): doc_id for idx, doc_id in enumerate(doc_ids)}
+            # Publish the index and ID map together once they are complete
+            self.index, self.id_map = index, IDMap.from_doc_ids(doc_ids, ids_array)
+            self.data_version += 1
+            self.hierarchy = NICHierarchy.from_codes(ids_array, codes)
+            self.rerank_store = RerankStore.from_vectors(ids_array, embedding_matrix) if self._uses_rerank_store(build_params) else None
             
-            # Save the index and ID map
-            faiss.write_index(self.index, self.index_path)
-            with open(self.id_map_path, 'w') as f:
-                json.dump(self.id_map, f)
+            # Save the index, ID map and build parameters; the rebuilt index
+            # supersedes any incremental changes in the delta log
+            self._set_build_progress("saving", num_vectors, num_vectors)
+            self._write_index_files()
+            if self.rerank_store is not None:
+                # Serve the re-ranking vectors from the page cache instead of private memory
+                self.rerank_store = RerankStore.load(self.rerank_path, mmap=True)
+            elif os.path.exists(self.rerank_path):
+                os.remove(self.rerank_path)
+            self.build_params = build_params
+            self._save_build_params(build_params)
+            self._truncate_delta_log()
+            self._write_manifest(dimension)
+            builder.clear_checkpoint()
             
-            logger.info(f"Index built and saved successfully with {num_vectors} vectors")
+            self.build_stats = {
+                "mode": build_mode,
+                "num_vectors": num_vectors,
+                **builder.stats,
+                "build_time_s": round(time.time() - build_start, 3),
+                "peak_rss_bytes": get_peak_rss(),
+                "traced_peak_bytes": tracemalloc.get_traced_memory()[1] if track_memory else None
+            }
+            self._set_build_progress("done", num_vectors, num_vectors)
+            logger.info(f"Index built and saved successfully with {num_vectors} vectors: {self.build_stats}")
             return True
             
         except Exception as e:
+            self._set_build_progress("failed")
             logger.error(f"Error building FAISS index: {str(e)}")
             logger.error(traceback.format_exc())
             return False
+        finally:
+            if track_memory and tracemalloc.is_tracing():
+                tracemalloc.stop()
     
-    def search(self, query_embedding: List[float], top_k: int = 10) -> List[Tuple[str, float]]:
+    def _set_build_progress(self, stage: str, processed: int = 0, total: int = 0) -> None:
         """
-        Search the FAISS index with a query embedding
+        Record the stage of the build in progress
         
         Args:
-            query_embedding: The query embedding vector
-            top_k: Number of results to return
+            stage: Build stage ("loading", "normalizing", "training", "adding", "saving", "done" or "failed")
+            processed: Number of vectors processed in this stage
+            total: Number of vectors to process in this stage
+        """
+        # Replace the whole dict so that readers on other threads see a consistent snapshot
+        self.build_progress = {"stage": stage, "processed": processed, "total": total}
+    
+    def _create_index(self, dimension: int, num_vectors: int) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Create an empty (untrained) FAISS index of the configured type
+        
+        Args:
+            dimension: Dimension of the vectors
+            num_vectors: Number of vectors that will be added
             
         Returns:
-            List of tuples (document_id, similarity_score)
+            Tuple of (index, resolved build parameters)
+        """
+        params = dict(self.index_params)
+        build_params = {
+            "index_type": self.index_type,
+            "dimension": dimension,
+            "num_vectors": num_vectors,
+            "metric": "inner_product",
+            "transform": None
+        }
+        
+        # Optional learned transform: the index stores vectors of the reduced dimension
+        transform = None
+        transform_type = params.get("transform")
+        index_dim = dimension
+        if transform_type:
+            if transform_type not in TRANSFORM_TYPES:
+                raise ValueError(f"Unknown transform {transform_type}, expected one of {', '.join(TRANSFORM_TYPES)}")
+            if transform_type == "opq" and self.index_type != "ivf_pq":
+                raise ValueError("The opq transform is only supported by ivf_pq indexes")
+            index_dim = int(params.get("transform_dim") or (dimension if transform_type == "opq" else dimension // 2))
+            index_dim = max(1, min(index_dim, dimension))
+        
+        if self.index_type == "flat":
+            index = faiss.IndexFlatIP(index_dim)
+        elif self.index_type in SQ_QUANTIZER_TYPES:
+            # int8 codes are trained on the value range of each dimension, fp16 needs no training
+            index = faiss.IndexScalarQuantizer(index_dim, SQ_QUANTIZER_TYPES[self.index_type], faiss.METRIC_INNER_PRODUCT)
+        elif self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(index_dim, int(params["hnsw_m"]), faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = int(params["ef_construction"])
+            build_params.update({"hnsw_m": int(params["hnsw_m"]), "ef_construction": int(params["ef_construction"])})
+        else:
+            # IVF based indexes: clamp nlist so every list gets enough training points
+            nlist = params["nlist"] or int(4 * np.sqrt(num_vectors))
+            nlist = max(1, min(int(nlist), num_vectors // MIN_POINTS_PER_CENTROID or 1))
+            build_params["nlist"] = nlist
+            
+            if self.index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(faiss.IndexFlatIP(index_dim), index_dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                # The number of sub-quantizers must divide the dimension
+                pq_m = int(params["pq_m"])
+                if transform_type == "opq":
+                    # OPQ output dimensions are whole sub-vectors
+                    pq_m = min(pq_m, index_dim)
+                    index_dim -= index_dim % pq_m
+                while index_dim % pq_m != 0:
+                    pq_m -= 1
+                # Each sub-quantizer needs at least 2^nbits training points
+                pq_nbits = int(params["pq_nbits"])
+                while pq_nbits > 1 and 2 ** pq_nbits > num_vectors:
+                    pq_nbits -= 1
+                build_params.update({"pq_m": pq_m, "pq_nbits": pq_nbits})
+                index = faiss.IndexIVFPQ(faiss.IndexFlatIP(index_dim), index_dim, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+        
+        if transform_type:
+            transform = create_transform(transform_type, dimension, index_dim, pq_m=build_params.get("pq_m"))
+            index = faiss.IndexPreTransform(transform, index)
+            build_params.update({"transform": transform_type, "transform_dim": index_dim})
+        if self._uses_rerank_store(build_params):
+            build_params["rerank_factor"] = self.rerank_factor
+        return index, build_params
+    
+    @staticmethod
+    def _uses_rerank_store(build_params: Dict[str, Any]) -> bool:
+        """Whether an index of these build parameters re-ranks from float32 vectors (scalar-quantized or transformed)"""
+        return build_params["index_type"] in SQ_QUANTIZER_TYPES or bool(build_params.get("transform"))
+    
+    def _select_training_sample(self, embedding_matrix: np.ndarray, build_params: Dict[str, Any]) -> np.ndarray:
+        """
+        Select a random subset of the vectors to train the index on
+        
+        Args:
+            embedding_matrix: Normalized vectors that will be added to the index
+            build_params: Resolved build parameters (updated with the sample size used)
+            
+        Returns:
+            Contiguous float32 array of training vectors
+        """
+        num_vectors = embedding_matrix.shape[0]
+        sample_size = self.index_params.get("training_sample_size")
+        if not sample_size:
+            # Enough points for the coarse quantizer and the PQ codebooks, capped for large corpora
+            sample_size = MIN_POINTS_PER_CENTROID * max(build_params.get("nlist", 1), 2 ** build_params.get("pq_nbits", 0))
+            sample_size = max(sample_size, 10000)
+        sample_size = min(int(sample_size), num_vectors)
+        build_params["training_sample_size"] = sample_size
+        
+        if sample_size == num_vectors:
+            return embedding_matrix
+        
+        rng = np.random.default_rng(self.index_params.get("training_seed"))
+        sample_rows = np.sort(rng.choice(num_vectors, size=sample_size, replace=False))
+        return np.ascontiguousarray(embedding_matrix[sample_rows])
+    
+    def _save_build_params(self, build_params: Dict[str, Any]) -> None:
+        """Persist the build parameters next to the index"""
+        build_params = dict(build_params, built_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        with open(self.params_path, 'w') as f:
+            json.dump(build_params, f, indent=2)
+    
+    def _load_build_params(self) -> Dict[str, Any]:
+        """
+        Load the persisted build parameters of the current index
+        
+        Returns:
+            Dictionary of build parameters (derived from the index if the file is missing)
+        """
+        build_params = {}
+        if os.path.exists(self.params_path):
+            try:
+                with open(self.params_path, 'r') as f:
+                    build_params = json.load(f)
+            except Exception as e:
+                logger.warning(f"Error loading index parameters: {str(e)}")
+        
+        # The index itself is the source of truth for its type and transform
+        build_params["index_type"] = self._detect_index_type()
+        build_params.setdefault("dimension", self.index.d)
+        transform = get_transform(self.index)
+        if transform is not None:
+            build_params["transform"] = "opq" if isinstance(transform, faiss.OPQMatrix) else "pca"
+            build_params["transform_dim"] = transform.d_out
+        else:
+            build_params["transform"] = None
+        build_params["num_vectors"] = self.index.ntotal
+        return build_params
+    
+    @staticmethod
+    def _unwrap_index(index):
+        """Return an index unwrapped from its IndexIDMap and IndexPreTransform if any, downcast to its concrete type"""
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        if isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        return index
+    
+    def _base_index(self):
+        """Return the loaded index unwrapped from its IndexIDMap and transform, downcast to its concrete type"""
+        return self._unwrap_index(self.index)
+    
+    def _detect_index_type(self) -> str:
+        """Detect the index type of the loaded index"""
+        base_index = self._base_index()
+        if isinstance(base_index, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(base_index, faiss.IndexIVFFlat):
+            return "ivf_flat"
+        if isinstance(base_index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(base_index, faiss.IndexScalarQuantizer):
+            return "sq_fp16" if base_index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq_int8"
+        return "flat"
+    
+    def _search_parameters(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                           selector: Optional[Any] = None):
+        """
+        Build the per-query FAISS search parameters for the loaded index type
+        
+        Args:
+            nprobe: Number of IVF lists to probe (defaults to self.nprobe)
+            ef_search: HNSW search depth (defaults to self.ef_search)
+            selector: faiss.IDSelector restricting the search to a subset of the ids
+            
+        Returns:
+            faiss.SearchParameters instance, or None for unfiltered flat indexes
+        """
+        index_type = self.build_params["index_type"] if self.build_params else self._detect_index_type()
+        if index_type in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF(nprobe=int(nprobe or self.nprobe))
+        elif index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=int(ef_search or self.ef_search))
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if selector is not None:
+            params.sel = selector
+        return params
+    
+    def _get_hierarchy(self) -> Optional[NICHierarchy]:
+        """
+        Get the hierarchy codes of the indexed documents
+        
+        Indexes built before the hierarchy was persisted derive it from the JSON file
+        on first use and save it next to the index. Documents are keyed by their id in
+        the loaded ID map, which holds positional ids for legacy indexes.
+        
+        Returns:
+            NICHierarchy instance, or None if it cannot be derived
+        """
+        if self.hierarchy is None:
+            with self._hierarchy_lock:
+                if self.hierarchy is not None:
+                    return self.hierarchy
+                if not os.path.exists(self.json_file_path):
+                    logger.error(f"No hierarchy file {self.hierarchy_path} and no JSON file to derive it from")
+                    return None
+                start_time = time.time()
+                if self.id_map is None:
+                    logger.error("No ID map loaded to derive the hierarchy for")
+                    return None
+                hierarchy = NICHierarchy.from_documents(self._iter_source_documents(), id_map=self.id_map)
+                hierarchy.save(self.hierarchy_path)
+                self.hierarchy = hierarchy
+                logger.info(f"Derived hierarchy codes of {len(hierarchy)} documents in {time.time() - start_time:.2f} seconds")
+        return self.hierarchy
+    
+    def get_hierarchy_codes(self, level: str) -> List[str]:
+        """
+        Get the distinct codes of a hierarchy level, e.g. all Sections
+        
+        Args:
+            level: Hierarchy level ("section", "division", "group" or "class")
+            
+        Returns:
+            Sorted list of codes
+        """
+        if level not in HIERARCHY_LEVELS:
+            raise ValueError(f"Unsupported hierarchy level '{level}'. Must be one of: {', '.join(HIERARCHY_LEVELS)}")
+        hierarchy = self._get_hierarchy()
+        return hierarchy.get_codes(level) if hierarchy is not None else []
+    
+    def get_index_info(self) -> Dict[str, Any]:
+        """
+        Get a description of the loaded index and its build/query parameters
+        
+        Returns:
+            Dictionary with the index type, description, build parameters and query-time knobs
+        """
+        if self.index is None:
+            return {}
+        
+        build_params = self.build_params or self._load_build_params()
+        index_type = build_params["index_type"]
+        description = INDEX_TYPE_DESCRIPTIONS.get(index_type, index_type)
+        if build_params.get("transform"):
+            description += f" on {build_params['transform'].upper()}-reduced {build_params['transform_dim']}-d vectors"
+        info = {
+            "index_type": index_type,
+            "description": description,
+            "build_params": build_params
+        }
+        if self.build_stats:
+            info["build_stats"] = self.build_stats
+        if self.manifest_status:
+            info["manifest"] = self.manifest_status
+        if index_type in ("ivf_flat", "ivf_pq"):
+            info["nprobe"] = self.nprobe
+        elif index_type == "hnsw":
+            info["ef_search"] = self.ef_search
+        if self._uses_rerank_store(build_params):
+            info["rerank_factor"] = self.rerank_factor if self.rerank_store is not None else 1
+        return info
+    
+    def _manifest_artifacts(self) -> Dict[str, str]:
+        """Get the index files described by the manifest"""
+        return {"index": self.index_path, "id_map": self.id_map_path}
+    
+    def _write_manifest(self, dimension: int) -> None:
+        """
+        Record the inputs and the files of a build in the manifest
+        
+        Args:
+            dimension: Dimension of the indexed vectors
+        """
+        if not os.path.exists(self.json_file_path):
+            logger.warning(f"Source file {self.json_file_path} not found, not writing an index manifest")
+            return
+        manifest = create_manifest(self.json_file_path, self.model_name, dimension, self.index_type,
+                                   self.index_params, self._manifest_artifacts())
+        save_manifest(manifest, self.manifest_path)
+        self.manifest_status = {"fresh": True, "reason": "built", "built_at": manifest["built_at"]}
+    
+    def _refresh_manifest_artifacts(self) -> None:
+        """Update the recorded index files after they were rewritten from the same inputs"""
+        manifest = load_manifest(self.manifest_path)
+        if manifest is None:
+            return
+        manifest["artifacts"] = {name: describe_file(path) for name, path in self._manifest_artifacts().items()}
+        save_manifest(manifest, self.manifest_path)
+    
+    def check_manifest(self, deep: bool = False) -> Tuple[bool, str]:
+        """
+        Check whether the index on disk was built from the current inputs
+        
+        Compares the manifest with the JSON file (size and modification time, hashing
+        only if those disagree), the embedding model, the index type and parameters,
+        and the sizes of the index files.
+        
+        Args:
+            deep: Also verify the hashes of the index files
+            
+        Returns:
+            Tuple of (up to date, reason)
+        """
+        manifest = load_manifest(self.manifest_path)
+        fresh, reason = check_manifest(
+            manifest, self.json_file_path, self.model_name, self.index_type, self.index_params,
+            artifact_paths={"index": self.index_path, "id_map": self.get_id_map_path()},
+            dimension=self.index.d if self.index is not None else None,
+            deep=deep
+        )
+        if fresh and reason == "source touched but content unchanged":
+            # Record the new modification time so the next check is a plain stat again
+            manifest["source"]["mtime_ns"] = os.stat(self.json_file_path).st_mtime_ns
+            save_manifest(manifest, self.manifest_path)
+        self.manifest_status = {"fresh": fresh, "reason": reason,
+                                "built_at": manifest.get("built_at") if manifest else None}
+        return fresh, reason
+    
+    def _write_index_files(self) -> None:
+        """Atomically write the index and the ID map to disk"""
+        tmp_index_path = f"{self.index_path}.tmp"
+        faiss.write_index(self.index, tmp_index_path)
+        os.replace(tmp_index_path, self.index_path)
+        self.id_map.save(self.id_map_path)
+        if self.hierarchy is not None:
+            self.hierarchy.save(self.hierarchy_path)
+        if self.rerank_store is not None:
+            self.rerank_store.save(self.rerank_path)
+    
+    def _supports_removal(self) -> bool:
+        """HNSW graphs cannot remove vectors in place; all other index types can"""
+        return self._detect_index_type() != "hnsw"
+    
+    def _ensure_writable(self) -> bool:
+        """
+        Make sure the loaded index can be modified in place
+        
+        Memory-mapped indexes are read-only views of the file, so they are re-read
+        into private memory before the first incremental change.
+        
+        Returns:
+            bool: True if the index is loaded and writable
+        """
+        if self.index is None and not self.load_index():
+            logger.error("No index loaded, build the index before applying incremental changes")
+            return False
+        
+        if self.mmap and self.load_stats.get("load_mode") == "mmap":
+            logger.info("Re-reading memory-mapped index into private memory for incremental changes")
+            self.index = faiss.read_index(self.index_path)
+            self.id_map = IDMap.load(self.get_id_map_path())
+            self.pending_deltas = self._replay_delta_log()
+            self.load_stats["load_mode"] = "heap"
+        return True
+    
+    @staticmethod
+    def _extract_embeddings(documents: List[Dict[str, Any]]) -> Tuple[List[str], np.ndarray, List[Tuple[str, ...]]]:
+        """
+        Extract document IDs, normalized embeddings and hierarchy codes from documents
+        
+        Args:
+            documents: Documents with an "_id" and a "Vector-Embedding_SubClass" field
+            
+        Returns:
+            Tuple of (document IDs, normalized float32 embedding matrix, hierarchy codes)
+        """
+        doc_ids = []
+        embeddings = []
+        codes = []
+        for doc in documents:
+            embedding = doc.get(EMBEDDING_FIELD)
+            if "_id" in doc and embedding is not None and len(embedding) > 0:
+                doc_ids.append(str(doc["_id"]))
+                embeddings.append(embedding)
+                codes.append(document_codes(doc))
+            else:
+                logger.warning(f"Skipping document without _id or '{EMBEDDING_FIELD}': {doc.get('_id')}")
+        
+        if not embeddings:
+            return [], np.empty((0, 0), dtype='float32'), []
+        
+        embedding_matrix = np.array(embeddings, dtype='float32')
+        faiss.normalize_L2(embedding_matrix)
+        return doc_ids, embedding_matrix, codes
+    
+    def _apply_upsert(self, doc_ids: List[str], embedding_matrix: np.ndarray,
+                      codes: Optional[List[Tuple[str, ...]]] = None) -> Tuple[int, int]:
+        """
+        Insert or replace vectors in the loaded index, ID map and hierarchy
+        
+        Args:
+            doc_ids: Document IDs
+            embedding_matrix: Normalized embeddings, one row per document
+            codes: Hierarchy codes of the documents (empty codes if not given)
+            
+        Returns:
+            Tuple of (number of documents added, number of documents replaced)
+        """
+        existing_ids = self.id_map.find_faiss_ids(doc_ids)
+        replaced = existing_ids >= 0
+        if replaced.any():
+            self.index.remove_ids(faiss.IDSelectorBatch(existing_ids[replaced]))
+            self.id_map.remove(existing_ids[replaced])
+            if self.hierarchy is not None:
+                self.hierarchy.remove(existing_ids[replaced])
+            if self.rerank_store is not None:
+                self.rerank_store.remove(existing_ids[replaced])
+        
+        ids_array = stable_faiss_ids(doc_ids)
+        self.index.add_with_ids(np.ascontiguousarray(embedding_matrix, dtype='float32'), ids_array)
+        self.id_map.add(ids_array, doc_ids)
+        if self.rerank_store is not None:
+            self.rerank_store.add(ids_array, embedding_matrix)
+        if self.hierarchy is not None:
+            self.hierarchy.add_codes(ids_array, [tuple(code) for code in codes] if codes else
+                                     [("",) * len(HIERARCHY_LEVELS)] * len(doc_ids))
+        return int((~replaced).sum()), int(replaced.sum())
+    
+    def _apply_remove(self, doc_ids: List[str]) -> int:
+        """
+        Remove documents from the loaded index and ID map
+        
+        Args:
+            doc_ids: Document IDs to remove
+            
+        Returns:
+            int: Number of documents removed
+        """
+        faiss_ids = self.id_map.find_faiss_ids(doc_ids)
+        faiss_ids = faiss_ids[faiss_ids >= 0]
+        if len(faiss_ids) == 0:
+            return 0
+        self.index.remove_ids(faiss.IDSelectorBatch(faiss_ids))
+        if self.hierarchy is not None:
+            self.hierarchy.remove(faiss_ids)
+        if self.rerank_store is not None:
+            self.rerank_store.remove(faiss_ids)
+        return self.id_map.remove(faiss_ids)
+    
+    def _append_delta(self, record: Dict[str, Any]) -> None:
+        """Append a change record to the delta log and compact if the log grew too large"""
+        with open(self.delta_log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending_deltas += 1
+        # The change is applied, responses cached before it are stale
+        self.data_version += 1
+        if self.build_params:
+            self.build_params["num_vectors"] = self.index.ntotal
+        
+        if self.compact_threshold and self.pending_deltas >= self.compact_threshold:
+            self.compact()
+    
+    def _replay_delta_log(self) -> int:
+        """
+        Re-apply the changes recorded in the delta log to the freshly loaded index
+        
+        Returns:
+            int: Number of delta records applied
+        """
+        if not os.path.exists(self.delta_log_path):
+            return 0
+        
+        if self.mmap:
+            # Memory-mapped indexes are read-only, load a private copy to apply the changes
+            self.index = faiss.read_index(self.index_path)
+            self.load_stats["load_mode"] = "heap"
+        
+        applied = 0
+        with open(self.delta_log_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash while appending can leave a truncated last line
+                    logger.warning(f"Skipping corrupt delta log record at line {line_number}")
+                    continue
+                if record["op"] == "upsert":
+                    self._apply_upsert(record["ids"], np.array(record["vectors"], dtype='float32'), record.get("codes"))
+                elif record["op"] == "remove":
+                    self._apply_remove(record["ids"])
+                applied += 1
+        
+        if applied:
+            logger.info(f"Replayed {applied} incremental changes from {self.delta_log_path}")
+        return applied
+    
+    def _truncate_delta_log(self) -> None:
+        """Remove the delta log once its changes are part of the index files"""
+        if os.path.exists(self.delta_log_path):
+            os.remove(self.delta_log_path)
+        self.pending_deltas = 0
+    
+    @write_locked
+    def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Add new documents to the index without rebuilding it
+        
+        Documents that are already indexed are skipped, use update_documents to replace them.
+        
+        Args:
+            documents: Documents with an "_id" and a "Vector-Embedding_SubClass" field
+            
+        Returns:
+            int: Number of documents added (-1 on error)
+        """
+        try:
+            if not self._ensure_writable():
+                return -1
+            
+            doc_ids, embedding_matrix, codes = self._extract_embeddings(documents)
+            is_new = self.id_map.find_faiss_ids(doc_ids) < 0
+            if not is_new.all():
+                logger.warning(f"Skipping {int((~is_new).sum())} documents that are already indexed")
+            doc_ids = [doc_id for doc_id, new in zip(doc_ids, is_new) if new]
+            codes = [code for code, new in zip(codes, is_new) if new]
+            if not doc_ids:
+                return 0
+            embedding_matrix = embedding_matrix[is_new]
+            
+            added, _ = self._apply_upsert(doc_ids, embedding_matrix, codes)
+            self._append_delta({"op": "upsert", "ids": doc_ids, "vectors": embedding_matrix.tolist(), "codes": codes})
+            logger.info(f"Added {added} documents to the index ({self.index.ntotal} vectors)")
+            return added
+        except Exception as e:
+            logger.error(f"Error adding documents to FAISS index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return -1
+    
+    @write_locked
+    def update_documents(self, documents: List[Dict[str, Any]], upsert: bool = True) -> int:
+        """
+        Replace the vectors of indexed documents without rebuilding the index
+        
+        Args:
+            documents: Documents with an "_id" and a "Vector-Embedding_SubClass" field
+            upsert: Also add documents that are not indexed yet
+            
+        Returns:
+            int: Number of documents updated or added (-1 on error)
+        """
+        try:
+            if not self._ensure_writable():
+                return -1
+            if not self._supports_removal():
+                logger.error("HNSW indexes do not support in-place updates, rebuild the index instead")
+                return -1
+            
+            doc_ids, embedding_matrix, codes = self._extract_embeddings(documents)
+            if not upsert:
+                is_indexed = self.id_map.find_faiss_ids(doc_ids) >= 0
+                doc_ids = [doc_id for doc_id, indexed in zip(doc_ids, is_indexed) if indexed]
+                codes = [code for code, indexed in zip(codes, is_indexed) if indexed]
+                embedding_matrix = embedding_matrix[is_indexed]
+            if not doc_ids:
+                return 0
+            
+            added, replaced = self._apply_upsert(doc_ids, embedding_matrix, codes)
+            self._append_delta({"op": "upsert", "ids": doc_ids, "vectors": embedding_matrix.tolist(), "codes": codes})
+            logger.info(f"Updated {replaced} and added {added} documents ({self.index.ntotal} vectors)")
+            return added + replaced
+        except Exception as e:
+            logger.error(f"Error updating documents in FAISS index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return -1
+    
+    @write_locked
+    def remove_documents(self, doc_ids: List[str]) -> int:
+        """
+        Remove documents from the index without rebuilding it
+        
+        Args:
+            doc_ids: Document IDs to remove
+            
+        Returns:
+            int: Number of documents removed (-1 on error)
+        """
+        try:
+            if not self._ensure_writable():
+                return -1
+            if not self._supports_removal():
+                logger.error("HNSW indexes do not support removing vectors, rebuild the index instead")
+                return -1
+            
+            doc_ids = [str(doc_id) for doc_id in doc_ids]
+            removed = self._apply_remove(doc_ids)
+            if removed:
+                self._append_delta({"op": "remove", "ids": doc_ids})
+            logger.info(f"Removed {removed} documents from the index ({self.index.ntotal} vectors)")
+            return removed
+        except Exception as e:
+            logger.error(f"Error removing documents from FAISS index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return -1
+    
+    @write_locked
+    def compact(self) -> bool:
+        """
+        Fold the incremental changes of the delta log into the index files
+        
+        Returns:
+            bool: True if successfully compacted, False otherwise
         """
         try:
-            # Ensure index is loaded
             if self.index is None:
-                success = self.load_index()
+                logger.warning("No index loaded, nothing to compact")
+                return False
+            
+            start_time = time.time()
+            self._write_index_files()
+            if self.build_params:
+                self.build_params["num_vectors"] = self.index.ntotal
+                self._save_build_params(self.build_params)
+            compacted = self.pending_deltas
+            self._truncate_delta_log()
+            self._refresh_manifest_artifacts()
+            logger.info(f"Compacted {compacted} incremental changes into {self.index_path} in {time.time() - start_time:.2f} seconds")
+            return True
+        except Exception as e:
+            logger.error(f"Error compacting FAISS index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+    
+    def ensure_index(self, build: bool = True) -> bool:
+        """
+        Make sure an index is available, loading or building it if needed
+        
+        Single-flight: concurrent callers queue on the write lock while the first one
+        loads (or builds) the index, and then find it loaded instead of loading it again.
+        
+        Args:
+            build: Build the index if it cannot be loaded
+            
+        Returns:
+            bool: True if an index is loaded, False otherwise (always False once closed)
+        """
+        if self.index is not None:
+            return True
+        with self.rw_lock.write_lock():
+            if self.index is not None:
+                # Loaded by another thread while this one was waiting
+                return True
+            if self.closed:
+                logger.warning(f"Index manager of {self.index_path} is closed, refusing to load the index again")
+                return False
+            success = self.load_index()
+            if not success and build:
+                logger.warning("Failed to load index, attempting to build it")
+                success = self.build_index()
                 if not success:
-                    logger.warning("Failed to load index, attempting to build it")
-                    success = self.build_index()
-                    if not success:
-                        logger.error("Failed to build index")
-                        return []
-            
-            if self.index.ntotal == 0:
-                logger.warning("Index is empty (contains 0 vectors)")
-                return []
-            
-            # Process the query embedding
-            query_array = np.array([query_embedding]).astype('float32')
-            faiss.normalize_L2(query_array)
-            
-            # Search the index
-            D, I = self.index.search(query_array, min(top_k, self.index.ntotal))
-            
-            # Debug index search
-            logger.debug(f"FAISS search returned {len(I[0])} results, top distances: {D[0][:5]}")
-            
-            results = []
-            for idx, (distance, idx_val) in enumerate(zip(D[0], I[0])):
-                # Skip invalid indices (-1 means no match found)
-                if idx_val == -1:
-                    continue
-                    
-                if idx_val in self.id_map:
-                    doc_id = self.id_map[int(idx_val)]
-                    # With cosine similarity, higher values are better (range: -1 to 1)
-                    # A similarity of 1 means the vectors are identical
-                    results.append((doc_id, float(distance)))
-                else:
-                    logger.warning(f"Index returned ID {idx_val} which is not in ID map")
+                    logger.error("Failed to build index")
+            return success
+    
+    def close(self) -> None:
+        """
+        Release the index and every structure loaded with it (ID map, hierarchy codes,
+        re-ranking vectors); a closed manager refuses searches instead of loading the
+        index again
+        """
+        with self.rw_lock.write_lock():
+            self.closed = True
+            self.index = None
+            self.id_map = None
+            self.hierarchy = None
+            self.rerank_store = None
+            self.pending_deltas = 0
+        logger.info(f"Closed index manager of {self.index_path}")
+    
+    def _search_faiss_ids(self, query_array: np.ndarray, top_k: int, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None,
+                          filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index and return raw FAISS ids (see search_batch); the caller holds the read lock
+        
+        Args:
+            query_array: Float32 query embeddings, shape (n, d); normalized in place
+            top_k: Number of results to return per query
+            nprobe: Number of IVF lists to probe (IVF indexes only, defaults to self.nprobe)
+            ef_search: HNSW search depth (HNSW indexes only, defaults to self.ef_search)
+            filters: Hierarchy codes to restrict the search to
+            
+        Returns:
+            Tuple of (similarity scores, FAISS ids), both (n, k); (n, 0) arrays if there is nothing to search
+        """
+        num_queries = query_array.shape[0]
+        empty_result = (np.empty((num_queries, 0), dtype='float32'), np.empty((num_queries, 0), dtype=np.int64))
+        
+        if self.index is None:
+            return empty_result
+        
+        if self.index.ntotal == 0:
+            logger.warning("Index is empty (contains 0 vectors)")
+            return empty_result
+        
+        # Restrict the search to the selected slice of the hierarchy
+        selected = None
+        if filters and any(filters.get(level) for level in HIERARCHY_LEVELS):
+            hierarchy = self._get_hierarchy()
+            if hierarchy is None:
+                return empty_result
+            selected = hierarchy.select(filters)
+            if len(selected) == 0:
+                logger.info(f"No documents match the filters {filters}")
+                return empty_result
+        
+        # Process the query embeddings
+        faiss.normalize_L2(query_array)
+        
+        # Search the index
+        limit = self.index.ntotal if selected is None else len(selected)
+        k = min(top_k, limit)
+        rerank = self.rerank_store is not None and self.rerank_factor > 1
+        num_candidates = min(k * self.rerank_factor, limit) if rerank else k
+        selector = faiss.IDSelectorBatch(selected) if selected is not None else None
+        search_params = self._search_parameters(nprobe, ef_search, selector)
+        D, I = self.index.search(query_array, num_candidates, params=search_params)
+        
+        if selected is not None and (I == -1).any() and self._detect_index_type() in ("ivf_flat", "ivf_pq", "hnsw"):
+            # The probed lists / explored graph held too few documents of the slice
+            logger.info("Filtered search returned a short page, repeating it exhaustively")
+            exhaustive_params = self._search_parameters(
+                nprobe=getattr(self._base_index(), "nlist", None), ef_search=max(k, self.index.ntotal), selector=selector
+            )
+            D, I = self.index.search(query_array, num_candidates, params=exhaustive_params)
+        
+        if rerank:
+            # Re-score the candidates exactly, reading only their rows of the float32 vectors
+            D, I = self.rerank_store.rerank(query_array, I, k)
+        return D, I
+    
+    def search_batch(self, query_matrix: np.ndarray, top_k: int = 10,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the FAISS index with several query embeddings in a single FAISS call
+        
+        Hierarchy filters are pushed down into FAISS as an ID selector, so only the
+        documents of the selected Section / Division / Group / Class are scored. If an
+        approximate index returns a short page for a filtered query, the query is
+        repeated with an exhaustive nprobe / ef_search so the page is filled whenever
+        the slice holds enough documents.
+        
+        Scalar-quantized indexes fetch rerank_factor * top_k candidates using the
+        compressed codes and re-score them exactly from the float32 vectors.
+        
+        Args:
+            query_matrix: Query embeddings as an (n, d) matrix (or a list of n vectors)
+            top_k: Number of results to return per query
+            nprobe: Number of IVF lists to probe (IVF indexes only, defaults to self.nprobe)
+            ef_search: HNSW search depth (HNSW indexes only, defaults to self.ef_search)
+            filters: Hierarchy codes to restrict the search to, e.g. {"section": "C", "division": "10"}
             
-            logger.info(f"Search completed with {len(results)} results")
-            return results
+        Returns:
+            Tuple of (document IDs, similarity scores), both (n, top_k) arrays ordered by
+            decreasing similarity. Empty result slots have an empty document ID and a NaN score.
+        """
+        # Copy so the caller's embeddings are not normalized in place
+        query_array = np.array(query_matrix, dtype='float32', ndmin=2)
+        num_queries = query_array.shape[0]
+        empty_result = (np.empty((num_queries, 0), dtype=str), np.empty((num_queries, 0), dtype='float32'))
+        
+        try:
+            if not self.ensure_index():
+                return empty_result
+            # The ID map is read under the same lock as the index, so both come from the same state
+            with self.rw_lock.read_lock():
+                D, I = self._search_faiss_ids(query_array, top_k, nprobe, ef_search, filters)
+                if I.shape[1] == 0:
+                    return empty_result
+                
+                # Debug index search
+                logger.debug(f"FAISS search returned {I.shape[1]} results for {num_queries} queries, top distances: {D[0][:5]}")
+                
+                # Translate all FAISS ids to document IDs in one vectorized step
+                # (-1 means no match found, '' means the id is not in the ID map)
+                doc_ids = self.id_map.lookup(I)
+            unknown = (I != -1) & (doc_ids == "")
+            if unknown.any():
+                logger.warning(f"Index returned IDs {I[unknown].tolist()} which are not in ID map")
+            
+            # With cosine similarity, higher values are better (range: -1 to 1)
+            # A similarity of 1 means the vectors are identical
+            D[doc_ids == ""] = np.nan
+            return doc_ids, D
         except Exception as e:
             logger.error(f"Error searching FAISS index: {str(e)}")
             logger.error(traceback.format_exc())
-            return []
+            return empty_result
+    
+    def search(self, query_embedding: List[float], top_k: int = 10,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Search the FAISS index with a query embedding
+        
+        Args:
+            query_embedding: The query embedding vector
+            top_k: Number of results to return
+            nprobe: Number of IVF lists to probe (IVF indexes only, defaults to self.nprobe)
+            ef_search: HNSW search depth (HNSW indexes only, defaults to self.ef_search)
+            filters: Hierarchy codes to restrict the search to, e.g. {"section": "C", "division": "10"}
+            
+        Returns:
+            List of tuples (document_id, similarity_score)
+        """
+        doc_ids, scores = self.search_batch(np.array([query_embedding]), top_k, nprobe=nprobe,
+                                            ef_search=ef_search, filters=filters)
+        valid = doc_ids[0] != ""
+        results = list(zip(doc_ids[0][valid].tolist(), scores[0][valid].tolist()))
+        
+        logger.info(f"Search completed with {len(results)} results")
+        return results
+    
+    async def asearch(self, query_embedding: List[float], top_k: int = 10,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      executor: Optional[BoundedExecutor] = None) -> List[Tuple[str, float]]:
+        """
+        Search like search() on a bounded executor, without blocking the event loop
+        
+        Args:
+            query_embedding: The query embedding vector
+            top_k: Number of results to return
+            nprobe: As in search()
+            ef_search: As in search()
+            filters: Hierarchy codes to restrict the search to
+            executor: Executor running the search (default: get_search_executor())
+            
+        Returns:
+            List of tuples (document_id, similarity_score)
+            
+        Raises:
+            ExecutorSaturatedError: If the executor already holds its maximum of pending requests
+        """
+        executor = executor or get_search_executor()
+        return await executor.run(self.search, query_embedding, top_k, nprobe, ef_search, filters)
+    
+    def search_rollup(self, query_embedding: List[float], top_n: int = DEFAULT_ROLLUP_TOP_N,
+                      num_candidates: int = DEFAULT_ROLLUP_CANDIDATES,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Search the index and roll the scores of the candidates up the NIC hierarchy
+        
+        The candidate FAISS ids are aggregated per Section / Division / Group / Class
+        using the precomputed parent-code arrays of the hierarchy, so no document is
+        looked up and no per-result Python loop runs.
+        
+        Args:
+            query_embedding: The query embedding vector
+            top_n: Number of nodes to return per level
+            num_candidates: Number of nearest documents whose scores are rolled up
+            nprobe: Number of IVF lists to probe (IVF indexes only, defaults to self.nprobe)
+            ef_search: HNSW search depth (HNSW indexes only, defaults to self.ef_search)
+            filters: Hierarchy codes to restrict the search to
+            
+        Returns:
+            Dictionary {level: [{"code", "score", "hits"}, ...]} ordered by decreasing
+            score, empty if the search failed
+        """
+        query_array = np.array(query_embedding, dtype='float32', ndmin=2)
+        try:
+            if not self.ensure_index():
+                return {}
+            with self.rw_lock.read_lock():
+                D, I = self._search_faiss_ids(query_array, num_candidates, nprobe, ef_search, filters)
+                hierarchy = self._get_hierarchy()
+                if I.shape[1] == 0 or hierarchy is None:
+                    return {}
+                rollup = hierarchy.rollup(I[0], D[0], top_n)
+            logger.info(f"Rolled {int((I[0] != -1).sum())} candidates up the hierarchy")
+            return rollup
+        except Exception as e:
+            logger.error(f"Error rolling up search scores: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {}
 
 # For command line usage
 if __name__ == "__main__":
@@ -248,19 +1706,111 @@ if __name__ == "__main__":
     parser.add_argument("--test", action="store_true", help="Test the index")
     parser.add_argument("--force", action="store_true", help="Force rebuild index")
     parser.add_argument("--json", default=DEFAULT_JSON_PATH, help="Path to JSON data file")
+    parser.add_argument("--index-type", default=DEFAULT_INDEX_TYPE, choices=INDEX_TYPES, help="Type of index to build")
+    parser.add_argument("--nlist", type=int, help="Number of IVF lists (IVF indexes)")
+    parser.add_argument("--hnsw-m", type=int, help="Neighbours per node (HNSW)")
+    parser.add_argument("--pq-m", type=int, help="Number of PQ sub-quantizers (IVF-PQ)")
+    parser.add_argument("--training-sample-size", type=int, help="Number of vectors used for training")
+    parser.add_argument("--transform", choices=TRANSFORM_TYPES, help="Learned dimensionality reduction applied before indexing")
+    parser.add_argument("--transform-dim", type=int, help="Dimension of the vectors after the transform")
+    parser.add_argument("--nprobe", type=int, help="IVF lists probed per query")
+    parser.add_argument("--ef-search", type=int, help="HNSW search depth per query")
+    parser.add_argument("--mmap", action="store_true", help="Memory-map the index when loading it")
+    parser.add_argument("--warmup", action="store_true", help="Page the index into memory after loading it")
+    parser.add_argument("--convert-id-map", action="store_true", help="Convert the legacy JSON ID map to the binary format")
+    parser.add_argument("--stream", action="store_true", help="Parse the JSON file incrementally while building")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_STREAM_CHUNK_SIZE, help="Embeddings streamed, normalized and added at a time")
+    parser.add_argument("--threads", type=int, help="Threads normalizing the embeddings (default: FAISS OpenMP threads)")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted build from its checkpoint")
+    parser.add_argument("--checkpoint-rows", type=int, default=DEFAULT_CHECKPOINT_ROWS, help="Vectors added between build checkpoints (0 disables them)")
+    parser.add_argument("--track-memory", action="store_true", help="Report the traced peak memory of the build")
+    parser.add_argument("--no-sidecar", action="store_true", help="Ignore the .npy embedding sidecar and read the JSON file")
+    parser.add_argument("--upsert", metavar="FILE", help="Add or update the documents of a JSON file in place")
+    parser.add_argument("--remove", nargs="+", metavar="DOC_ID", help="Remove documents from the index in place")
+    parser.add_argument("--compact", action="store_true", help="Fold incremental changes into the index files")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model of the vectors, recorded in the manifest")
+    parser.add_argument("--check", action="store_true", help="Check the index files against their manifest, including file hashes")
+    parser.add_argument("--rerank-factor", type=int, help="Candidates per result re-scored exactly (scalar-quantized indexes)")
+    parser.add_argument("--report", action="store_true", help="Compare the memory footprint and recall of all index types")
     args = parser.parse_args()
     
-    manager = FAISSIndexManager(json_file_path=args.json)
+    cli_params = {
+        "nlist": args.nlist,
+        "hnsw_m": args.hnsw_m,
+        "pq_m": args.pq_m,
+        "training_sample_size": args.training_sample_size,
+        "transform": args.transform,
+        "transform_dim": args.transform_dim
+    }
+    manager = FAISSIndexManager(
+        json_file_path=args.json,
+        index_type=args.index_type,
+        index_params={k: v for k, v in cli_params.items() if v is not None},
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+        mmap=args.mmap,
+        warmup=args.warmup,
+        model_name=args.model,
+        rerank_factor=args.rerank_factor
+    )
+    
+    if args.check:
+        fresh, reason = manager.check_manifest(deep=True)
+        print(f"Index is {'up to date' if fresh else 'stale'}: {reason}")
+    
+    if args.convert_id_map:
+        legacy_path = manager.get_id_map_path()
+        if legacy_path == manager.id_map_path:
+            print(f"Nothing to convert, using {legacy_path}")
+        else:
+            IDMap.load(legacy_path).save(manager.id_map_path)
+            print(f"Converted {legacy_path} to {manager.id_map_path}")
     
     if args.build:
-        success = manager.build_index(force_rebuild=args.force)
+        success = manager.build_index(
+            force_rebuild=args.force,
+            streaming=args.stream,
+            chunk_size=args.chunk_size,
+            track_memory=args.track_memory,
+            use_sidecar=not args.no_sidecar,
+            threads=args.threads,
+            resume=args.resume,
+            checkpoint_rows=args.checkpoint_rows
+        )
         if success:
             print("Index built successfully")
+            if manager.build_stats:
+                print(f"Build stats: {json.dumps(manager.build_stats, indent=2)}")
         else:
             print("Failed to build index")
             
+    if args.upsert:
+        with open(args.upsert, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+        if isinstance(documents, dict):
+            documents = [documents]
+        print(f"Upserted {manager.update_documents(documents)} documents")
+    
+    if args.remove:
+        print(f"Removed {manager.remove_documents(args.remove)} documents")
+    
+    if args.compact:
+        if manager.index is None:
+            manager.load_index()
+        print("Index compacted" if manager.compact() else "Failed to compact index")
+    
     if args.test:
         if not manager.load_index():
             print("Failed to load index")
         else:
             print(f"Loaded index with {manager.index.ntotal} vectors")
+            print(f"Index info: {json.dumps(manager.get_index_info(), indent=2)}")
+            print(f"Memory stats: {json.dumps(manager.get_memory_stats(), indent=2)}")
+    
+    if args.report:
+        print(f"{'index type':<10} {'bytes/vector':>12} {'recall':>8} {'reranked':>9} {'query ms':>9}")
+        for entry in manager.memory_recall_report():
+            recall_key = next(key for key in entry if key.startswith("recall@"))
+            reranked = entry.get("reranked_" + recall_key)
+            print(f"{entry['index_type']:<10} {entry['bytes_per_vector']:>12} {entry[recall_key]:>8} "
+                  f"{reranked if reranked is not None else '-':>9} {entry['query_time_ms']:>9}")
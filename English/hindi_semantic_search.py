@@ -9,6 +9,12 @@ import faiss
 from typing import List, Dict, Any, Optional, Union, Tuple
 import torch
 from transformers import AutoTokenizer, AutoModel
+from embedding_sidecar import HINDI_EMBEDDING_FIELD, is_sidecar_fresh, load_sidecar, load_documents
+from vector_transform import create_transform, train_transform
+from onnx_encoder import get_embedding_backend, get_onnx_encoder
+
+# Vectors used to train the PCA transform
+PCA_TRAINING_SAMPLE_SIZE = 20000
 
 class HindiSemanticSearch:
     """
@@ -17,7 +23,9 @@ class HindiSemanticSearch:
     def __init__(self, 
                  embeddings_file: Optional[str] = "output_hindi.json",
                  index_path: Optional[str] = None,
-                 model_name: str = "krutrim-ai-labs/Vyakyarth"):
+                 model_name: str = "krutrim-ai-labs/Vyakyarth",
+                 pca_dim: Optional[int] = None,
+                 backend: Optional[str] = None):
         """
         Initialize Hindi semantic search
         
@@ -25,8 +33,15 @@ class HindiSemanticSearch:
             embeddings_file: Path to the JSON file containing pre-computed embeddings
             index_path: Path to a pre-built FAISS index file
             model_name: The embedding model to use for query encoding
+            pca_dim: Reduce the vectors to this dimension with a learned PCA when building
+                     the index (default: keep the native dimension). The PCA is saved with
+                     the index and applied to queries automatically.
+            backend: Query encoder backend, "torch" or "onnx" (ONNX Runtime, int8 unless
+                     ONNX_QUANTIZE=false) (default: EMBEDDING_BACKEND)
         """
         self.model_name = model_name
+        self.pca_dim = pca_dim
+        self.backend = backend or get_embedding_backend()
         self.tokenizer = None
         self.model = None
         self.documents = []
@@ -40,6 +55,23 @@ class HindiSemanticSearch:
         else:
             raise ValueError("Either embeddings_file or index_path must be provided")
     
+    def _load_sidecar(self, embeddings_file: str) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Load the documents and embeddings of a JSON file from its .npy sidecar
+        
+        Args:
+            embeddings_file: Path to the JSON file the sidecar was exported from
+            
+        Returns:
+            Tuple of (documents in embedding row order, memory-mapped embedding matrix)
+        """
+        doc_ids, vectors = load_sidecar(embeddings_file, mmap=True)
+        if vectors is None:
+            return [], None
+        documents_by_id = {str(doc.get("_id")): doc for doc in load_documents(embeddings_file, HINDI_EMBEDDING_FIELD)}
+        documents = [documents_by_id.get(doc_id, {"_id": doc_id}) for doc_id in doc_ids.tolist()]
+        return documents, vectors
+    
     def load_embeddings(self, embeddings_file: str) -> bool:
         """
         Load embeddings from JSON file and build the FAISS index
@@ -56,6 +88,17 @@ class HindiSemanticSearch:
         
         print(f"Loading Hindi embeddings from {embeddings_file}")
         try:
+            if is_sidecar_fresh(embeddings_file, include_docs=True):
+                # Read the vectors from the .npy sidecar instead of parsing them from JSON
+                self.documents, vectors = self._load_sidecar(embeddings_file)
+                if vectors is not None:
+                    self.id_map = {idx: str(doc.get("_id", idx)) for idx, doc in enumerate(self.documents)}
+                    embeddings_array = np.array(vectors, dtype=np.float32)
+                    faiss.normalize_L2(embeddings_array)
+                    self.index = self._build_index(embeddings_array)
+                    print(f"FAISS index built with {self.index.ntotal} vectors of dimension {embeddings_array.shape[1]} from the sidecar")
+                    return True
+            
             with open(embeddings_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
@@ -77,7 +120,9 @@ class HindiSemanticSearch:
                 print("Error: No valid embeddings found in the file")
                 return False
             
-            # Store documents for later retrieval
+            # Store documents for later retrieval, the embeddings now live in the index
+            for doc in valid_docs:
+                doc.pop("embeddings", None)
             self.documents = valid_docs
             
             # Convert to numpy array
@@ -86,15 +131,11 @@ class HindiSemanticSearch:
             # Get dimension from the embeddings
             dimension = embeddings_array.shape[1]
             
-            # Create and fill the index
-            # Using IndexFlatIP for inner product (cosine similarity on normalized vectors)
-            self.index = faiss.IndexFlatIP(dimension)
-            
             # Normalize vectors for cosine similarity
             faiss.normalize_L2(embeddings_array)
             
-            # Add vectors to the index
-            self.index.add(embeddings_array)
+            # Create and fill the index
+            self.index = self._build_index(embeddings_array)
             
             print(f"FAISS index built with {self.index.ntotal} vectors of dimension {dimension}")
             return True
@@ -103,6 +144,33 @@ class HindiSemanticSearch:
             print(f"Error loading embeddings: {str(e)}")
             return False
     
+    def _build_index(self, embeddings_array: np.ndarray) -> faiss.Index:
+        """
+        Create an inner product index (cosine similarity on normalized vectors) and add the vectors
+        
+        With pca_dim set, the vectors are projected to pca_dim dimensions by a PCA trained
+        on a sample of them, and the scores are the inner products of the projections,
+        which approximate the cosine similarities.
+        
+        Args:
+            embeddings_array: Normalized float32 embeddings
+            
+        Returns:
+            faiss.Index containing the embeddings
+        """
+        dimension = embeddings_array.shape[1]
+        if not self.pca_dim or self.pca_dim >= dimension:
+            index = faiss.IndexFlatIP(dimension)
+        else:
+            transform = create_transform("pca", dimension, int(self.pca_dim))
+            sample_size = min(PCA_TRAINING_SAMPLE_SIZE, len(embeddings_array))
+            rows = np.sort(np.random.default_rng(42).choice(len(embeddings_array), size=sample_size, replace=False))
+            train_transform(transform, embeddings_array[rows])
+            index = faiss.IndexPreTransform(transform, faiss.IndexFlatIP(int(self.pca_dim)))
+            print(f"Trained PCA {dimension} -> {self.pca_dim} dimensions on {sample_size} vectors")
+        index.add(embeddings_array)
+        return index
+    
     def load_index(self, index_path: str) -> bool:
         """
         Load a pre-built FAISS index
@@ -123,10 +191,15 @@ class HindiSemanticSearch:
             print(f"Loaded FAISS index with {self.index.ntotal} vectors")
             
             # If we don't have documents loaded, try to load embeddings file to get documents
-            if not self.documents and os.path.exists("output_hindi.json"):
+            if not self.documents and is_sidecar_fresh("output_hindi.json", include_docs=True):
+                self.documents, _ = self._load_sidecar("output_hindi.json")
+                self.id_map = {idx: str(doc.get("_id", idx)) for idx, doc in enumerate(self.documents)}
+            elif not self.documents and os.path.exists("output_hindi.json"):
                 with open("output_hindi.json", 'r', encoding='utf-8') as f:
                     data = json.load(f)
                 self.documents = [doc for doc in data if "embeddings" in doc and doc["embeddings"]]
+                for doc in self.documents:
+                    doc.pop("embeddings", None)
                 # Rebuild id_map
                 for idx, doc in enumerate(self.documents):
                     self.id_map[idx] = str(doc.get("_id", idx))
@@ -163,10 +236,14 @@ class HindiSemanticSearch:
         """Load the transformer model for encoding queries"""
         if self.tokenizer is None or self.model is None:
             try:
-                print(f"Loading Hindi embedding model: {self.model_name}")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModel.from_pretrained(self.model_name)
-                self.model.eval()
+                print(f"Loading Hindi embedding model: {self.model_name} ({self.backend})")
+                if self.backend == "onnx":
+                    self.model = get_onnx_encoder(self.model_name)
+                    self.tokenizer = self.model.tokenizer
+                else:
+                    self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    self.model = AutoModel.from_pretrained(self.model_name)
+                    self.model.eval()
                 print("Model loaded successfully")
             except Exception as e:
                 print(f"Error loading model: {str(e)}")
@@ -190,6 +267,12 @@ class HindiSemanticSearch:
             # Preprocess query (remove extra spaces)
             query = ' '.join(query.split())
             
+            if self.backend == "onnx":
+                # Mean pooling runs inside the exported graph
+                embedding = self.model.encode(query, normalize_embeddings=False).reshape(1, -1)
+                faiss.normalize_L2(embedding)
+                return embedding
+            
             # Tokenize and encode
             with torch.no_grad():
                 inputs = self.tokenizer(query, return_tensors="pt", padding=True, truncation=True, max_length=512)
@@ -303,9 +386,11 @@ class HindiSemanticSearch:
         if self.index is None:
             return {"error": "No index loaded"}
         
+        index = faiss.downcast_index(self.index)
         return {
             "vector_count": self.index.ntotal,
             "dimension": self.index.d if hasattr(self.index, 'd') else "Unknown",
+            "index_dimension": index.index.d if isinstance(index, faiss.IndexPreTransform) else self.index.d,
             "document_count": len(self.documents),
             "id_map_size": len(self.id_map)
         }
@@ -0,0 +1,336 @@
+"""
+Compact ID map for the FAISS index
+Maps FAISS ids (int64) to document IDs using sorted NumPy arrays stored in a binary .npy file
+"""
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# MongoDB ObjectIds are 24 hex characters, stored as 12 raw bytes
+OBJECT_ID_HEX_LENGTH = 24
+OBJECT_ID_BYTES = 12
+
+# Lookup table used to convert raw ObjectId bytes back to hex in one vectorized step
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+def stable_faiss_id(doc_id: str) -> int:
+    """
+    Derive a stable 64-bit FAISS id from a document ID
+    
+    The id only depends on the document ID, so a document keeps its FAISS id across
+    rebuilds and incremental updates. The top bit is cleared because FAISS ids are
+    signed and -1 marks an empty result slot.
+    """
+    digest = hashlib.blake2b(str(doc_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+def stable_faiss_ids(doc_ids: Iterable[str]) -> np.ndarray:
+    """Derive stable FAISS ids for a list of document IDs (see stable_faiss_id)"""
+    return np.array([stable_faiss_id(doc_id) for doc_id in doc_ids], dtype=np.int64)
+
+def is_object_id(doc_id: str) -> bool:
+    """Check whether a document ID is a hex encoded MongoDB ObjectId"""
+    if len(doc_id) != OBJECT_ID_HEX_LENGTH:
+        return False
+    try:
+        bytes.fromhex(doc_id)
+        return True
+    except ValueError:
+        return False
+
+class IDMap:
+    """
+    Sorted array-backed mapping from FAISS ids to document IDs
+
+    Document IDs that are all ObjectIds are stored as fixed-width 12 byte records,
+    anything else falls back to fixed-width unicode strings. The records are kept
+    sorted by FAISS id so that a whole result matrix can be translated with a
+    single np.searchsorted call.
+    """
+
+    def __init__(self, faiss_ids: np.ndarray, doc_ids: np.ndarray):
+        """
+        Initialize the ID map from parallel arrays
+
+        Args:
+            faiss_ids: int64 array of FAISS ids
+            doc_ids: Array of encoded document IDs ('S12' ObjectIds or unicode strings)
+        """
+        if len(faiss_ids) != len(doc_ids):
+            raise ValueError(f"ID map arrays differ in length: {len(faiss_ids)} / {len(doc_ids)}")
+
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        if len(faiss_ids) > 1 and np.any(faiss_ids[1:] < faiss_ids[:-1]):
+            order = np.argsort(faiss_ids, kind="stable")
+            faiss_ids = faiss_ids[order]
+            doc_ids = np.asarray(doc_ids)[order]
+
+        self.faiss_ids = faiss_ids
+        self.doc_ids = doc_ids
+        self._update_layout()
+
+    def _update_layout(self) -> None:
+        """Cache layout properties used for fast lookups"""
+        self.is_object_id = self.doc_ids.dtype == np.dtype(f"S{OBJECT_ID_BYTES}")
+        # FAISS ids 0..n-1 (positional ids) can be looked up by direct indexing
+        n = len(self.faiss_ids)
+        self.is_positional = n == 0 or (self.faiss_ids[0] == 0 and self.faiss_ids[-1] == n - 1)
+
+    @staticmethod
+    def encode_doc_ids(doc_ids: List[str]) -> np.ndarray:
+        """
+        Encode document IDs into a fixed-width array
+
+        Args:
+            doc_ids: List of document ID strings
+
+        Returns:
+            'S12' array if all IDs are ObjectIds, unicode array otherwise
+        """
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        if doc_ids and all(is_object_id(doc_id) for doc_id in doc_ids):
+            raw = bytes.fromhex("".join(doc_ids))
+            return np.frombuffer(raw, dtype=f"S{OBJECT_ID_BYTES}").copy()
+        if not doc_ids:
+            return np.empty(0, dtype=f"S{OBJECT_ID_BYTES}")
+        return np.array(doc_ids, dtype=str)
+
+    def decode_doc_ids(self, encoded: np.ndarray) -> np.ndarray:
+        """
+        Decode an array of encoded document IDs back to strings
+
+        Args:
+            encoded: Array of records taken from self.doc_ids
+
+        Returns:
+            Unicode array of document IDs with the same shape
+        """
+        if not self.is_object_id:
+            return np.asarray(encoded).astype(str)
+
+        shape = encoded.shape
+        raw = np.ascontiguousarray(encoded).reshape(-1).view(np.uint8).reshape(-1, OBJECT_ID_BYTES)
+        hex_chars = np.empty((raw.shape[0], OBJECT_ID_HEX_LENGTH), dtype=np.uint8)
+        hex_chars[:, 0::2] = _HEX_DIGITS[raw >> 4]
+        hex_chars[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+        return hex_chars.view(f"S{OBJECT_ID_HEX_LENGTH}").reshape(shape).astype(f"U{OBJECT_ID_HEX_LENGTH}")
+
+    def positions(self, faiss_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the record positions of an array of FAISS ids
+
+        Args:
+            faiss_ids: Array of FAISS ids of any shape (-1 marks an empty result slot)
+
+        Returns:
+            Tuple of (positions, found mask), both with the shape of faiss_ids
+        """
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        n = len(self.faiss_ids)
+        if n == 0:
+            return np.zeros(faiss_ids.shape, dtype=np.int64), np.zeros(faiss_ids.shape, dtype=bool)
+
+        if self.is_positional:
+            found = (faiss_ids >= 0) & (faiss_ids < n)
+            return np.where(found, faiss_ids, 0), found
+
+        positions = np.searchsorted(self.faiss_ids, faiss_ids)
+        positions = np.minimum(positions, n - 1)
+        found = (self.faiss_ids[positions] == faiss_ids) & (faiss_ids >= 0)
+        return positions, found
+
+    def lookup(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """
+        Translate an array of FAISS ids into document IDs in one vectorized step
+
+        Args:
+            faiss_ids: Array of FAISS ids of any shape, e.g. the I matrix returned by index.search
+
+        Returns:
+            Unicode array of document IDs with the same shape ('' where the id is unknown)
+        """
+        positions, found = self.positions(faiss_ids)
+        if len(self.faiss_ids) == 0:
+            return np.full(positions.shape, "", dtype=f"U{OBJECT_ID_HEX_LENGTH}")
+        doc_ids = self.decode_doc_ids(self.doc_ids[positions])
+        doc_ids[~found] = ""
+        return doc_ids
+
+    def find_faiss_ids(self, doc_ids: List[str]) -> np.ndarray:
+        """
+        Find the FAISS ids of a list of document IDs
+
+        Args:
+            doc_ids: Document IDs to look up
+
+        Returns:
+            int64 array of FAISS ids (-1 for documents that are not in the map)
+        """
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        result = np.full(len(doc_ids), -1, dtype=np.int64)
+        if not doc_ids or len(self) == 0:
+            return result
+
+        # Fast path: documents indexed with their stable id
+        candidates = stable_faiss_ids(doc_ids)
+        matched = self.lookup(candidates) == np.array(doc_ids)
+        result[matched] = candidates[matched]
+
+        # Documents indexed under another id (e.g. positional ids of older indexes)
+        missing = np.flatnonzero(~matched)
+        if len(missing):
+            faiss_ids_by_doc = {}
+            for faiss_id, doc_id in zip(self.faiss_ids.tolist(), self.decode_doc_ids(self.doc_ids).tolist()):
+                faiss_ids_by_doc.setdefault(doc_id, faiss_id)
+            for i in missing.tolist():
+                result[i] = faiss_ids_by_doc.get(doc_ids[i], -1)
+        return result
+
+    def add(self, faiss_ids: np.ndarray, doc_ids: List[str]) -> None:
+        """
+        Insert new entries, keeping the arrays sorted by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids of the new entries (must not be in the map yet)
+            doc_ids: Document IDs of the new entries
+        """
+        if len(doc_ids) == 0:
+            return
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        encoded = self.encode_doc_ids(doc_ids)
+        current = self.doc_ids
+
+        if encoded.dtype != current.dtype:
+            # Mixing ObjectIds with other IDs, or longer string IDs, needs a common unicode representation
+            if self.is_object_id and len(current):
+                current = self.decode_doc_ids(current)
+            if encoded.dtype == np.dtype(f"S{OBJECT_ID_BYTES}") and current.dtype != encoded.dtype:
+                encoded = np.array([str(doc_id) for doc_id in doc_ids], dtype=str)
+            if len(current):
+                common = np.promote_types(current.dtype, encoded.dtype)
+                current = current.astype(common)
+                encoded = encoded.astype(common)
+            else:
+                current = current.astype(encoded.dtype)
+
+        order = np.argsort(faiss_ids, kind="stable")
+        faiss_ids = faiss_ids[order]
+        encoded = encoded[order]
+        positions = np.searchsorted(self.faiss_ids, faiss_ids)
+        self.faiss_ids = np.insert(self.faiss_ids, positions, faiss_ids)
+        self.doc_ids = np.insert(current, positions, encoded)
+        self._update_layout()
+
+    def remove(self, faiss_ids: np.ndarray) -> int:
+        """
+        Remove entries by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids to remove
+
+        Returns:
+            int: Number of entries removed
+        """
+        keep = ~np.isin(self.faiss_ids, np.asarray(faiss_ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.faiss_ids = self.faiss_ids[keep]
+            self.doc_ids = self.doc_ids[keep]
+            self._update_layout()
+        return removed
+
+    # Dict-like interface, kept for code that used the old {faiss_id: doc_id} dict
+    def __len__(self) -> int:
+        return len(self.faiss_ids)
+
+    def __contains__(self, faiss_id) -> bool:
+        _, found = self.positions(np.array([faiss_id]))
+        return bool(found[0])
+
+    def __getitem__(self, faiss_id) -> str:
+        doc_id = self.lookup(np.array([faiss_id]))[0]
+        if not doc_id:
+            raise KeyError(faiss_id)
+        return str(doc_id)
+
+    def get(self, faiss_id, default: Optional[str] = None) -> Optional[str]:
+        doc_id = self.lookup(np.array([faiss_id]))[0]
+        return str(doc_id) if doc_id else default
+
+    def items(self) -> Iterator[Tuple[int, str]]:
+        for faiss_id, doc_id in zip(self.faiss_ids.tolist(), self.decode_doc_ids(self.doc_ids).tolist()):
+            yield faiss_id, doc_id
+
+    def to_dict(self) -> Dict[int, str]:
+        """Convert the ID map to a plain {faiss_id: doc_id} dict"""
+        return dict(self.items())
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids: List[str], faiss_ids: Optional[Iterable[int]] = None) -> "IDMap":
+        """
+        Create an ID map from a list of document IDs
+
+        Args:
+            doc_ids: Document IDs in row order
+            faiss_ids: FAISS ids for each document (defaults to positional ids 0..n-1)
+
+        Returns:
+            IDMap instance
+        """
+        if faiss_ids is None:
+            faiss_ids = np.arange(len(doc_ids), dtype=np.int64)
+        return cls(np.fromiter(faiss_ids, dtype=np.int64, count=len(doc_ids)), cls.encode_doc_ids(doc_ids))
+
+    @classmethod
+    def from_dict(cls, id_map: Dict[int, str]) -> "IDMap":
+        """Create an ID map from a {faiss_id: doc_id} dict"""
+        faiss_ids = [int(k) for k in id_map.keys()]
+        return cls.from_doc_ids([str(v) for v in id_map.values()], faiss_ids)
+
+    def save(self, path: str) -> None:
+        """
+        Save the ID map to disk
+
+        Args:
+            path: Target path; '.json' writes the legacy JSON dict format, anything else a binary .npy file
+        """
+        if path.endswith(".json"):
+            with open(path, 'w') as f:
+                json.dump({str(k): v for k, v in self.items()}, f)
+            return
+
+        records = np.empty(len(self), dtype=[("faiss_id", "<i8"), ("doc_id", self.doc_ids.dtype)])
+        records["faiss_id"] = self.faiss_ids
+        records["doc_id"] = self.doc_ids
+        # Write to a temporary file first so readers never see a partially written map
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "IDMap":
+        """
+        Load an ID map from disk
+
+        Args:
+            path: Path to a binary .npy ID map or a legacy JSON dict
+            mmap: Memory-map the binary file instead of reading it
+
+        Returns:
+            IDMap instance
+        """
+        if path.endswith(".json"):
+            with open(path, 'r') as f:
+                # JSON serializes all keys as strings
+                return cls.from_dict(json.load(f))
+
+        records = np.load(path, mmap_mode="r" if mmap else None)
+        return cls(records["faiss_id"], records["doc_id"])
@@ -0,0 +1,62 @@
+"""
+Selection of the vector search backend
+The apps create their index manager through create_index_manager, which returns a
+FAISSIndexManager or a NumpyIndexManager (same interface) depending on configuration.
+The backend modules are imported lazily, so the NumPy backend runs without faiss.
+"""
+import os
+import logging
+from typing import Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# faiss: FAISSIndexManager, any FAISS index type
+# numpy: NumpyIndexManager, exact brute-force search over a memory-mapped matrix
+INDEX_BACKENDS = ("faiss", "numpy")
+DEFAULT_INDEX_BACKEND = "faiss"
+
+def get_index_backend(backend: Optional[str] = None) -> str:
+    """
+    Get the configured search backend
+
+    Args:
+        backend: Backend name (default: the INDEX_BACKEND environment variable, then DEFAULT_INDEX_BACKEND)
+
+    Returns:
+        str: Backend name
+    """
+    backend = (backend or os.environ.get("INDEX_BACKEND") or DEFAULT_INDEX_BACKEND).lower()
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend {backend}, expected one of {', '.join(INDEX_BACKENDS)}")
+    return backend
+
+def create_index_manager(backend: Optional[str] = None, json_file_path: Optional[str] = None,
+                         model_name: Optional[str] = None, index_path: Optional[str] = None,
+                         id_map_path: Optional[str] = None, **faiss_options: Any):
+    """
+    Create the index manager of a backend
+
+    Args:
+        backend: Backend name (see get_index_backend)
+        json_file_path: Path to the JSON data file
+        model_name: Embedding model of the vectors, recorded in the index manifest
+        index_path: Path of the index file (default: the backend's default file)
+        id_map_path: Path of the ID map file (default: the backend's default file)
+        **faiss_options: FAISSIndexManager options (params_path, index_type, index_params, nprobe,
+                         ef_search, rerank_factor, mmap, warmup); the NumPy backend has no such
+                         knobs and always memory-maps its matrix
+
+    Returns:
+        FAISSIndexManager or NumpyIndexManager instance
+    """
+    backend = get_index_backend(backend)
+    if backend == "numpy":
+        from numpy_index_manager import NumpyIndexManager
+        return NumpyIndexManager(json_file_path=json_file_path, model_name=model_name,
+                                 index_path=index_path, id_map_path=id_map_path)
+
+    from faiss_index_manager import FAISSIndexManager
+    return FAISSIndexManager(json_file_path=json_file_path, model_name=model_name,
+                             index_path=index_path, id_map_path=id_map_path, **faiss_options)
@@ -0,0 +1,400 @@
+"""
+Versioned FAISS index generations with background rebuilds
+Each rebuild produces a new index manager (a generation) in a background worker.
+Searches pin the generation that is active when they start, the new generation is
+swapped in with a single reference assignment, and the old one is released once the
+last search pinned to it has finished.
+
+Every generation after the first is built into its own directory
+(<index dir>/index_generations/<version>/), so a rebuild never touches the files that
+the active generation, or other worker processes, still read. On swap a pointer file
+naming the files of the new generation is replaced atomically; workers that start
+later load the generation it points to.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Only for type hints: generations hold a FAISSIndexManager or a NumpyIndexManager
+    from faiss_index_manager import FAISSIndexManager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Directory of the generation files, next to the index files of the first generation
+GENERATIONS_DIR = "index_generations"
+# Pointer to the files of the active generation (<index path without extension><suffix>)
+POINTER_SUFFIX = "_generation.json"
+# Generation directories kept on disk: the active one and those before it, which
+# worker processes that have not restarted yet may still read
+DEFAULT_KEEP_GENERATIONS = 2
+
+def get_manager_paths(manager: FAISSIndexManager) -> Dict[str, str]:
+    """
+    Get the file paths an index manager was created with
+
+    Args:
+        manager: FAISSIndexManager or NumpyIndexManager
+
+    Returns:
+        Dictionary with index_path, id_map_path and, for FAISS, params_path
+    """
+    paths = {"index_path": manager.index_path, "id_map_path": manager.id_map_path}
+    if getattr(manager, "params_path", None):
+        paths["params_path"] = manager.params_path
+    return paths
+
+def read_pointer(pointer_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the pointer to the active generation
+
+    Args:
+        pointer_path: Path of the pointer file
+
+    Returns:
+        Dictionary with the version and the paths of its files, or None if there is no
+        valid pointer
+    """
+    if not os.path.exists(pointer_path):
+        return None
+    try:
+        with open(pointer_path, 'r', encoding='utf-8') as f:
+            pointer = json.load(f)
+        return {"version": int(pointer["version"]), "paths": dict(pointer["paths"])}
+    except Exception as e:
+        logger.warning(f"Ignoring invalid index generation pointer {pointer_path}: {str(e)}")
+        return None
+
+def write_pointer(pointer_path: str, version: int, paths: Dict[str, str]) -> None:
+    """
+    Point to a new active generation, replacing the pointer file atomically
+
+    Args:
+        pointer_path: Path of the pointer file
+        version: Version of the generation
+        paths: Paths of its files (see get_manager_paths)
+    """
+    tmp_path = f"{pointer_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": version, "paths": paths, "swapped_at": time.time()}, f, indent=2)
+    os.replace(tmp_path, pointer_path)
+
+class IndexGeneration:
+    """One version of the index, reference counted by the searches using it"""
+
+    def __init__(self, version: int, manager: FAISSIndexManager):
+        """
+        Initialize the generation
+
+        Args:
+            version: Version number of the generation, increasing with every swap
+            manager: Index manager holding the loaded index of this generation
+        """
+        self.version = version
+        self.manager = manager
+        self.activated_at = time.time()
+        self.in_flight = 0
+        self.retired = False
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Pin the generation for a search"""
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self) -> None:
+        """Unpin the generation, closing it if it was retired and this was the last search"""
+        with self._lock:
+            self.in_flight -= 1
+            close = self.retired and self.in_flight == 0
+        if close:
+            self._close()
+
+    def retire(self) -> None:
+        """Mark the generation as replaced, closing it once no search uses it"""
+        with self._lock:
+            self.retired = True
+            close = self.in_flight == 0
+        if close:
+            self._close()
+
+    def _close(self) -> None:
+        """Release every structure of the generation so its memory can be reclaimed"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        # Under the manager's write lock, so a search that did not pin the generation never
+        # sees half of it; afterwards the manager refuses searches instead of reloading
+        self.manager.close()
+        logger.info(f"Index generation {self.version} retired")
+
+class IndexGenerations:
+    """Serves searches from the active index generation and rebuilds the index in the background"""
+
+    def __init__(self, manager_factory: Callable[..., FAISSIndexManager],
+                 initial_manager: Optional[FAISSIndexManager] = None,
+                 keep_generations: int = DEFAULT_KEEP_GENERATIONS):
+        """
+        Initialize the generations
+
+        Args:
+            manager_factory: Creates a new, empty index manager, for the files given as
+                             keyword arguments (index_path, id_map_path, params_path) or
+                             for the default files when called without arguments
+            initial_manager: Manager of the first generation (default: a manager of the
+                             generation named by the pointer file, else of the default files)
+            keep_generations: Generation directories kept on disk after a swap
+        """
+        self.manager_factory = manager_factory
+        self.keep_generations = max(1, keep_generations)
+        self._lock = threading.Lock()
+
+        # The files of the first generation locate the generation directories and the pointer
+        manager = initial_manager or manager_factory()
+        self.base_paths = get_manager_paths(manager)
+        index_path = self.base_paths["index_path"]
+        self.generations_dir = os.path.join(os.path.dirname(os.path.abspath(index_path)), GENERATIONS_DIR)
+        self.pointer_path = os.path.splitext(index_path)[0] + POINTER_SUFFIX
+        version = 1
+        pointer = read_pointer(self.pointer_path)
+        if pointer is not None:
+            version = pointer["version"]
+            if initial_manager is None:
+                manager = manager_factory(**pointer["paths"])
+                logger.info(f"Serving index generation {version} from {manager.index_path}")
+        self._active = IndexGeneration(version, manager)
+        self._retiring: List[IndexGeneration] = []
+
+        # A single worker, so that at most one rebuild runs at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-rebuild")
+        self._build_future: Optional[Future] = None
+        self._building_manager: Optional[FAISSIndexManager] = None
+        self._build_status = {"state": "idle"}
+
+    @property
+    def version(self) -> int:
+        """Version of the active generation"""
+        return self._active.version
+
+    @property
+    def cache_version(self) -> Tuple[int, int]:
+        """
+        Version of the searchable contents: the active generation and the changes applied
+        to it (loads and incremental updates), for keying cached search responses
+        """
+        active = self._active
+        return active.version, active.manager.data_version
+
+    @property
+    def active_manager(self) -> FAISSIndexManager:
+        """
+        Manager of the active generation
+
+        Only for setup and administration; searches should use acquire() so that the
+        index is not retired while they run.
+        """
+        return self._active.manager
+
+    @contextmanager
+    def acquire(self) -> Iterator[FAISSIndexManager]:
+        """
+        Pin the active generation for the duration of a search
+
+        Returns:
+            Context manager yielding the index manager of the active generation
+        """
+        with self._lock:
+            generation = self._active
+            generation.acquire()
+        try:
+            yield generation.manager
+        finally:
+            generation.release()
+
+    def get_generation_paths(self, version: int) -> Dict[str, str]:
+        """
+        Get the file paths of a generation
+
+        Args:
+            version: Version of the generation
+
+        Returns:
+            Dictionary like get_manager_paths; the first generation uses the default files,
+            later ones the same file names in their own generation directory
+        """
+        if version <= 1:
+            return dict(self.base_paths)
+        directory = os.path.join(self.generations_dir, str(version))
+        return {name: os.path.join(directory, os.path.basename(path)) for name, path in self.base_paths.items()}
+
+    def _claim_version(self) -> int:
+        """
+        Reserve the version and directory of the next generation
+
+        Creating the directory is atomic, so two workers rebuilding at the same time
+        never build into the same files.
+
+        Returns:
+            int: Version of the claimed generation
+        """
+        pointer = read_pointer(self.pointer_path)
+        version = max(self._active.version, pointer["version"] if pointer is not None else 0) + 1
+        os.makedirs(self.generations_dir, exist_ok=True)
+        while True:
+            try:
+                os.mkdir(os.path.join(self.generations_dir, str(version)))
+                return version
+            except FileExistsError:
+                version += 1
+
+    def _prune_generations(self, active_version: int) -> None:
+        """Delete generation directories older than the last keep_generations (the default files are kept)"""
+        if not os.path.isdir(self.generations_dir):
+            return
+        for name in os.listdir(self.generations_dir):
+            if name.isdigit() and int(name) <= active_version - self.keep_generations:
+                shutil.rmtree(os.path.join(self.generations_dir, name), ignore_errors=True)
+                logger.info(f"Deleted the files of index generation {name}")
+
+    def swap(self, manager: FAISSIndexManager, version: Optional[int] = None) -> int:
+        """
+        Make a loaded index manager the active generation
+
+        Args:
+            manager: Index manager with a loaded index
+            version: Version of the generation (default: the active version plus one)
+
+        Returns:
+            int: Version of the new active generation
+        """
+        with self._lock:
+            previous = self._active
+            self._active = IndexGeneration(version or previous.version + 1, manager)
+            self._retiring = [generation for generation in self._retiring if not generation.closed]
+            self._retiring.append(previous)
+        logger.info(f"Swapped index generation {previous.version} -> {self._active.version}, "
+                    f"{previous.in_flight} searches still using generation {previous.version}")
+        previous.retire()
+        return self._active.version
+
+    def start_rebuild(self, **build_kwargs: Any) -> Optional[Future]:
+        """
+        Rebuild the index into a new generation in the background
+
+        Args:
+            **build_kwargs: Keyword arguments passed to FAISSIndexManager.build_index
+
+        Returns:
+            Future resolving to True if the new generation was swapped in, or None if a
+            rebuild is already running
+        """
+        with self._lock:
+            if self._build_future is not None and not self._build_future.done():
+                return None
+            self._build_status = {
+                "state": "building",
+                "started_at": time.time()
+            }
+            self._build_future = self._executor.submit(self._rebuild, build_kwargs)
+            return self._build_future
+
+    def _rebuild(self, build_kwargs: Dict[str, Any]) -> bool:
+        """
+        Build a new generation and swap it in
+
+        Args:
+            build_kwargs: Keyword arguments passed to FAISSIndexManager.build_index
+
+        Returns:
+            bool: True if the new generation was swapped in, False otherwise
+        """
+        status = dict(self._build_status)
+        try:
+            version = self._claim_version()
+            status["target_version"] = self._build_status["target_version"] = version
+            paths = self.get_generation_paths(version)
+            manager = self.manager_factory(**paths)
+            self._building_manager = manager
+            success = manager.build_index(force_rebuild=True, **build_kwargs)
+            if success:
+                status["state"] = "done"
+                status["version"] = self.swap(manager, version)
+                write_pointer(self.pointer_path, version, paths)
+                self._prune_generations(version)
+            else:
+                status["state"] = "failed"
+                status["error"] = "Index build failed, see the server log"
+            return success
+        except Exception as e:
+            logger.error(f"Error rebuilding index generation: {str(e)}")
+            logger.error(traceback.format_exc())
+            status["state"] = "failed"
+            status["error"] = str(e)
+            return False
+        finally:
+            status["finished_at"] = time.time()
+            status["duration_s"] = round(status["finished_at"] - status["started_at"], 3)
+            self._build_status = status
+            self._building_manager = None
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the running rebuild to finish
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            bool: True if the last rebuild swapped in a new generation, False otherwise
+        """
+        future = self._build_future
+        return bool(future.result(timeout=timeout)) if future is not None else False
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Get the active version and the progress of the background rebuild
+
+        Returns:
+            Dictionary with the active generation, the generations being retired and the build status
+        """
+        active = self._active
+        build = dict(self._build_status)
+        building_manager = self._building_manager
+        if build.get("state") == "building" and building_manager is not None:
+            build["progress"] = dict(building_manager.build_progress)
+            build["elapsed_s"] = round(time.time() - build["started_at"], 3)
+
+        return {
+            "version": active.version,
+            "index_path": active.manager.index_path,
+            "activated_at": active.activated_at,
+            "vector_count": active.manager.index.ntotal if active.manager.index is not None else 0,
+            "in_flight_searches": active.in_flight,
+            "retiring_generations": [
+                {"version": generation.version, "in_flight_searches": generation.in_flight}
+                for generation in self._retiring if not generation.closed
+            ],
+            "build": build
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the background rebuild worker
+
+        Args:
+            wait: Wait for a running rebuild to finish
+        """
+        self._executor.shutdown(wait=wait)
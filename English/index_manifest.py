@@ -0,0 +1,181 @@
+"""
+Manifest of the inputs and artifacts of a FAISS index build
+Records the hash of the source JSON file, the embedding model, the dimension and the
+index parameters next to the index, so that an unchanged index is not rebuilt and a
+stale one is not loaded.
+"""
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+# Bytes read at a time when hashing files
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+def file_sha256(path: str) -> str:
+    """
+    Compute the SHA-256 of a file without reading it into memory at once
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def describe_file(path: str, with_hash: bool = True) -> Dict[str, Any]:
+    """
+    Describe a file by its size, modification time and optionally its hash
+
+    Args:
+        path: Path to the file
+        with_hash: Also compute the SHA-256 of the file
+
+    Returns:
+        Dictionary with the path, size, mtime_ns and sha256 of the file
+    """
+    stat = os.stat(path)
+    return {
+        "path": os.path.basename(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path) if with_hash else None
+    }
+
+def create_manifest(source_path: str, model_name: str, dimension: int, index_type: str,
+                    index_params: Dict[str, Any], artifact_paths: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Create the manifest of an index build
+
+    Args:
+        source_path: Path to the JSON file the index was built from
+        model_name: Name of the embedding model of the vectors
+        dimension: Dimension of the vectors
+        index_type: Type of the index
+        index_params: Requested build parameters of the index
+        artifact_paths: Files written by the build, keyed by a name such as "index"
+
+    Returns:
+        Manifest dictionary
+    """
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "source": describe_file(source_path),
+        "model_name": model_name,
+        "dimension": dimension,
+        "index_type": index_type,
+        "index_params": index_params,
+        "artifacts": {name: describe_file(path) for name, path in artifact_paths.items()},
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+def save_manifest(manifest: Dict[str, Any], manifest_path: str) -> None:
+    """
+    Atomically write a manifest to disk
+
+    Args:
+        manifest: Manifest dictionary
+        manifest_path: Path to write the manifest to
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def load_manifest(manifest_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a manifest from disk
+
+    Args:
+        manifest_path: Path to the manifest
+
+    Returns:
+        Manifest dictionary, or None if it does not exist or cannot be read
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def source_matches(manifest: Dict[str, Any], source_path: str) -> Tuple[bool, bool]:
+    """
+    Check whether the source file is the one the manifest was built from
+
+    The file is only hashed when its size matches but its modification time does not,
+    e.g. after a checkout or a copy, so the common unchanged case costs a single stat.
+
+    Args:
+        manifest: Manifest dictionary
+        source_path: Path to the JSON source file
+
+    Returns:
+        Tuple of (source unchanged, file was hashed to decide)
+    """
+    recorded = manifest.get("source") or {}
+    stat = os.stat(source_path)
+    if stat.st_size != recorded.get("size"):
+        return False, False
+    if stat.st_mtime_ns == recorded.get("mtime_ns"):
+        return True, False
+    return file_sha256(source_path) == recorded.get("sha256"), True
+
+def check_manifest(manifest: Optional[Dict[str, Any]], source_path: str, model_name: str,
+                   index_type: str, index_params: Dict[str, Any],
+                   artifact_paths: Optional[Dict[str, str]] = None,
+                   dimension: Optional[int] = None, deep: bool = False) -> Tuple[bool, str]:
+    """
+    Check whether an index is up to date with its inputs
+
+    Args:
+        manifest: Manifest of the index, or None if it has none
+        source_path: Path to the JSON source file
+        model_name: Name of the configured embedding model
+        index_type: Configured index type
+        index_params: Configured build parameters
+        artifact_paths: Index files to check against the recorded sizes
+        dimension: Dimension of the loaded index, if any
+        deep: Also verify the hashes of the index files
+
+    Returns:
+        Tuple of (up to date, reason)
+    """
+    if manifest is None:
+        return False, "no manifest"
+    if manifest.get("manifest_version") != MANIFEST_VERSION:
+        return False, f"manifest version {manifest.get('manifest_version')} is not {MANIFEST_VERSION}"
+    if manifest.get("model_name") != model_name:
+        return False, f"embedding model changed from {manifest.get('model_name')} to {model_name}"
+    if manifest.get("index_type") != index_type:
+        return False, f"index type changed from {manifest.get('index_type')} to {index_type}"
+    if manifest.get("index_params") != index_params:
+        return False, "index parameters changed"
+    if dimension is not None and manifest.get("dimension") != dimension:
+        return False, f"dimension changed from {manifest.get('dimension')} to {dimension}"
+
+    for name, path in (artifact_paths or {}).items():
+        recorded = manifest.get("artifacts", {}).get(name)
+        if recorded is None or not os.path.exists(path):
+            return False, f"{name} file missing"
+        if os.path.getsize(path) != recorded.get("size"):
+            return False, f"{name} file size differs from the manifest"
+        if deep and file_sha256(path) != recorded.get("sha256"):
+            return False, f"{name} file hash differs from the manifest"
+
+    if not os.path.exists(source_path):
+        # Deployments may ship the index without its source, nothing to compare against
+        return True, "source file not found, not checked"
+    unchanged, hashed = source_matches(manifest, source_path)
+    if not unchanged:
+        return False, f"{os.path.basename(source_path)} changed since the index was built"
+    return True, "source touched but content unchanged" if hashed else "up to date"
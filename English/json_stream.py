@@ -0,0 +1,101 @@
+"""
+Incremental reader for large JSON array files
+Yields the documents of a top-level JSON array one at a time instead of loading the whole file
+"""
+import json
+from typing import Any, Dict, Iterator
+
+# Number of characters read from the file at a time
+DEFAULT_READ_SIZE = 1024 * 1024
+
+class JSONArrayStream:
+    """
+    Iterate over the elements of a JSON array file without loading it completely
+
+    Only the current read buffer and the element being decoded are kept in memory.
+    The number of characters consumed so far is available as `position`, which
+    callers can use to estimate the total number of elements.
+    """
+
+    def __init__(self, file_path: str, read_size: int = DEFAULT_READ_SIZE):
+        """
+        Initialize the stream
+
+        Args:
+            file_path: Path to a file containing a top-level JSON array
+            read_size: Number of characters read from the file at a time
+        """
+        self.file_path = file_path
+        self.read_size = read_size
+        self.position = 0
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        decoder = json.JSONDecoder()
+        with open(self.file_path, 'r', encoding='utf-8') as f:
+            buffer = ""
+            pos = 0
+            eof = False
+            started = False
+            consumed = 0  # Characters dropped from the front of the buffer
+
+            while True:
+                # Skip whitespace and separators between elements
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+
+                if pos >= len(buffer):
+                    if eof:
+                        raise ValueError(f"Unexpected end of file in {self.file_path}")
+                    consumed += pos
+                    buffer = f.read(self.read_size)
+                    pos = 0
+                    eof = len(buffer) < self.read_size
+                    continue
+
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{self.file_path} does not contain a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+
+                if buffer[pos] == "]":
+                    self.position = consumed + pos + 1
+                    return
+
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                    # A number at the very end of the buffer may continue in the next read
+                    complete = end < len(buffer) or eof
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    complete = False
+
+                if not complete:
+                    # Element spans the read boundary: keep the unread part and read more
+                    consumed += pos
+                    more = f.read(self.read_size)
+                    eof = len(more) < self.read_size
+                    buffer = buffer[pos:] + more
+                    pos = 0
+                    continue
+
+                pos = end
+                self.position = consumed + pos
+                self.count += 1
+                yield element
+
+def iter_json_array(file_path: str, read_size: int = DEFAULT_READ_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the elements of a JSON array file one at a time
+
+    Args:
+        file_path: Path to a file containing a top-level JSON array
+        read_size: Number of characters read from the file at a time
+
+    Returns:
+        Iterator over the array elements
+    """
+    return iter(JSONArrayStream(file_path, read_size))
@@ -0,0 +1,195 @@
+"""
+Dynamic micro-batching of concurrent requests
+Collects items submitted by concurrent callers for up to a short window (or until a
+batch is full), runs one batched call for all of them on a background thread and
+resolves each caller's future with its own result. Used to turn many concurrent
+single-sentence embedding requests into one batched model.encode call. Callers can
+block on the result (threaded Flask) or await it (FastAPI async handlers).
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Longest time the first item of a batch waits for more items, and the largest batch
+DEFAULT_MAX_WAIT_MS = 3.0
+DEFAULT_MAX_BATCH_SIZE = 32
+
+def get_batching_config() -> Dict[str, Any]:
+    """
+    Get the micro-batching configuration from the environment
+
+    EMBEDDING_MICRO_BATCHING enables it (default true), EMBEDDING_BATCH_WINDOW_MS sets the
+    window and EMBEDDING_MAX_BATCH the largest batch.
+
+    Returns:
+        Dictionary with enabled, max_wait_ms and max_batch_size
+    """
+    return {
+        "enabled": os.environ.get("EMBEDDING_MICRO_BATCHING", "true").lower() in ("1", "true", "yes"),
+        "max_wait_ms": float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", DEFAULT_MAX_WAIT_MS)),
+        "max_batch_size": int(os.environ.get("EMBEDDING_MAX_BATCH", DEFAULT_MAX_BATCH_SIZE))
+    }
+
+class MicroBatcher:
+    """
+    Groups concurrent submissions into batches processed by one background thread
+
+    The first item of a batch waits at most max_wait_ms for others; a full batch is
+    processed at once. While a batch is processed new items queue up, so under load
+    batches grow toward max_batch_size without any waiting.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, name: str = "micro-batcher"):
+        """
+        Initialize the batcher
+
+        Args:
+            batch_fn: Function mapping a list of items to the list of their results (same order)
+            max_batch_size: Largest number of items per batch_fn call
+            max_wait_ms: Longest time the first item of a batch waits for more items
+            name: Name of the background thread
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.total_wait_time = 0.0
+        self.total_batch_time = 0.0
+
+    def _ensure_started(self) -> None:
+        """Start the background thread on first use"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue an item for the next batch
+
+        Args:
+            item: Item passed to batch_fn
+
+        Returns:
+            Future resolved with the result of the item
+        """
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def process(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Submit an item and block until its result is ready
+
+        Args:
+            item: Item passed to batch_fn
+            timeout: Seconds to wait for the result (default: no limit)
+
+        Returns:
+            Result of the item
+        """
+        return self.submit(item).result(timeout)
+
+    async def aprocess(self, item: Any) -> Any:
+        """
+        Submit an item and await its result without blocking the event loop
+
+        Args:
+            item: Item passed to batch_fn
+
+        Returns:
+            Result of the item
+        """
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self) -> List[tuple]:
+        """Wait for the first item, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Closing: process what was collected, the loop then stops
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        """Process batches until closed"""
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            # Skip items whose callers gave up waiting
+            live = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not live:
+                continue
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn([item for item, _, _ in live])
+                if len(results) != len(live):
+                    raise RuntimeError(f"batch_fn returned {len(results)} results for {len(live)} items")
+                for (_, future, _), result in zip(live, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(live)} items: {str(e)}")
+                logger.error(traceback.format_exc())
+                for _, future, _ in live:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(live)
+            self.largest_batch = max(self.largest_batch, len(live))
+            # Only items that were processed, like self.items
+            self.total_wait_time += sum(start - submitted for _, _, submitted in live)
+            self.total_batch_time += time.perf_counter() - start
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Process the queued items and stop the background thread"""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the number and average size of the batches and the average queueing delay"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "mean_wait_ms": self.total_wait_time / self.items * 1000 if self.items else 0.0,
+            "mean_batch_time_ms": self.total_batch_time / self.batches * 1000 if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
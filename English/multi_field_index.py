@@ -0,0 +1,418 @@
+"""
+Multi-field document vectors with fused scoring
+Besides the Description embedding (Vector-Embedding_SubClass) every document gets one
+vector per hierarchy description and for its "Inclusion from Exclusion" text. Each
+field is stored as a separate normalized float32 sub-index, aligned by FAISS id, with
+the norms of the original embeddings precomputed (a zero norm marks a document without
+that field). At query time the field similarities are fused with weights in one batched
+pass over the sub-indexes, without touching the JSON file.
+"""
+import os
+import json
+import time
+import logging
+import traceback
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from id_map import IDMap, stable_faiss_ids
+from json_stream import JSONArrayStream
+from embedding_sidecar import ENGLISH_EMBEDDING_FIELD
+from nic_hierarchy import HIERARCHY_LEVELS, NICHierarchy, document_codes
+from numpy_index_manager import DEFAULT_SEARCH_BLOCK_ROWS, block_top_k, normalize_rows
+from index_manifest import check_manifest, create_manifest, load_manifest, save_manifest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MULTI_FIELD_DIR = "multi_field_index"
+DEFAULT_JSON_PATH = "output.json"
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+INDEX_TYPE = "multi_field"
+
+# Named vector fields and their source: ("embedding", field) reads a precomputed
+# embedding from the document, ("text", field) embeds the text of the field
+VECTOR_FIELDS = {
+    "description": ("embedding", ENGLISH_EMBEDDING_FIELD),
+    "class": ("text", "Class_Description"),
+    "group": ("text", "Group_Description"),
+    "division": ("text", "Division_Description"),
+    "inclusion": ("text", "Inclusion from Exclusion")
+}
+
+# Fusion weights used when a search does not give its own
+DEFAULT_FIELD_WEIGHTS = {
+    "description": 0.6,
+    "class": 0.15,
+    "group": 0.05,
+    "division": 0.05,
+    "inclusion": 0.15
+}
+
+def parse_field_weights(spec: Optional[str]) -> Dict[str, float]:
+    """
+    Parse field weights given as text, e.g. the MULTI_FIELD_WEIGHTS environment variable
+
+    Args:
+        spec: Comma separated field=weight pairs, e.g. "description=0.7,class=0.3"
+
+    Returns:
+        Dictionary {field: weight}, empty if spec is empty
+    """
+    weights = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        field, _, weight = item.partition("=")
+        if field.strip() not in VECTOR_FIELDS:
+            raise ValueError(f"Unknown vector field {field.strip()}, expected one of {', '.join(VECTOR_FIELDS)}")
+        weights[field.strip()] = float(weight)
+    return weights
+
+def field_text(doc: Dict[str, Any], field: str) -> str:
+    """
+    Get the text of a text field of a document
+
+    Args:
+        doc: NIC document
+        field: Document field
+
+    Returns:
+        str: Stripped text ("" if the field is missing, empty or NaN)
+    """
+    value = doc.get(field)
+    if not isinstance(value, str):
+        return ""
+    return value.strip()
+
+class MultiFieldIndex:
+    """Per-field sub-indexes of the documents with weighted score fusion"""
+
+    def __init__(self, index_dir: Optional[str] = None, json_file_path: Optional[str] = None,
+                 model_name: Optional[str] = None, mmap: bool = True,
+                 block_rows: int = DEFAULT_SEARCH_BLOCK_ROWS):
+        """
+        Initialize the multi-field index
+
+        Args:
+            index_dir: Directory holding the sub-indexes
+            json_file_path: Path to the JSON data file
+            model_name: Embedding model of the vectors, recorded in the manifest
+            mmap: Memory-map the sub-indexes instead of reading them into private memory
+            block_rows: Corpus rows scored at a time
+        """
+        self.index_dir = index_dir or DEFAULT_MULTI_FIELD_DIR
+        self.json_file_path = json_file_path or DEFAULT_JSON_PATH
+        self.model_name = model_name or DEFAULT_EMBEDDING_MODEL
+        self.mmap = mmap
+        self.block_rows = block_rows
+
+        self.fields: List[str] = []
+        self.vectors: Dict[str, np.ndarray] = {}
+        self.norms: Optional[np.ndarray] = None
+        self.id_map: Optional[IDMap] = None
+        self.hierarchy: Optional[NICHierarchy] = None
+        self.build_stats = {}
+
+    def _path(self, name: str) -> str:
+        """Path of a file of the index directory"""
+        return os.path.join(self.index_dir, name)
+
+    def _artifacts(self, fields: Iterable[str]) -> Dict[str, str]:
+        """Files written by a build, checked against the manifest"""
+        artifacts = {f"field_{field}": self._path(f"{field}.npy") for field in fields}
+        artifacts.update({"norms": self._path("norms.npy"), "id_map": self._path("id_map.npy")})
+        return artifacts
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.norms is not None
+
+    def build(self, embed_texts: Callable[[List[str]], np.ndarray], fields: Optional[List[str]] = None) -> bool:
+        """
+        Build the sub-indexes from the JSON file
+
+        Text fields repeat heavily (every Class description is shared by its Sub-Classes),
+        so each distinct text is embedded only once.
+
+        Args:
+            embed_texts: Function embedding a list of texts into an (n, d) matrix
+            fields: Fields to build (default: all VECTOR_FIELDS)
+
+        Returns:
+            bool: True if successfully built, False otherwise
+        """
+        try:
+            build_start = time.time()
+            fields = list(fields or VECTOR_FIELDS)
+            doc_ids, codes, embeddings = [], [], []
+            texts = {field: [] for field in fields if VECTOR_FIELDS[field][0] == "text"}
+            for doc in JSONArrayStream(self.json_file_path):
+                embedding = doc.get(ENGLISH_EMBEDDING_FIELD)
+                if "_id" not in doc or not isinstance(embedding, list) or len(embedding) == 0:
+                    continue
+                doc_ids.append(str(doc["_id"]))
+                codes.append(document_codes(doc))
+                embeddings.append(embedding)
+                for field, values in texts.items():
+                    values.append(field_text(doc, VECTOR_FIELDS[field][1]))
+            if not doc_ids:
+                logger.error(f"No embeddings found in {self.json_file_path}")
+                return False
+
+            # Rows sorted by stable FAISS id, like the NumPy and FAISS indexes
+            faiss_ids = stable_faiss_ids(doc_ids)
+            faiss_ids, rows = np.unique(faiss_ids, return_index=True)
+            description = np.asarray(embeddings, dtype='float32')[rows]
+            dimension = description.shape[1]
+
+            matrices = {}
+            for field in fields:
+                if VECTOR_FIELDS[field][0] == "embedding":
+                    matrices[field] = description
+                    continue
+                values = [texts[field][row] for row in rows.tolist()]
+                unique_texts, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+                present = unique_texts != ""
+                unique_vectors = np.zeros((len(unique_texts), dimension), dtype='float32')
+                if present.any():
+                    unique_vectors[present] = np.asarray(embed_texts(unique_texts[present].tolist()), dtype='float32')
+                matrices[field] = unique_vectors[inverse.ravel()]
+                logger.info(f"Embedded {int(present.sum())} distinct {field} texts for {len(rows)} documents")
+
+            os.makedirs(self.index_dir, exist_ok=True)
+            norms = np.stack([np.linalg.norm(matrices[field], axis=1) for field in fields], axis=1).astype('float32')
+            for field in fields:
+                self._save_array(f"{field}.npy", normalize_rows(matrices[field].copy()))
+            self._save_array("norms.npy", norms)
+            IDMap.from_doc_ids([doc_ids[row] for row in rows.tolist()], faiss_ids).save(self._path("id_map.npy"))
+            NICHierarchy.from_codes(faiss_ids, [codes[row] for row in rows.tolist()]).save(self._path("hierarchy.npy"))
+
+            self.build_stats = {
+                "num_documents": int(len(faiss_ids)),
+                "fields": fields,
+                "documents_per_field": {field: int((norms[:, i] > 0).sum()) for i, field in enumerate(fields)},
+                "build_time_s": round(time.time() - build_start, 3)
+            }
+            with open(self._path("fields.json"), 'w') as f:
+                json.dump({"fields": fields, "dimension": dimension, "build_stats": self.build_stats}, f, indent=2)
+            save_manifest(create_manifest(self.json_file_path, self.model_name, dimension, INDEX_TYPE,
+                                          {"fields": fields}, self._artifacts(fields)), self._path("manifest.json"))
+            logger.info(f"Multi-field index built: {self.build_stats}")
+            return self.load()
+        except Exception as e:
+            logger.error(f"Error building multi-field index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        """Save an array of the index directory through a temporary file"""
+        tmp_path = self._path(f"{name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, self._path(name))
+
+    def check_manifest(self) -> Tuple[bool, str]:
+        """
+        Check whether the sub-indexes were built from the current JSON file
+
+        Returns:
+            Tuple of (up to date, reason)
+        """
+        manifest = load_manifest(self._path("manifest.json"))
+        fields = manifest.get("index_params", {}).get("fields", []) if manifest else []
+        return check_manifest(manifest, self.json_file_path, self.model_name, INDEX_TYPE,
+                              {"fields": fields}, artifact_paths=self._artifacts(fields))
+
+    def load(self) -> bool:
+        """
+        Load the sub-indexes, the norms, the ID map and the hierarchy codes
+
+        Returns:
+            bool: True if successfully loaded, False otherwise
+        """
+        try:
+            if not os.path.exists(self._path("fields.json")):
+                logger.info(f"No multi-field index in {self.index_dir}")
+                return False
+            fresh, reason = self.check_manifest()
+            if not fresh:
+                logger.warning(f"Not loading stale multi-field index {self.index_dir}: {reason}")
+                return False
+
+            with open(self._path("fields.json"), 'r') as f:
+                metadata = json.load(f)
+            mmap_mode = 'r' if self.mmap else None
+            vectors = {field: np.load(self._path(f"{field}.npy"), mmap_mode=mmap_mode) for field in metadata["fields"]}
+            norms = np.load(self._path("norms.npy"))
+            id_map = IDMap.load(self._path("id_map.npy"))
+            if any(matrix.shape[0] != len(id_map) for matrix in vectors.values()) or norms.shape[0] != len(id_map):
+                raise ValueError(f"Sub-indexes of {self.index_dir} differ in length")
+
+            self.fields = metadata["fields"]
+            self.vectors, self.norms, self.id_map = vectors, norms, id_map
+            self.hierarchy = NICHierarchy.load(self._path("hierarchy.npy"))
+            self.build_stats = metadata.get("build_stats", {})
+            logger.info(f"Loaded multi-field index with fields {', '.join(self.fields)} for {len(id_map)} documents")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading multi-field index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    def _weight_vector(self, weights: Optional[Dict[str, float]]) -> np.ndarray:
+        """Get the fusion weight of every loaded field (fields that are not loaded are ignored)"""
+        weights = weights or DEFAULT_FIELD_WEIGHTS
+        unknown = set(weights) - set(VECTOR_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown vector fields {', '.join(sorted(unknown))}, expected {', '.join(VECTOR_FIELDS)}")
+        return np.array([max(float(weights.get(field, 0.0)), 0.0) for field in self.fields], dtype='float32')
+
+    def _score_blocks(self, query_array: np.ndarray, field_weights: np.ndarray,
+                      rows: Optional[np.ndarray]) -> Iterable[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Score the documents block by block with the fused similarity (see block_top_k)
+
+        The fused score of a document is the weighted mean of its field similarities
+        over the fields it has (non-zero norm), so a missing field neither rewards nor
+        penalizes a document.
+        """
+        active = np.flatnonzero(field_weights > 0)
+        # Weight sum of every document over its present fields, from the precomputed norms
+        weight_sums = (self.norms[:, active] > 0) @ field_weights[active]
+        num_rows = len(self.id_map) if rows is None else len(rows)
+        for start in range(0, num_rows, self.block_rows):
+            block_rows = np.arange(start, min(start + self.block_rows, num_rows)) if rows is None \
+                else rows[start:start + self.block_rows]
+            scores = np.zeros((query_array.shape[0], len(block_rows)), dtype='float32')
+            for column in active.tolist():
+                scores += field_weights[column] * (query_array @ self.vectors[self.fields[column]][block_rows].T)
+            block_sums = weight_sums[block_rows]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(block_sums > 0, scores / block_sums, -np.inf).astype('float32')
+            yield scores, block_rows
+
+    def search_batch(self, query_matrix: np.ndarray, top_k: int = 10,
+                     weights: Optional[Dict[str, float]] = None,
+                     filters: Optional[Dict[str, Any]] = None,
+                     return_field_scores: bool = False):
+        """
+        Search all sub-indexes with several queries and fuse the field similarities
+
+        Args:
+            query_matrix: Query embeddings as an (n, d) matrix (or a list of n vectors)
+            top_k: Number of results to return per query
+            weights: Fusion weight per field (default: DEFAULT_FIELD_WEIGHTS)
+            filters: Hierarchy codes to restrict the search to, e.g. {"section": "C"}
+            return_field_scores: Also return the similarity of every field for the results
+
+        Returns:
+            Tuple of (document IDs, fused scores), both (n, top_k) ordered by decreasing score,
+            plus {field: (n, top_k) similarities} if return_field_scores is set
+        """
+        query_array = np.array(query_matrix, dtype='float32', ndmin=2)
+        num_queries = query_array.shape[0]
+        empty = (np.empty((num_queries, 0), dtype=str), np.empty((num_queries, 0), dtype='float32'))
+        empty_result = empty + ({},) if return_field_scores else empty
+        try:
+            if not self.is_loaded and not self.load():
+                return empty_result
+            field_weights = self._weight_vector(weights)
+            if not (field_weights > 0).any():
+                logger.warning("All fusion weights are zero")
+                return empty_result
+
+            rows = None
+            if filters and any(filters.get(level) for level in HIERARCHY_LEVELS):
+                selected = self.hierarchy.select(filters)
+                rows, found = self.id_map.positions(selected)
+                rows = rows[found]
+                if len(rows) == 0:
+                    return empty_result
+
+            normalize_rows(query_array)
+            scores, best_rows = block_top_k(self._score_blocks(query_array, field_weights, rows), top_k, num_queries)
+            # Documents without any weighted field score -inf and are dropped
+            valid = np.isfinite(scores)
+            doc_ids = self.id_map.lookup(np.where(valid, self.id_map.faiss_ids[best_rows], -1))
+            scores = np.where(valid, scores, np.nan).astype('float32')
+            if not return_field_scores:
+                return doc_ids, scores
+
+            field_scores = {
+                field: np.einsum("qd,qkd->qk", query_array, self.vectors[field][best_rows])
+                for field in self.fields
+            }
+            return doc_ids, scores, field_scores
+        except Exception as e:
+            logger.error(f"Error searching multi-field index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return empty_result
+
+    def search(self, query_embedding: List[float], top_k: int = 10,
+               weights: Optional[Dict[str, float]] = None,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Search with a query embedding and fused field scores
+
+        Args:
+            query_embedding: The query embedding vector
+            top_k: Number of results to return
+            weights: Fusion weight per field (default: DEFAULT_FIELD_WEIGHTS)
+            filters: Hierarchy codes to restrict the search to
+
+        Returns:
+            List of tuples (document_id, fused similarity score)
+        """
+        doc_ids, scores = self.search_batch(np.array([query_embedding]), top_k, weights, filters)
+        valid = doc_ids[0] != "" if doc_ids.shape[1] else np.zeros(0, dtype=bool)
+        return list(zip(doc_ids[0][valid].tolist(), scores[0][valid].tolist()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get a description of the loaded index
+
+        Returns:
+            Dictionary with the fields, document counts and build statistics
+        """
+        if not self.is_loaded:
+            return {}
+        return {
+            "fields": self.fields,
+            "num_documents": len(self.id_map),
+            "documents_per_field": {field: int((self.norms[:, i] > 0).sum()) for i, field in enumerate(self.fields)},
+            "build_stats": self.build_stats
+        }
+
+# For command line usage
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or query the multi-field index")
+    parser.add_argument("--build", action="store_true", help="Build the sub-indexes (embeds the text fields)")
+    parser.add_argument("--json", default=DEFAULT_JSON_PATH, help="Path to JSON data file")
+    parser.add_argument("--dir", default=DEFAULT_MULTI_FIELD_DIR, help="Directory of the sub-indexes")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Embedding model of the text fields")
+    parser.add_argument("--fields", nargs="+", choices=list(VECTOR_FIELDS), help="Fields to build (default: all)")
+    parser.add_argument("--query", help="Search the index with this query")
+    parser.add_argument("--weights", help="Fusion weights, e.g. description=0.7,class=0.3")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of results")
+    args = parser.parse_args()
+
+    multi_field_index = MultiFieldIndex(index_dir=args.dir, json_file_path=args.json, model_name=args.model)
+    if args.build or args.query:
+        from vector_embeddings_manager import get_embeddings_manager
+        embeddings_manager = get_embeddings_manager(args.model)
+    if args.build:
+        embed = lambda texts: np.vstack(embeddings_manager.get_embeddings_batch(texts, batch_size=64))
+        if multi_field_index.build(embed, args.fields):
+            print(f"Multi-field index built: {json.dumps(multi_field_index.build_stats)}")
+        else:
+            print("Failed to build multi-field index")
+    if args.query:
+        doc_ids, scores, field_scores = multi_field_index.search_batch(
+            [embeddings_manager.get_embedding(args.query)], args.top_k,
+            parse_field_weights(args.weights) or None, return_field_scores=True
+        )
+        for rank in range(doc_ids.shape[1]):
+            per_field = ", ".join(f"{field}={values[0, rank]:.3f}" for field, values in field_scores.items())
+            print(f"{rank + 1:>3}. {doc_ids[0, rank]}  {scores[0, rank]:.4f}  ({per_field})")
@@ -0,0 +1,363 @@
+"""
+NIC hierarchy codes of the indexed documents
+Maps FAISS ids to the Section / Division / Group / Class codes of their documents,
+so that searches can be restricted to a slice of the hierarchy inside FAISS
+"""
+import os
+import logging
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from id_map import IDMap, stable_faiss_ids
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Hierarchy levels that can be filtered on, from the top of the hierarchy down
+HIERARCHY_LEVELS = ("section", "division", "group", "class")
+
+# Document fields holding the code of each level. Part of the data spells the
+# division field "Divison", so both spellings are accepted.
+HIERARCHY_FIELDS = {
+    "section": ("Section",),
+    "division": ("Division", "Divison"),
+    "group": ("Group",),
+    "class": ("Class",)
+}
+
+# Document fields holding the description of each level
+HIERARCHY_DESCRIPTION_FIELDS = {
+    "section": "Section_Description",
+    "division": "Division_Description",
+    "group": "Group_Description",
+    "class": "Class_Description"
+}
+
+# Hierarchy roll-up: nearest documents aggregated and nodes returned per level
+DEFAULT_ROLLUP_CANDIDATES = 200
+DEFAULT_ROLLUP_TOP_N = 5
+MAX_ROLLUP_TOP_N = 50
+
+# NIC codes are fixed width: 2 digit divisions, 3 digit groups and 4 digit classes
+CODE_WIDTHS = {
+    "division": 2,
+    "group": 3,
+    "class": 4
+}
+
+def normalize_code(level: str, code: Any) -> str:
+    """
+    Normalize a hierarchy code for comparison
+
+    Codes stored as numbers lose their leading zeros, so numeric codes are padded
+    back to the NIC width of their level, and section letters are upper-cased.
+
+    Args:
+        level: Hierarchy level of the code
+        code: Code as stored in a document or given in a query
+
+    Returns:
+        str: Normalized code ("" if the code is missing)
+    """
+    if code is None:
+        return ""
+    code = str(code).strip().upper()
+    if code.endswith(".0"):
+        code = code[:-2]
+    if code.isdigit() and level in CODE_WIDTHS:
+        code = code.zfill(CODE_WIDTHS[level])
+    return code
+
+def document_codes(doc: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Get the normalized hierarchy codes of a document
+
+    Args:
+        doc: NIC document
+
+    Returns:
+        Tuple of codes, one per level of HIERARCHY_LEVELS
+    """
+    codes = []
+    for level in HIERARCHY_LEVELS:
+        value = next((doc[field] for field in HIERARCHY_FIELDS[level] if doc.get(field) not in (None, "")), None)
+        codes.append(normalize_code(level, value))
+    return tuple(codes)
+
+def hierarchy_descriptions(documents: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    Collect the description of every hierarchy code from the documents
+
+    Args:
+        documents: NIC documents
+
+    Returns:
+        Dictionary {level: {code: description}}
+    """
+    descriptions = {level: {} for level in HIERARCHY_LEVELS}
+    for doc in documents:
+        for level, code in zip(HIERARCHY_LEVELS, document_codes(doc)):
+            if code and code not in descriptions[level] and doc.get(HIERARCHY_DESCRIPTION_FIELDS[level]):
+                descriptions[level][code] = doc[HIERARCHY_DESCRIPTION_FIELDS[level]]
+    return descriptions
+
+class NICHierarchy:
+    """
+    Hierarchy codes of the indexed documents, kept sorted by FAISS id
+
+    For every level an inverted list from code to FAISS ids is derived on first use,
+    so selecting a slice of the hierarchy costs a dictionary lookup per level. The
+    parent-code arrays (the code number of every document at each level) used to
+    roll scores up the hierarchy are derived the same way.
+    """
+
+    def __init__(self, faiss_ids: np.ndarray, codes: Dict[str, np.ndarray]):
+        """
+        Initialize the hierarchy from parallel arrays
+
+        Args:
+            faiss_ids: FAISS ids, sorted ascending
+            codes: Code array of every level, aligned with faiss_ids
+        """
+        self.faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        self.codes = {level: np.asarray(codes[level], dtype=str) for level in HIERARCHY_LEVELS}
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self._parent_codes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.faiss_ids)
+
+    def _level_postings(self, level: str) -> Dict[str, np.ndarray]:
+        """Get the inverted list {code: sorted FAISS ids} of a level"""
+        postings = self._postings.get(level)
+        if postings is None:
+            unique_codes, inverse = np.unique(self.codes[level], return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(len(unique_codes) + 1))
+            # faiss_ids is sorted, so each slice of the stable order is sorted too
+            postings = {
+                code: self.faiss_ids[order[bounds[i]:bounds[i + 1]]]
+                for i, code in enumerate(unique_codes.tolist()) if code
+            }
+            self._postings[level] = postings
+        return postings
+
+    def select(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        Get the FAISS ids of the documents matching all given hierarchy codes
+
+        Args:
+            filters: Code per level, e.g. {"section": "C", "division": "10"}; empty values are ignored
+
+        Returns:
+            Sorted array of matching FAISS ids, or None if no filter was given
+        """
+        selected = None
+        for level in HIERARCHY_LEVELS:
+            code = normalize_code(level, filters.get(level))
+            if not code:
+                continue
+            ids = self._level_postings(level).get(code, np.empty(0, dtype=np.int64))
+            selected = ids if selected is None else np.intersect1d(selected, ids, assume_unique=True)
+        return selected
+
+    def _level_parent_codes(self, level: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the distinct codes of a level and the code number of every document"""
+        parent_codes = self._parent_codes.get(level)
+        if parent_codes is None:
+            unique_codes, inverse = np.unique(self.codes[level], return_inverse=True)
+            parent_codes = (unique_codes, inverse.astype(np.int32))
+            self._parent_codes[level] = parent_codes
+        return parent_codes
+
+    def rollup(self, faiss_ids: np.ndarray, scores: np.ndarray, top_n: int = 5,
+               levels: Iterable[str] = HIERARCHY_LEVELS) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Aggregate document scores up the hierarchy and get the best nodes of each level
+
+        A node scores as its best scoring document; the number of its documents among
+        the scored ones is reported as hits. Each level is aggregated in one vectorized
+        np.maximum.at / np.bincount pass over the parent-code arrays.
+
+        Args:
+            faiss_ids: FAISS ids of scored documents (-1 for empty slots)
+            scores: Similarity score of every FAISS id
+            top_n: Number of nodes to return per level
+            levels: Levels to aggregate
+
+        Returns:
+            Dictionary {level: [{"code", "score", "hits"}, ...]} ordered by decreasing score
+        """
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64).ravel()
+        scores = np.asarray(scores, dtype='float32').ravel()
+        positions = np.minimum(np.searchsorted(self.faiss_ids, faiss_ids), max(len(self) - 1, 0))
+        valid = (faiss_ids >= 0) & ~np.isnan(scores)
+        if len(self):
+            valid &= self.faiss_ids[positions] == faiss_ids
+        else:
+            valid[:] = False
+        positions, scores = positions[valid], scores[valid]
+
+        rollup = {}
+        for level in levels:
+            unique_codes, parent = self._level_parent_codes(level)
+            node_of_document = parent[positions]
+            best = np.full(len(unique_codes), -np.inf, dtype='float32')
+            np.maximum.at(best, node_of_document, scores)
+            hits = np.bincount(node_of_document, minlength=len(unique_codes))
+            # Documents without a code at this level do not form a node
+            best[unique_codes == ""] = -np.inf
+
+            num_nodes = int(np.isfinite(best).sum())
+            count = min(top_n, num_nodes)
+            if count == 0:
+                rollup[level] = []
+                continue
+            top = np.argpartition(-best, count - 1)[:count]
+            top = top[np.argsort(-best[top], kind="stable")]
+            rollup[level] = [
+                {"code": str(unique_codes[node]), "score": float(best[node]), "hits": int(hits[node])}
+                for node in top.tolist()
+            ]
+        return rollup
+
+    def get_codes(self, level: str) -> List[str]:
+        """
+        Get the distinct codes of a level
+
+        Args:
+            level: Hierarchy level
+
+        Returns:
+            Sorted list of codes
+        """
+        return sorted(self._level_postings(level).keys())
+
+    def add_codes(self, faiss_ids: np.ndarray, codes: List[Tuple[str, ...]]) -> None:
+        """
+        Insert normalized code tuples (see document_codes), keeping the arrays sorted by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids of the documents (must not be in the hierarchy yet)
+            codes: Code tuple of every document
+        """
+        if len(codes) == 0:
+            return
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        order = np.argsort(faiss_ids, kind="stable")
+        positions = np.searchsorted(self.faiss_ids, faiss_ids[order])
+        self.faiss_ids = np.insert(self.faiss_ids, positions, faiss_ids[order])
+        for column, level in enumerate(HIERARCHY_LEVELS):
+            new_codes = np.array([code[column] for code in codes], dtype=str)[order]
+            common = np.promote_types(self.codes[level].dtype, new_codes.dtype)
+            self.codes[level] = np.insert(self.codes[level].astype(common), positions, new_codes.astype(common))
+        self._postings.clear()
+        self._parent_codes.clear()
+
+    def remove(self, faiss_ids: np.ndarray) -> int:
+        """
+        Remove documents by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids to remove
+
+        Returns:
+            int: Number of documents removed
+        """
+        keep = ~np.isin(self.faiss_ids, np.asarray(faiss_ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.faiss_ids = self.faiss_ids[keep]
+            self.codes = {level: codes[keep] for level, codes in self.codes.items()}
+            self._postings.clear()
+            self._parent_codes.clear()
+        return removed
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]], id_map: Optional[IDMap] = None) -> "NICHierarchy":
+        """
+        Create the hierarchy of a collection of documents
+
+        Args:
+            documents: Documents with an "_id" and their hierarchy fields (may be a stream)
+            id_map: ID map of the index the hierarchy is for; documents are keyed by their
+                    FAISS id in it (legacy indexes use positional ids) and documents missing
+                    from it are skipped. Without it documents are keyed by their stable id.
+
+        Returns:
+            NICHierarchy instance
+        """
+        doc_ids = []
+        codes = []
+        for doc in documents:
+            if "_id" in doc:
+                doc_ids.append(str(doc["_id"]))
+                codes.append(document_codes(doc))
+        if id_map is None:
+            return cls.from_codes(stable_faiss_ids(doc_ids), codes)
+        faiss_ids = id_map.find_faiss_ids(doc_ids)
+        rows = np.flatnonzero(faiss_ids != -1)
+        return cls.from_codes(faiss_ids[rows], [codes[row] for row in rows.tolist()])
+
+    def covers(self, faiss_ids: np.ndarray) -> bool:
+        """
+        Check that the hierarchy is keyed by the ids of an index
+
+        Args:
+            faiss_ids: FAISS ids of the index
+
+        Returns:
+            bool: True if the hierarchy has codes for exactly the ids of the index
+        """
+        return np.array_equal(np.unique(np.asarray(faiss_ids, dtype=np.int64)), np.unique(self.faiss_ids))
+
+    @classmethod
+    def from_codes(cls, faiss_ids: np.ndarray, codes: List[Tuple[str, ...]]) -> "NICHierarchy":
+        """
+        Create the hierarchy from FAISS ids and normalized code tuples
+
+        Args:
+            faiss_ids: FAISS id of every document
+            codes: Code tuple of every document (see document_codes)
+
+        Returns:
+            NICHierarchy instance
+        """
+        faiss_ids, first_rows = np.unique(np.asarray(faiss_ids, dtype=np.int64), return_index=True)
+        columns = {
+            level: np.array([codes[row][column] for row in first_rows.tolist()], dtype=str)
+            for column, level in enumerate(HIERARCHY_LEVELS)
+        }
+        return cls(faiss_ids, columns)
+
+    def save(self, path: str) -> None:
+        """
+        Save the hierarchy to a binary .npy file
+
+        Args:
+            path: Target path
+        """
+        fields = [("faiss_id", "<i8")] + [(level, self.codes[level].dtype) for level in HIERARCHY_LEVELS]
+        records = np.empty(len(self), dtype=fields)
+        records["faiss_id"] = self.faiss_ids
+        for level in HIERARCHY_LEVELS:
+            records[level] = self.codes[level]
+        # Write to a temporary file first so readers never see a partially written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "NICHierarchy":
+        """
+        Load the hierarchy from disk
+
+        Args:
+            path: Path to a file written by save()
+
+        Returns:
+            NICHierarchy instance
+        """
+        records = np.load(path)
+        return cls(records["faiss_id"], {level: records[level] for level in HIERARCHY_LEVELS})
@@ -0,0 +1,667 @@
+"""
+Pure NumPy brute-force search backend
+Drop-in alternative to FAISSIndexManager (load_index, build_index, search, search_batch)
+that does not need faiss: the normalized vectors are kept in a memory-mapped float32
+.npy matrix and queries are answered with a BLAS matrix product and an np.argpartition
+top-k, which is fast enough for the corpus sizes served here.
+"""
+import os
+import json
+import time
+import logging
+import traceback
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from id_map import IDMap, stable_faiss_ids
+from json_stream import JSONArrayStream
+from embedding_sidecar import ENGLISH_EMBEDDING_FIELD, get_sidecar_paths, is_sidecar_fresh, load_sidecar
+from nic_hierarchy import (DEFAULT_ROLLUP_CANDIDATES, DEFAULT_ROLLUP_TOP_N, HIERARCHY_LEVELS,
+                           NICHierarchy, document_codes)
+from index_manifest import check_manifest, create_manifest, load_manifest, save_manifest
+from rw_lock import ReadWriteLock, write_locked
+from async_executor import BoundedExecutor, get_search_executor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Default paths, separate from the FAISS index files so both backends can coexist
+DEFAULT_INDEX_PATH = "numpy_index.npy"
+DEFAULT_ID_MAP_PATH = "numpy_id_map.npy"
+DEFAULT_JSON_PATH = "output.json"
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+INDEX_TYPE = "numpy_flat"
+INDEX_DESCRIPTION = "NumPy Brute-Force Inner Product (Cosine Similarity)"
+
+# File suffixes shared with FAISSIndexManager, e.g. numpy_index.npy -> numpy_index_manifest.json
+MANIFEST_SUFFIX = "_manifest.json"
+HIERARCHY_SUFFIX = "_hierarchy.npy"
+
+# Corpus rows scored at a time, bounding the score matrix to block_rows x queries floats
+DEFAULT_SEARCH_BLOCK_ROWS = 65536
+
+# Number of embeddings read at a time while building
+DEFAULT_BUILD_CHUNK_SIZE = 4096
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize the rows of a float32 matrix in place
+
+    Args:
+        matrix: Float32 matrix
+
+    Returns:
+        The normalized matrix
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+def block_top_k(score_blocks: Iterable[Tuple[np.ndarray, np.ndarray]], k: int,
+                num_queries: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k best scores per query from corpus blocks scored one at a time
+
+    The running top-k is merged with the np.argpartition top-k of each block, so
+    memory use does not grow with the corpus size.
+
+    Args:
+        score_blocks: Iterable of (scores, rows): the (n, b) scores of a block and the row position of each column
+        k: Number of results per query
+        num_queries: Number of queries n
+
+    Returns:
+        Tuple of (scores, row positions), both (n, k) ordered by decreasing score
+    """
+    best_scores = np.empty((num_queries, 0), dtype='float32')
+    best_rows = np.empty((num_queries, 0), dtype=np.int64)
+    for scores, rows in score_blocks:
+        block_k = min(k, scores.shape[1])
+        if block_k == 0:
+            continue
+        top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+
+        # Merge the top-k of this block with the running top-k
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+        best_rows = np.concatenate([best_rows, rows[top]], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (np.take_along_axis(best_scores, order, axis=1).astype('float32'),
+            np.take_along_axis(best_rows, order, axis=1))
+
+class NumpyFlatIndex:
+    """
+    Exact inner product index over a float32 matrix
+
+    The rows are sorted by FAISS id, so ids and hierarchy selections are translated
+    to row positions with np.searchsorted. Mirrors the ntotal / d attributes of a
+    faiss.Index so admin code can treat both backends alike.
+    """
+
+    def __init__(self, vectors: np.ndarray, faiss_ids: np.ndarray, block_rows: int = DEFAULT_SEARCH_BLOCK_ROWS):
+        """
+        Initialize the index
+
+        Args:
+            vectors: Normalized float32 vectors (may be memory-mapped), one row per FAISS id
+            faiss_ids: FAISS id of every row, sorted ascending
+            block_rows: Corpus rows scored at a time
+        """
+        self.vectors = vectors
+        self.faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        self.block_rows = block_rows
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @property
+    def d(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def rows_of(self, faiss_ids: np.ndarray) -> np.ndarray:
+        """Get the row positions of FAISS ids, dropping ids that are not in the index"""
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.faiss_ids, faiss_ids), max(self.ntotal - 1, 0))
+        if self.ntotal == 0:
+            return positions[:0]
+        return positions[self.faiss_ids[positions] == faiss_ids]
+
+    def _score_blocks(self, query_array: np.ndarray, rows: Optional[np.ndarray]) -> Iterable[Tuple[np.ndarray, np.ndarray]]:
+        """Score the corpus (or the given rows) block by block, see block_top_k"""
+        num_rows = self.ntotal if rows is None else len(rows)
+        for start in range(0, num_rows, self.block_rows):
+            end = min(start + self.block_rows, num_rows)
+            if rows is None:
+                yield query_array @ self.vectors[start:end].T, np.arange(start, end)
+            else:
+                yield query_array @ self.vectors[rows[start:end]].T, rows[start:end]
+
+    def search(self, query_array: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k rows with the largest inner product for every query
+
+        The corpus is scored block by block (see block_top_k).
+
+        Args:
+            query_array: Normalized float32 queries, shape (n, d)
+            k: Number of results per query
+            rows: Row positions to restrict the search to (default: all rows)
+
+        Returns:
+            Tuple of (scores, FAISS ids), both (n, k) ordered by decreasing score
+        """
+        scores, best_rows = block_top_k(self._score_blocks(query_array, rows), k, query_array.shape[0])
+        return scores, self.faiss_ids[best_rows]
+
+class NumpyIndexManager:
+    """Brute-force NumPy search backend with the interface of FAISSIndexManager"""
+
+    def __init__(self,
+                 json_file_path: Optional[str] = None,
+                 index_path: Optional[str] = None,
+                 id_map_path: Optional[str] = None,
+                 mmap: bool = True,
+                 model_name: Optional[str] = None,
+                 verify_manifest: bool = True,
+                 block_rows: int = DEFAULT_SEARCH_BLOCK_ROWS):
+        """
+        Initialize the NumPy index manager
+
+        Args:
+            json_file_path: Path to the JSON data file
+            index_path: Path to save/load the vector matrix (.npy)
+            id_map_path: Path to save/load the ID map
+            mmap: Memory-map the vector matrix instead of reading it into private memory
+            model_name: Embedding model of the vectors, recorded in the index manifest
+            verify_manifest: Refuse to load an index whose manifest shows that its inputs changed
+            block_rows: Corpus rows scored at a time
+        """
+        self.index_path = index_path or DEFAULT_INDEX_PATH
+        self.id_map_path = id_map_path or DEFAULT_ID_MAP_PATH
+        self.json_file_path = json_file_path or DEFAULT_JSON_PATH
+        self.index_type = INDEX_TYPE
+        self.index_params = {}
+        self.mmap = mmap
+        self.block_rows = block_rows
+
+        self.index = None
+        self.id_map = None
+        self.build_params = None
+        self.load_stats = {}
+        self.build_stats = {}
+        self.build_progress = {"stage": "idle", "processed": 0, "total": 0}
+
+        self.model_name = model_name or DEFAULT_EMBEDDING_MODEL
+        self.manifest_path = os.path.splitext(self.index_path)[0] + MANIFEST_SUFFIX
+        self.verify_manifest = verify_manifest
+        self.manifest_status = {}
+
+        self.hierarchy_path = os.path.splitext(self.index_path)[0] + HIERARCHY_SUFFIX
+        self.hierarchy = None
+
+        # Same locking as FAISSIndexManager: searches read, loads and builds write
+        self.rw_lock = ReadWriteLock()
+        self.load_count = 0
+        # Incremented whenever the searchable contents change (see FAISSIndexManager)
+        self.data_version = 0
+        # Set by close() once the index generation of this manager is retired
+        self.closed = False
+
+    def get_id_map_path(self) -> str:
+        """Path of the ID map file"""
+        return self.id_map_path
+
+    def _set_build_progress(self, stage: str, processed: int = 0, total: int = 0) -> None:
+        """Record the stage of the running build"""
+        self.build_progress = {"stage": stage, "processed": processed, "total": total}
+
+    def _manifest_artifacts(self) -> Dict[str, str]:
+        """Files written by a build, checked against the manifest"""
+        return {"index": self.index_path, "id_map": self.id_map_path, "hierarchy": self.hierarchy_path}
+
+    def check_manifest(self, deep: bool = False) -> Tuple[bool, str]:
+        """
+        Check whether the index files are up to date with the JSON file and the configuration
+
+        Args:
+            deep: Also verify the hashes of the index files
+
+        Returns:
+            Tuple of (up to date, reason)
+        """
+        manifest = load_manifest(self.manifest_path)
+        fresh, reason = check_manifest(
+            manifest, self.json_file_path, self.model_name, self.index_type, self.index_params,
+            artifact_paths=self._manifest_artifacts(),
+            dimension=self.index.d if self.index is not None else None,
+            deep=deep
+        )
+        if fresh and reason == "source touched but content unchanged":
+            # Record the new modification time so the next check is a plain stat again
+            manifest["source"]["mtime_ns"] = os.stat(self.json_file_path).st_mtime_ns
+            save_manifest(manifest, self.manifest_path)
+        self.manifest_status = {"fresh": fresh, "reason": reason,
+                                "built_at": manifest.get("built_at") if manifest else None}
+        return fresh, reason
+
+    def _read_vectors(self, chunk_size: int = DEFAULT_BUILD_CHUNK_SIZE) -> Tuple[List[str], Optional[np.ndarray], List[Tuple[str, ...]]]:
+        """
+        Read the document IDs, embeddings and hierarchy codes of the JSON file
+
+        Uses the .npy sidecar when it is up to date, otherwise parses the JSON file
+        incrementally.
+
+        Args:
+            chunk_size: Number of embeddings stacked at a time when parsing the JSON file
+
+        Returns:
+            Tuple of (document IDs, float32 embedding matrix, hierarchy codes), matrix is None on error
+        """
+        if is_sidecar_fresh(self.json_file_path, include_docs=True):
+            doc_ids, vectors = load_sidecar(self.json_file_path, mmap=True)
+            if vectors is not None:
+                with open(get_sidecar_paths(self.json_file_path)["docs"], 'r', encoding='utf-8') as f:
+                    codes_by_id = {str(doc.get("_id")): document_codes(doc) for doc in json.load(f)}
+                doc_ids = doc_ids.tolist()
+                codes = [codes_by_id.get(doc_id, ("",) * len(HIERARCHY_LEVELS)) for doc_id in doc_ids]
+                return doc_ids, np.array(vectors, dtype='float32'), codes
+
+        doc_ids, codes, chunks, chunk = [], [], [], []
+        for doc in JSONArrayStream(self.json_file_path):
+            embedding = doc.get(ENGLISH_EMBEDDING_FIELD)
+            if "_id" not in doc or not isinstance(embedding, list) or len(embedding) == 0:
+                continue
+            doc_ids.append(str(doc["_id"]))
+            codes.append(document_codes(doc))
+            chunk.append(embedding)
+            if len(chunk) >= chunk_size:
+                chunks.append(np.asarray(chunk, dtype='float32'))
+                chunk = []
+            self._set_build_progress("loading", len(doc_ids))
+        if chunk:
+            chunks.append(np.asarray(chunk, dtype='float32'))
+        if not chunks:
+            logger.error(f"No embeddings found in {self.json_file_path}")
+            return [], None, []
+        return doc_ids, np.concatenate(chunks), codes
+
+    @write_locked
+    def build_index(self, force_rebuild: bool = False, **build_options: Any) -> bool:
+        """
+        Build or rebuild the vector matrix
+
+        Args:
+            force_rebuild: Force rebuild even if the index exists
+            **build_options: Build options of FAISSIndexManager.build_index, ignored
+
+        Returns:
+            bool: True if successfully built, False otherwise
+        """
+        try:
+            if not force_rebuild and self.index is not None:
+                logger.info("Index already loaded, skipping build")
+                return True
+            if not force_rebuild and os.path.exists(self.index_path) and os.path.exists(self.id_map_path):
+                logger.info("Index files exist, attempting to load instead of rebuild")
+                if self.load_index():
+                    return True
+                logger.info("Existing index could not be loaded or is stale, rebuilding")
+
+            build_start = time.time()
+            self._set_build_progress("loading")
+            doc_ids, matrix, codes = self._read_vectors()
+            if matrix is None:
+                self._set_build_progress("failed")
+                return False
+
+            # Rows sorted by stable FAISS id, shared with the ID map and the hierarchy
+            faiss_ids = stable_faiss_ids(doc_ids)
+            unique_ids, first_rows = np.unique(faiss_ids, return_index=True)
+            if len(unique_ids) < len(faiss_ids):
+                logger.warning(f"Skipping {len(faiss_ids) - len(unique_ids)} documents with duplicate IDs")
+            matrix = normalize_rows(matrix[first_rows])
+            doc_ids = [doc_ids[row] for row in first_rows.tolist()]
+            codes = [codes[row] for row in first_rows.tolist()]
+
+            # Write to temporary files first so readers never see a partially written index
+            self._set_build_progress("saving", len(unique_ids), len(unique_ids))
+            with open(self.index_path + ".tmp", 'wb') as f:
+                np.save(f, matrix)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            IDMap.from_doc_ids(doc_ids, unique_ids).save(self.id_map_path)
+            NICHierarchy.from_codes(unique_ids, codes).save(self.hierarchy_path)
+
+            self.build_params = {
+                "index_type": INDEX_TYPE,
+                "dimension": int(matrix.shape[1]),
+                "num_vectors": int(matrix.shape[0]),
+                "metric": "inner_product",
+                "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }
+            if os.path.exists(self.json_file_path):
+                manifest = create_manifest(self.json_file_path, self.model_name, int(matrix.shape[1]), self.index_type,
+                                           self.index_params, self._manifest_artifacts())
+                save_manifest(manifest, self.manifest_path)
+                self.manifest_status = {"fresh": True, "reason": "built", "built_at": manifest["built_at"]}
+
+            del matrix
+            if not self.load_index(check=False):
+                self._set_build_progress("failed")
+                return False
+            self.build_stats = {"mode": "numpy", "num_vectors": self.index.ntotal,
+                                "build_time_s": round(time.time() - build_start, 3)}
+            self._set_build_progress("done", self.index.ntotal, self.index.ntotal)
+            logger.info(f"NumPy index built with {self.index.ntotal} vectors: {self.build_stats}")
+            return True
+        except Exception as e:
+            self._set_build_progress("failed")
+            logger.error(f"Error building NumPy index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    @write_locked
+    def load_index(self, check: bool = True) -> bool:
+        """
+        Load the vector matrix, the ID map and the hierarchy codes from disk
+
+        Args:
+            check: Verify the index against its manifest (if verify_manifest is set)
+
+        Returns:
+            bool: True if successfully loaded, False otherwise
+        """
+        try:
+            if not os.path.exists(self.index_path) or not os.path.exists(self.id_map_path):
+                logger.warning(f"Index files {self.index_path} / {self.id_map_path} not found")
+                return False
+            if check and self.verify_manifest:
+                fresh, reason = self.check_manifest()
+                if not fresh and reason != "no manifest":
+                    logger.warning(f"Not loading stale index {self.index_path}: {reason}")
+                    return False
+                if not fresh:
+                    logger.warning(f"Index {self.index_path} has no manifest, cannot check whether it is up to date")
+
+            load_start = time.time()
+            vectors = np.load(self.index_path, mmap_mode='r' if self.mmap else None)
+            id_map = IDMap.load(self.id_map_path)
+            if len(id_map) != vectors.shape[0]:
+                raise ValueError(f"Index and ID map differ in length: {vectors.shape[0]} / {len(id_map)}")
+            self.hierarchy = NICHierarchy.load(self.hierarchy_path) if os.path.exists(self.hierarchy_path) else None
+
+            # Publish the index and ID map together
+            self.index = NumpyFlatIndex(vectors, id_map.faiss_ids, self.block_rows)
+            self.id_map = id_map
+            self.build_params = self.build_params or {
+                "index_type": INDEX_TYPE,
+                "dimension": self.index.d,
+                "num_vectors": self.index.ntotal,
+                "metric": "inner_product"
+            }
+            self.load_stats = {
+                "load_mode": "mmap" if self.mmap else "heap",
+                "load_time_ms": round((time.time() - load_start) * 1000, 2),
+                "index_file_bytes": os.path.getsize(self.index_path)
+            }
+            self.load_count += 1
+            self.data_version += 1
+            logger.info(f"Loaded NumPy index with {self.index.ntotal} vectors of dimension {self.index.d}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading NumPy index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return False
+
+    def ensure_index(self, build: bool = True) -> bool:
+        """
+        Make sure an index is available, loading or building it if needed (single-flight,
+        see FAISSIndexManager.ensure_index)
+
+        Args:
+            build: Build the index if it cannot be loaded
+
+        Returns:
+            bool: True if an index is loaded, False otherwise (always False once closed)
+        """
+        if self.index is not None:
+            return True
+        with self.rw_lock.write_lock():
+            if self.index is not None:
+                return True
+            if self.closed:
+                logger.warning(f"Index manager of {self.index_path} is closed, refusing to load the index again")
+                return False
+            if self.load_index():
+                return True
+            if not build:
+                return False
+            logger.warning("Failed to load index, attempting to build it")
+            return self.build_index()
+
+    def close(self) -> None:
+        """
+        Release the vector matrix, ID map and hierarchy codes; a closed manager refuses
+        searches instead of loading the index again
+        """
+        with self.rw_lock.write_lock():
+            self.closed = True
+            self.index = None
+            self.id_map = None
+            self.hierarchy = None
+        logger.info(f"Closed index manager of {self.index_path}")
+
+    def _get_hierarchy(self) -> Optional[NICHierarchy]:
+        """Get the hierarchy codes of the indexed documents"""
+        if self.hierarchy is None and not self.closed and os.path.exists(self.hierarchy_path):
+            self.hierarchy = NICHierarchy.load(self.hierarchy_path)
+        return self.hierarchy
+
+    def get_hierarchy_codes(self, level: str) -> List[str]:
+        """
+        Get the distinct codes of a hierarchy level
+
+        Args:
+            level: Hierarchy level
+
+        Returns:
+            Sorted list of codes
+        """
+        hierarchy = self._get_hierarchy()
+        return hierarchy.get_codes(level) if hierarchy is not None else []
+
+    def _search_faiss_ids(self, query_array: np.ndarray, top_k: int,
+                          filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the matrix and return FAISS ids (see search_batch); the caller holds the read lock
+
+        Args:
+            query_array: Float32 query embeddings, shape (n, d); normalized in place
+            top_k: Number of results to return per query
+            filters: Hierarchy codes to restrict the search to
+
+        Returns:
+            Tuple of (similarity scores, FAISS ids), both (n, k); (n, 0) arrays if there is nothing to search
+        """
+        num_queries = query_array.shape[0]
+        empty_result = (np.empty((num_queries, 0), dtype='float32'), np.empty((num_queries, 0), dtype=np.int64))
+        if self.index is None or self.index.ntotal == 0:
+            return empty_result
+
+        rows = None
+        if filters and any(filters.get(level) for level in HIERARCHY_LEVELS):
+            hierarchy = self._get_hierarchy()
+            if hierarchy is None:
+                logger.error(f"No hierarchy file {self.hierarchy_path}, rebuild the index to filter by hierarchy")
+                return empty_result
+            rows = self.index.rows_of(hierarchy.select(filters))
+            if len(rows) == 0:
+                logger.info(f"No documents match the filters {filters}")
+                return empty_result
+
+        normalize_rows(query_array)
+        return self.index.search(query_array, top_k, rows)
+
+    def search_batch(self, query_matrix: np.ndarray, top_k: int = 10,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index with several query embeddings in one matrix product
+
+        Args:
+            query_matrix: Query embeddings as an (n, d) matrix (or a list of n vectors)
+            top_k: Number of results to return per query
+            nprobe: Ignored, the search is always exact
+            ef_search: Ignored, the search is always exact
+            filters: Hierarchy codes to restrict the search to, e.g. {"section": "C", "division": "10"}
+
+        Returns:
+            Tuple of (document IDs, similarity scores), both (n, top_k) arrays ordered by
+            decreasing similarity
+        """
+        query_array = np.array(query_matrix, dtype='float32', ndmin=2)
+        num_queries = query_array.shape[0]
+        empty_result = (np.empty((num_queries, 0), dtype=str), np.empty((num_queries, 0), dtype='float32'))
+        try:
+            if not self.ensure_index():
+                return empty_result
+            with self.rw_lock.read_lock():
+                D, I = self._search_faiss_ids(query_array, top_k, filters)
+                if I.shape[1] == 0:
+                    return empty_result
+                return self.id_map.lookup(I), D
+        except Exception as e:
+            logger.error(f"Error searching NumPy index: {str(e)}")
+            logger.error(traceback.format_exc())
+            return empty_result
+
+    def search(self, query_embedding: List[float], top_k: int = 10,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               filters: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Search the index with a query embedding
+
+        Args:
+            query_embedding: The query embedding vector
+            top_k: Number of results to return
+            nprobe: Ignored, the search is always exact
+            ef_search: Ignored, the search is always exact
+            filters: Hierarchy codes to restrict the search to
+
+        Returns:
+            List of tuples (document_id, similarity_score)
+        """
+        doc_ids, scores = self.search_batch(np.array([query_embedding]), top_k, filters=filters)
+        valid = doc_ids[0] != ""
+        results = list(zip(doc_ids[0][valid].tolist(), scores[0][valid].tolist()))
+        logger.info(f"Search completed with {len(results)} results")
+        return results
+
+    async def asearch(self, query_embedding: List[float], top_k: int = 10,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      executor: Optional[BoundedExecutor] = None) -> List[Tuple[str, float]]:
+        """
+        Search like search() on a bounded executor, without blocking the event loop
+
+        Args:
+            query_embedding: The query embedding vector
+            top_k: Number of results to return
+            nprobe: As in search()
+            ef_search: As in search()
+            filters: Hierarchy codes to restrict the search to
+            executor: Executor running the search (default: get_search_executor())
+
+        Returns:
+            List of tuples (document_id, similarity_score)
+
+        Raises:
+            ExecutorSaturatedError: If the executor already holds its maximum of pending requests
+        """
+        executor = executor or get_search_executor()
+        return await executor.run(self.search, query_embedding, top_k, nprobe, ef_search, filters)
+
+    def search_rollup(self, query_embedding: List[float], top_n: int = DEFAULT_ROLLUP_TOP_N,
+                      num_candidates: int = DEFAULT_ROLLUP_CANDIDATES,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      filters: Optional[Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Search the index and roll the scores of the candidates up the NIC hierarchy
+        (see FAISSIndexManager.search_rollup)
+
+        Args:
+            query_embedding: The query embedding vector
+            top_n: Number of nodes to return per level
+            num_candidates: Number of nearest documents whose scores are rolled up
+            nprobe: Ignored, the search is always exact
+            ef_search: Ignored, the search is always exact
+            filters: Hierarchy codes to restrict the search to
+
+        Returns:
+            Dictionary {level: [{"code", "score", "hits"}, ...]}, empty if the search failed
+        """
+        try:
+            if not self.ensure_index():
+                return {}
+            with self.rw_lock.read_lock():
+                D, I = self._search_faiss_ids(np.array(query_embedding, dtype='float32', ndmin=2), num_candidates, filters)
+                hierarchy = self._get_hierarchy()
+                if I.shape[1] == 0 or hierarchy is None:
+                    return {}
+                return hierarchy.rollup(I[0], D[0], top_n)
+        except Exception as e:
+            logger.error(f"Error rolling up search scores: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {}
+
+    def get_index_info(self) -> Dict[str, Any]:
+        """
+        Get a description of the loaded index
+
+        Returns:
+            Dictionary with the index type, description and build parameters
+        """
+        if self.index is None:
+            return {}
+        info = {"index_type": INDEX_TYPE, "description": INDEX_DESCRIPTION, "build_params": self.build_params}
+        if self.build_stats:
+            info["build_stats"] = self.build_stats
+        if self.manifest_status:
+            info["manifest"] = self.manifest_status
+        return info
+
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """
+        Get the load statistics of the index
+
+        Returns:
+            Dictionary with the load mode, load time and file size
+        """
+        return dict(self.load_stats, load_count=self.load_count)
+
+# For command line usage
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or test the NumPy search backend")
+    parser.add_argument("--build", action="store_true", help="Build the index")
+    parser.add_argument("--force", action="store_true", help="Force rebuild index")
+    parser.add_argument("--json", default=DEFAULT_JSON_PATH, help="Path to JSON data file")
+    parser.add_argument("--no-mmap", action="store_true", help="Read the vector matrix into memory instead of memory-mapping it")
+    parser.add_argument("--check", action="store_true", help="Check the index files against their manifest, including file hashes")
+    args = parser.parse_args()
+
+    manager = NumpyIndexManager(json_file_path=args.json, mmap=not args.no_mmap)
+    if args.check:
+        fresh, reason = manager.check_manifest(deep=True)
+        print(f"Index is {'up to date' if fresh else 'stale'}: {reason}")
+    if args.build:
+        if manager.build_index(force_rebuild=args.force):
+            print(f"Index built successfully: {json.dumps(manager.build_stats)}")
+        else:
+            print("Failed to build index")
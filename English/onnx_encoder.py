@@ -0,0 +1,341 @@
+"""
+ONNX Runtime inference backend for the query encoders
+Exports a transformer encoder (all-MiniLM-L6-v2, krutrim-ai-labs/Vyakyarth) to ONNX
+with the mean pooling inside the graph, optionally applies dynamic int8 quantization
+to its weights, and encodes queries with ONNX Runtime on the CPU. OnnxEncoder.encode
+follows SentenceTransformer.encode, so it can stand in for the torch model.
+
+onnxruntime (and torch, transformers and onnx for the export) are optional
+dependencies, imported only when this backend is used.
+"""
+import os
+import json
+import time
+import logging
+import traceback
+import numpy as np
+from typing import Any, Dict, List, Optional, Union
+from runtime_config import TORCH_THREADS_ENV
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Embedding backends of VectorEmbeddingsManager and HindiSemanticSearch
+EMBEDDING_BACKENDS = ("torch", "onnx")
+DEFAULT_EMBEDDING_BACKEND = "torch"
+
+# Directory holding one exported model per subdirectory
+DEFAULT_ONNX_DIR = "onnx_models"
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+ENCODER_CONFIG_FILE = "encoder_config.json"
+
+DEFAULT_OPSET = 14
+# Used when the model does not define its own maximum sequence length
+DEFAULT_MAX_LENGTH = 512
+
+def get_embedding_backend() -> str:
+    """
+    Get the embedding backend configured through EMBEDDING_BACKEND
+
+    Returns:
+        str: "torch" or "onnx"
+    """
+    backend = os.environ.get("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND).lower()
+    if backend not in EMBEDDING_BACKENDS:
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}', using {DEFAULT_EMBEDDING_BACKEND}")
+        backend = DEFAULT_EMBEDDING_BACKEND
+    return backend
+
+def use_quantized_model() -> bool:
+    """Whether the int8 model is used (ONNX_QUANTIZE, default true)"""
+    return os.environ.get("ONNX_QUANTIZE", "true").lower() in ("1", "true", "yes")
+
+def get_model_dir(model_name: str, onnx_dir: Optional[str] = None) -> str:
+    """
+    Get the directory of an exported model
+
+    Args:
+        model_name: Hugging Face / sentence-transformers model name
+        onnx_dir: Directory of the exported models (default: ONNX_MODEL_DIR or onnx_models)
+
+    Returns:
+        str: Directory of the model
+    """
+    onnx_dir = onnx_dir or os.environ.get("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR)
+    return os.path.join(onnx_dir, model_name.replace('/', '_'))
+
+def _load_torch_encoder(model_name: str):
+    """
+    Load the tokenizer and transformer of a model with torch
+
+    sentence-transformers models are loaded through SentenceTransformer to pick up their
+    maximum sequence length and whether they normalize; other models through AutoModel.
+
+    Returns:
+        Tuple of (tokenizer, transformer module, max_length, normalize)
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize, Pooling
+        st_model = SentenceTransformer(model_name, device="cpu")
+        pooling = [module for module in st_model if isinstance(module, Pooling)]
+        if pooling and not pooling[0].pooling_mode_mean_tokens:
+            raise ValueError(f"{model_name} does not use mean pooling, which is the only pooling exported")
+        normalize = any(isinstance(module, Normalize) for module in st_model)
+        return st_model.tokenizer, st_model[0].auto_model, st_model.max_seq_length or DEFAULT_MAX_LENGTH, normalize
+    except ImportError:
+        from transformers import AutoModel, AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        return tokenizer, model, min(DEFAULT_MAX_LENGTH, tokenizer.model_max_length), False
+
+def export_onnx(model_name: str, model_dir: Optional[str] = None, opset: int = DEFAULT_OPSET,
+                quantize: bool = True) -> bool:
+    """
+    Export a transformer encoder with mean pooling to ONNX
+
+    Writes model.onnx (float32), optionally model.int8.onnx (dynamic int8 quantization
+    of the weights, activations stay float), the tokenizer files and encoder_config.json.
+
+    Args:
+        model_name: Hugging Face / sentence-transformers model name
+        model_dir: Output directory (default: get_model_dir(model_name))
+        opset: ONNX opset version
+        quantize: Also write the int8 quantized model
+
+    Returns:
+        bool: True if successfully exported, False otherwise
+    """
+    try:
+        import torch
+
+        model_dir = model_dir or get_model_dir(model_name)
+        os.makedirs(model_dir, exist_ok=True)
+        export_start = time.time()
+        tokenizer, transformer, max_length, normalize = _load_torch_encoder(model_name)
+        transformer.eval()
+
+        sample = tokenizer(["export sample sentence", "a second, longer sample sentence for the export"],
+                           padding=True, truncation=True, max_length=max_length, return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+        class MeanPooledEncoder(torch.nn.Module):
+            """Transformer followed by attention-masked mean pooling, as one graph"""
+
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                features = dict(zip(input_names, inputs))
+                last_hidden_state = self.model(**features).last_hidden_state
+                mask = features["attention_mask"].unsqueeze(-1).to(last_hidden_state.dtype)
+                return (last_hidden_state * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+
+        onnx_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["embedding"] = {0: "batch"}
+        with torch.no_grad():
+            torch.onnx.export(
+                MeanPooledEncoder(transformer), tuple(sample[name] for name in input_names), onnx_path,
+                input_names=input_names, output_names=["embedding"], dynamic_axes=dynamic_axes,
+                opset_version=opset, do_constant_folding=True
+            )
+            dimension = int(MeanPooledEncoder(transformer)(*(sample[name] for name in input_names)).shape[1])
+        tokenizer.save_pretrained(model_dir)
+        logger.info(f"Exported {model_name} to {onnx_path} in {time.time() - export_start:.2f} seconds")
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantized_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+            quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+            logger.info(f"Quantized {onnx_path} to {quantized_path} "
+                        f"({os.path.getsize(onnx_path) / 1e6:.1f} MB -> {os.path.getsize(quantized_path) / 1e6:.1f} MB)")
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), 'w') as f:
+            json.dump({
+                "model_name": model_name,
+                "input_names": input_names,
+                "max_length": int(max_length),
+                "dimension": dimension,
+                "pooling": "mean",
+                "normalize": normalize,
+                "opset": opset,
+                "quantized": quantize,
+                "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+            }, f, indent=2)
+        return True
+    except Exception as e:
+        logger.error(f"Error exporting {model_name} to ONNX: {str(e)}")
+        logger.error(traceback.format_exc())
+        return False
+
+class OnnxEncoder:
+    """Sentence encoder running an exported model with ONNX Runtime"""
+
+    def __init__(self, model_dir: str, quantized: bool = True, num_threads: Optional[int] = None):
+        """
+        Load an exported model
+
+        Args:
+            model_dir: Directory written by export_onnx
+            quantized: Use the int8 model (falls back to float32 if it was not exported)
+            num_threads: Intra-op threads of ONNX Runtime (default: TORCH_NUM_THREADS, then all cores)
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), 'r') as f:
+            self.config = json.load(f)
+        self.model_dir = model_dir
+        self.max_length = self.config["max_length"]
+        self.normalize = self.config["normalize"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+        if not quantized or not os.path.exists(model_path):
+            if quantized:
+                logger.warning(f"No quantized model in {model_dir}, using the float32 model")
+            model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        self.model_path = model_path
+        self.quantized = model_path.endswith(QUANTIZED_MODEL_FILE)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        num_threads = num_threads or int(os.environ.get(TORCH_THREADS_ENV) or 0)
+        if num_threads:
+            # Sized like the torch pool so the worker's CPU share is respected (see runtime_config.py)
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        logger.info(f"Loaded ONNX encoder {model_path} ({'int8' if self.quantized else 'float32'})")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Dimension of the embeddings"""
+        return self.config["dimension"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: Optional[bool] = None) -> np.ndarray:
+        """
+        Encode sentences like SentenceTransformer.encode
+
+        Sentences are sorted by length before batching so that little padding is computed.
+
+        Args:
+            sentences: A sentence or a list of sentences
+            batch_size: Sentences per ONNX Runtime call
+            show_progress_bar: Ignored, accepted for compatibility
+            convert_to_numpy: Ignored, the result is always a numpy array
+            normalize_embeddings: L2-normalize the embeddings (default: as the exported model)
+
+        Returns:
+            float32 array of shape (dimension,) for a single sentence, else (len(sentences), dimension)
+        """
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        normalize = self.normalize if normalize_embeddings is None else normalize_embeddings
+        embeddings = np.empty((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            features = self.tokenizer([sentences[row] for row in rows], padding=True, truncation=True,
+                                      max_length=self.max_length, return_tensors="np")
+            feed = {name: features[name].astype(np.int64) for name in self.input_names}
+            embeddings[rows] = self.session.run(None, feed)[0]
+
+        if normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+class TorchEncoder:
+    """The torch model an export starts from, with the same encode API (parity test and benchmark)"""
+
+    def __init__(self, model_name: str, num_threads: Optional[int] = None):
+        """
+        Load the torch model
+
+        Args:
+            model_name: Hugging Face / sentence-transformers model name
+            num_threads: torch intra-op threads (default: TORCH_NUM_THREADS, then torch's default)
+        """
+        import torch
+        num_threads = num_threads or int(os.environ.get(TORCH_THREADS_ENV) or 0)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.torch = torch
+        self.tokenizer, self.model, self.max_length, self.normalize = _load_torch_encoder(model_name)
+        self.model.eval()
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: Optional[bool] = None, **kwargs) -> np.ndarray:
+        """Encode sentences with attention-masked mean pooling, like the exported graph"""
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        normalize = self.normalize if normalize_embeddings is None else normalize_embeddings
+        batches = []
+        with self.torch.no_grad():
+            for start in range(0, len(sentences), batch_size):
+                features = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                          max_length=self.max_length, return_tensors="pt")
+                last_hidden_state = self.model(**features).last_hidden_state
+                mask = features["attention_mask"].unsqueeze(-1).to(last_hidden_state.dtype)
+                pooled = (last_hidden_state * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+                batches.append(pooled.numpy().astype(np.float32))
+        embeddings = np.vstack(batches)
+        if normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+def get_onnx_encoder(model_name: str, quantized: Optional[bool] = None, onnx_dir: Optional[str] = None,
+                     num_threads: Optional[int] = None) -> OnnxEncoder:
+    """
+    Load the ONNX encoder of a model, exporting it first if needed
+
+    Args:
+        model_name: Hugging Face / sentence-transformers model name
+        quantized: Use the int8 model (default: ONNX_QUANTIZE)
+        onnx_dir: Directory of the exported models (default: ONNX_MODEL_DIR or onnx_models)
+        num_threads: Intra-op threads of ONNX Runtime
+
+    Returns:
+        OnnxEncoder instance
+    """
+    quantized = use_quantized_model() if quantized is None else quantized
+    model_dir = get_model_dir(model_name, onnx_dir)
+    if not os.path.exists(os.path.join(model_dir, ENCODER_CONFIG_FILE)):
+        logger.info(f"No ONNX export of {model_name} in {model_dir}, exporting it")
+        if not export_onnx(model_name, model_dir, quantize=quantized):
+            raise RuntimeError(f"Could not export {model_name} to ONNX")
+    return OnnxEncoder(model_dir, quantized=quantized, num_threads=num_threads)
+
+def get_encoder_info(encoder: Any) -> Dict[str, Any]:
+    """
+    Describe the encoder behind an embedding manager
+
+    Args:
+        encoder: OnnxEncoder or torch model
+
+    Returns:
+        Dictionary with the backend and, for ONNX, the model file and whether it is quantized
+    """
+    if isinstance(encoder, OnnxEncoder):
+        return {"backend": "onnx", "model_path": encoder.model_path, "quantized": encoder.quantized}
+    return {"backend": "torch"}
+
+# For command line usage
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export query encoders to ONNX (optionally int8 quantized)")
+    parser.add_argument("models", nargs="*", default=["all-MiniLM-L6-v2", "krutrim-ai-labs/Vyakyarth"],
+                        help="Models to export (default: the English and Hindi query encoders)")
+    parser.add_argument("--onnx-dir", help=f"Directory of the exported models (default: {DEFAULT_ONNX_DIR})")
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET, help="ONNX opset version")
+    parser.add_argument("--no-quantize", action="store_true", help="Only export the float32 model")
+    args = parser.parse_args()
+
+    for model in args.models:
+        success = export_onnx(model, get_model_dir(model, args.onnx_dir), opset=args.opset, quantize=not args.no_quantize)
+        print(f"{model}: {'exported to ' + get_model_dir(model, args.onnx_dir) if success else 'export failed'}")
@@ -0,0 +1,165 @@
+"""
+Full precision vectors for exact re-ranking
+Keeps the normalized float32 vectors of a compressed index in a .npy file sorted by
+FAISS id, which is memory-mapped so that only the rows of re-scored candidates are
+paged in
+"""
+import os
+import numpy as np
+from typing import Tuple
+
+class RerankStore:
+    """
+    Float32 vectors keyed by FAISS id, used to re-score candidates of a compressed index
+
+    The records are kept sorted by FAISS id, so the candidates of a whole result matrix
+    are located with a single np.searchsorted call.
+    """
+
+    def __init__(self, records: np.ndarray):
+        """
+        Initialize the store
+
+        Args:
+            records: Structured array with a "faiss_id" and a "vector" field, sorted by FAISS id
+        """
+        self._set_records(records)
+
+    def _set_records(self, records: np.ndarray) -> None:
+        """Replace the records and the field views derived from them"""
+        self.records = records
+        self.faiss_ids = records["faiss_id"]
+        self.vectors = records["vector"]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def dimension(self) -> int:
+        """Dimension of the stored vectors"""
+        return self.records.dtype["vector"].shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored records in bytes"""
+        return int(self.records.nbytes)
+
+    @staticmethod
+    def _make_records(faiss_ids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        """Create sorted records from parallel arrays"""
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        order = np.argsort(faiss_ids, kind="stable")
+        records = np.empty(len(faiss_ids), dtype=[("faiss_id", "<i8"), ("vector", "<f4", (vectors.shape[1],))])
+        records["faiss_id"] = faiss_ids[order]
+        records["vector"] = vectors[order]
+        return records
+
+    @classmethod
+    def from_vectors(cls, faiss_ids: np.ndarray, vectors: np.ndarray) -> "RerankStore":
+        """
+        Create a store from FAISS ids and their normalized vectors
+
+        Args:
+            faiss_ids: FAISS id of every vector
+            vectors: Normalized float32 vectors, one row per FAISS id
+
+        Returns:
+            RerankStore instance
+        """
+        return cls(cls._make_records(faiss_ids, vectors))
+
+    def gather(self, faiss_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the vectors of a matrix of FAISS ids
+
+        Args:
+            faiss_ids: FAISS ids of any shape, -1 for empty slots
+
+        Returns:
+            Tuple of (vectors with shape faiss_ids.shape + (d,), boolean mask of the ids found)
+        """
+        flat_ids = np.asarray(faiss_ids, dtype=np.int64).ravel()
+        positions = np.searchsorted(self.faiss_ids, flat_ids)
+        positions = np.minimum(positions, max(len(self) - 1, 0))
+        found = (self.faiss_ids[positions] == flat_ids) if len(self) else np.zeros(len(flat_ids), dtype=bool)
+        vectors = self.vectors[positions] if len(self) else np.zeros((len(flat_ids), self.dimension), dtype='float32')
+        return vectors.reshape(np.shape(faiss_ids) + (self.dimension,)), found.reshape(np.shape(faiss_ids))
+
+    def rerank(self, query_array: np.ndarray, candidate_ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Re-score candidates exactly and keep the best ones
+
+        Args:
+            query_array: Normalized query vectors, shape (n, d)
+            candidate_ids: Candidate FAISS ids per query, shape (n, c), -1 for empty slots
+            top_k: Number of results to keep per query
+
+        Returns:
+            Tuple of (exact inner products, FAISS ids), both (n, top_k) and ordered by
+            decreasing score; empty slots have a -inf score and id -1
+        """
+        vectors, found = self.gather(candidate_ids)
+        scores = np.einsum('ncd,nd->nc', vectors, query_array).astype('float32')
+        scores[~found | (candidate_ids == -1)] = -np.inf
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        ids = np.take_along_axis(candidate_ids, order, axis=1)
+        ids[np.isneginf(scores)] = -1
+        return scores, ids
+
+    def add(self, faiss_ids: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Insert vectors, keeping the records sorted by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids of the new vectors (must not be in the store yet)
+            vectors: Normalized float32 vectors
+        """
+        if len(faiss_ids) == 0:
+            return
+        new_records = self._make_records(faiss_ids, np.asarray(vectors, dtype='float32'))
+        positions = np.searchsorted(self.faiss_ids, new_records["faiss_id"])
+        self._set_records(np.insert(self.records, positions, new_records))
+
+    def remove(self, faiss_ids: np.ndarray) -> int:
+        """
+        Remove vectors by FAISS id
+
+        Args:
+            faiss_ids: FAISS ids to remove
+
+        Returns:
+            int: Number of vectors removed
+        """
+        keep = ~np.isin(self.faiss_ids, np.asarray(faiss_ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self._set_records(self.records[keep])
+        return removed
+
+    def save(self, path: str) -> None:
+        """
+        Save the store to a .npy file
+
+        Args:
+            path: Target path
+        """
+        # Write to a temporary file first so readers never see a partially written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(self.records))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "RerankStore":
+        """
+        Load a store from disk
+
+        Args:
+            path: Path to a file written by save()
+            mmap: Memory-map the file so only the re-scored rows are paged in
+
+        Returns:
+            RerankStore instance
+        """
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
@@ -0,0 +1,164 @@
+"""
+Bounded cache of complete search responses
+Repeated queries are answered without running FAISS, the document lookup and the
+result formatting again. Entries expire after a TTL, the least recently used entry is
+evicted when the cache is full, and all entries are dropped when the index changes: a
+new index generation becomes active, or documents are added, updated or removed
+incrementally.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 300.0
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query for use in a cache key
+
+    Args:
+        query: Raw query text
+
+    Returns:
+        str: Lower-cased query with runs of whitespace collapsed
+    """
+    return " ".join(str(query).lower().split())
+
+class ResponseCache:
+    """Thread-safe LRU cache with a TTL, tied to the version of the index that produced the entries"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached responses (0 disables the cache)
+            ttl_seconds: Seconds a response stays valid (0 or less: no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, **params: Any) -> Tuple:
+        """
+        Build a cache key from a query and the parameters that change its response
+
+        Args:
+            query: Query text, normalized with normalize_query
+            **params: Parameters such as result_count, search_mode or filters; dictionaries
+                      are converted to sorted tuples
+
+        Returns:
+            Hashable cache key
+        """
+        items = []
+        for name, value in sorted(params.items()):
+            if isinstance(value, dict):
+                value = tuple(sorted((k, str(v)) for k, v in value.items() if v))
+            items.append((name, value))
+        return (normalize_query(query),) + tuple(items)
+
+    def _sync_version(self, version: Hashable) -> None:
+        """Drop all entries when the index version changes (lock must be held)"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Index version {self._version} -> {version}, dropping {len(self._entries)} cached responses")
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key: Tuple, version: Hashable) -> Optional[Any]:
+        """
+        Get a cached response
+
+        Args:
+            key: Cache key from make_key
+            version: Version of the active index, increasing with every change of its
+                     contents (e.g. IndexGenerations.cache_version)
+
+        Returns:
+            Cached response, or None if it is not cached, expired or from another index version
+        """
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, version: Hashable, value: Any) -> None:
+        """
+        Cache a response
+
+        Args:
+            key: Cache key from make_key
+            version: Version of the index the response was computed with
+            value: Response to cache; it must not be modified afterwards
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._version is not None and version < self._version:
+                # Computed with an index that has been replaced in the meantime
+                return
+            self._sync_version(version)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the cache
+
+        Returns:
+            Dictionary with the size, limits, hit rate and eviction counters
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / max(1, total),
+                "total_requests": total,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "index_version": self._version
+            }
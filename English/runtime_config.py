@@ -0,0 +1,183 @@
+"""
+Coordinated thread configuration of FAISS, torch and the web server
+FAISS (OpenMP), torch (intra-op threads of SentenceTransformer and the Vyakyarth
+AutoModel) and uvicorn each default to every core, so N workers oversubscribe the CPU
+N times over. A single CPU budget is split here into a worker count and, within each
+worker's share, separate FAISS and torch thread pools. start_api.py plans the split and passes it to the
+worker processes through the environment; every worker applies it on startup.
+"""
+import os
+import logging
+from typing import Any, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Environment variables carrying the plan from start_api.py to the workers
+CPU_BUDGET_ENV = "CPU_BUDGET"
+WORKERS_ENV = "API_WORKERS"
+FAISS_THREADS_ENV = "FAISS_OMP_THREADS"
+TORCH_THREADS_ENV = "TORCH_NUM_THREADS"
+
+# Thread pools of the numerical libraries, read when they are first imported: OpenMP
+# runs the FAISS searches, MKL / OpenBLAS the torch and NumPy matrix products
+OMP_THREAD_ENVS = ("OMP_NUM_THREADS",)
+BLAS_THREAD_ENVS = ("MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+NATIVE_THREAD_ENVS = OMP_THREAD_ENVS + BLAS_THREAD_ENVS
+
+# CPUs per worker when the worker count is derived from the budget: two FAISS and
+# two torch threads
+DEFAULT_WORKER_THREADS = 4
+
+# Settings applied in this process by apply_runtime_config
+_applied: Dict[str, Any] = {}
+
+def get_cpu_count() -> int:
+    """
+    Get the number of CPUs this process may run on
+
+    Returns:
+        int: Number of usable CPUs (respects CPU affinity where the platform reports it)
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def plan_threads(cpu_budget: Optional[int] = None, workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Split a CPU budget between worker processes and their FAISS / torch threads
+
+    Micro-batched encodes (torch) and searches on the executor (FAISS) of a worker run
+    at the same time, so the worker's share is divided between the two pools instead
+    of given to each of them.
+
+    Args:
+        cpu_budget: Number of CPUs for the whole server (default: all usable CPUs)
+        workers: Number of worker processes (default: one per DEFAULT_WORKER_THREADS
+                 CPUs of the budget)
+
+    Returns:
+        Dictionary with cpu_budget, workers, threads_per_worker, faiss_threads and torch_threads
+    """
+    cpu_budget = max(1, int(cpu_budget or get_cpu_count()))
+    workers = max(1, int(workers or cpu_budget // DEFAULT_WORKER_THREADS))
+    if workers > cpu_budget:
+        logger.warning(f"{workers} workers exceed the CPU budget of {cpu_budget}, using one thread per worker")
+    threads_per_worker = max(1, cpu_budget // workers)
+    if threads_per_worker < 2:
+        logger.warning(f"A share of {threads_per_worker} CPU cannot be split, FAISS and torch get one thread each")
+    faiss_threads = max(1, threads_per_worker // 2)
+    return {
+        "cpu_budget": cpu_budget,
+        "workers": workers,
+        "threads_per_worker": threads_per_worker,
+        "faiss_threads": faiss_threads,
+        "torch_threads": max(1, threads_per_worker - faiss_threads)
+    }
+
+def export_plan(plan: Dict[str, int]) -> None:
+    """
+    Pass a thread plan to worker processes through the environment
+
+    Also sets the OpenMP / MKL / OpenBLAS variables, which only take effect in
+    processes that import those libraries afterwards (i.e. the workers).
+
+    Args:
+        plan: Plan from plan_threads
+    """
+    os.environ[CPU_BUDGET_ENV] = str(plan["cpu_budget"])
+    os.environ[WORKERS_ENV] = str(plan["workers"])
+    os.environ[FAISS_THREADS_ENV] = str(plan["faiss_threads"])
+    os.environ[TORCH_THREADS_ENV] = str(plan["torch_threads"])
+    for name in OMP_THREAD_ENVS:
+        os.environ[name] = str(plan["faiss_threads"])
+    for name in BLAS_THREAD_ENVS:
+        os.environ[name] = str(plan["torch_threads"])
+
+def get_worker_count() -> int:
+    """
+    Get the number of worker processes serving the app
+
+    Returns:
+        int: API_WORKERS, set by start_api.py for its workers (default: 1)
+    """
+    return max(1, int(os.environ.get(WORKERS_ENV) or 1))
+
+def plan_from_env() -> Optional[Dict[str, int]]:
+    """
+    Get the thread plan configured through the environment
+
+    Explicit FAISS_OMP_THREADS / TORCH_NUM_THREADS override the split of CPU_BUDGET.
+
+    Returns:
+        Plan dictionary, or None if neither a budget nor thread counts are configured
+    """
+    if not any(os.environ.get(name) for name in (CPU_BUDGET_ENV, FAISS_THREADS_ENV, TORCH_THREADS_ENV)):
+        return None
+    plan = plan_threads(os.environ.get(CPU_BUDGET_ENV) or None, get_worker_count())
+    if os.environ.get(FAISS_THREADS_ENV):
+        plan["faiss_threads"] = int(os.environ[FAISS_THREADS_ENV])
+    if os.environ.get(TORCH_THREADS_ENV):
+        plan["torch_threads"] = int(os.environ[TORCH_THREADS_ENV])
+    return plan
+
+def apply_runtime_config(plan: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Set the FAISS and torch thread pools of this process
+
+    faiss and torch are optional: a library that is not installed is skipped.
+
+    Args:
+        plan: Plan from plan_threads (default: plan_from_env; nothing is changed if there is none)
+
+    Returns:
+        Dictionary with the effective settings (see get_runtime_config)
+    """
+    plan = plan or plan_from_env()
+    if plan is not None:
+        try:
+            import faiss
+            faiss.omp_set_num_threads(int(plan["faiss_threads"]))
+        except ImportError:
+            pass
+        try:
+            import torch
+            torch.set_num_threads(int(plan["torch_threads"]))
+        except ImportError:
+            pass
+        logger.info(f"Applied thread plan: {plan}")
+    _applied.clear()
+    _applied.update(plan or {})
+    return get_runtime_config()
+
+def get_runtime_config() -> Dict[str, Any]:
+    """
+    Get the effective thread settings of this process
+
+    Returns:
+        Dictionary with the applied plan (None if the defaults are in use), the thread
+        counts reported by FAISS and torch (None if not installed), the CPU count and the
+        native thread environment variables
+    """
+    config = {
+        "plan": dict(_applied) or None,
+        "cpu_count": get_cpu_count(),
+        "pid": os.getpid(),
+        "faiss_threads": None,
+        "torch_threads": None,
+        "torch_interop_threads": None,
+        "environment": {name: os.environ.get(name) for name in NATIVE_THREAD_ENVS}
+    }
+    try:
+        import faiss
+        config["faiss_threads"] = faiss.omp_get_max_threads()
+    except ImportError:
+        pass
+    try:
+        import torch
+        config["torch_threads"] = torch.get_num_threads()
+        config["torch_interop_threads"] = torch.get_num_interop_threads()
+    except ImportError:
+        pass
+    return config
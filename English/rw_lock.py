@@ -0,0 +1,128 @@
+"""
+Readers-writer lock for the index managers
+Any number of searches may read the index at the same time, while loading, building
+and incremental changes take the lock exclusively. Waiting writers block new readers
+so that a rebuild is not starved by a steady stream of searches.
+"""
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ReadWriteLock:
+    """
+    Writer-preferring readers-writer lock
+
+    Both sides are re-entrant per thread: a thread holding the write lock may take
+    the write or the read lock again (e.g. build_index calling load_index), and a
+    thread holding the read lock may take it again. Upgrading a read lock to a write
+    lock would deadlock and raises RuntimeError instead.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, "read_depth", 0)
+
+    def acquire_read(self) -> None:
+        """Acquire the lock for reading"""
+        me = threading.get_ident()
+        if self._writer == me or self._read_depth() > 0:
+            # Nested inside this thread's own write or read lock
+            self._local.read_depth = self._read_depth() + 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.read_depth = 1
+
+    def release_read(self) -> None:
+        """Release a read lock taken by acquire_read"""
+        depth = self._read_depth() - 1
+        self._local.read_depth = depth
+        if depth > 0 or self._writer == threading.get_ident():
+            return
+        with self._condition:
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """Acquire the lock exclusively"""
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        if self._read_depth() > 0:
+            raise RuntimeError("Cannot acquire the write lock while holding the read lock")
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        """Release a write lock taken by acquire_write"""
+        if self._writer != threading.get_ident():
+            raise RuntimeError("Cannot release a write lock held by another thread")
+        self._writer_depth -= 1
+        if self._writer_depth > 0:
+            return
+        with self._condition:
+            self._writer = None
+            self._condition.notify_all()
+
+    @contextmanager
+    def read_lock(self) -> Iterator[None]:
+        """Context manager holding the lock for reading"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self) -> Iterator[None]:
+        """Context manager holding the lock exclusively"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    @property
+    def write_locked(self) -> bool:
+        """Whether any thread holds the write lock"""
+        return self._writer is not None
+
+def read_locked(method: Callable) -> Callable:
+    """Decorator running a method under the read lock of its object (self.rw_lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.rw_lock.read_lock():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def write_locked(method: Callable) -> Callable:
+    """Decorator running a method under the write lock of its object (self.rw_lock)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.rw_lock.write_lock():
+            return method(self, *args, **kwargs)
+    return wrapper
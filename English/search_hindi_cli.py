@@ -111,6 +111,7 @@ def main():
     parser.add_argument("--build-index", action="store_true", help="Build and save the FAISS index")
     parser.add_argument("--index", default="hindi_faiss.index", help="Path to FAISS index file")
     parser.add_argument("--embeddings-file", default="output_hindi.json", help="Path to embeddings JSON file")
+    parser.add_argument("--pca-dim", type=int, help="Reduce the vectors to this dimension with PCA when building the index")
     
     # Search options
     parser.add_argument("--top-k", type=int, default=5, help="Number of results to return")
@@ -122,7 +123,7 @@ def main():
         # Initialize search engine
         if args.build_index:
             # For building index, use the embeddings file
-            search_engine = HindiSemanticSearch(embeddings_file=args.embeddings_file)
+            search_engine = HindiSemanticSearch(embeddings_file=args.embeddings_file, pca_dim=args.pca_dim)
             if search_engine.index:
                 success = search_engine.save_index(args.index)
                 if success:
@@ -8,12 +8,18 @@ import traceback
 import json
 import os  # Added import for OS functions
 import time
-from faiss_index_manager import FAISSIndexManager
+from index_backend import create_index_manager
+from nic_hierarchy import DEFAULT_ROLLUP_TOP_N, MAX_ROLLUP_TOP_N, hierarchy_descriptions
+from index_generation import IndexGenerations
+from embedding_sidecar import load_documents
+from response_cache import ResponseCache, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS
+from multi_field_index import MultiFieldIndex, parse_field_weights
+from runtime_config import apply_runtime_config, get_runtime_config
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
 from recording import start_recording, stop_recording  # Import recording functions
 from cleaning import correct_words
-from vector_embeddings_manager import VectorEmbeddingsManager, get_embeddings_manager  # Add VectorEmbeddingsManager
+from vector_embeddings_manager import VectorEmbeddingsManager, get_embeddings_manager, get_manager_registry  # Add VectorEmbeddingsManager
 
 # Load environment variables
 load_dotenv()
@@ -24,6 +30,9 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Size the FAISS and torch thread pools from CPU_BUDGET (or FAISS_OMP_THREADS / TORCH_NUM_THREADS)
+apply_runtime_config()
+
 # Define embedding models to use
 DEFAULT_MODEL = 'all-MiniLM-L6-v2'
 INDIAN_LANGUAGE_MODEL = 'krutrim-ai-labs/Vyakyarth'
@@ -35,16 +44,57 @@ embeddings_manager = get_embeddings_manager(DEFAULT_MODEL)
 # Path to local JSON file
 json_file_path = os.path.join(os.path.dirname(__file__), "output.json")
 
-# Initialize the FAISS index manager
-faiss_manager = FAISSIndexManager()  # No need for connection string now
+def create_faiss_manager(index_path=None, id_map_path=None, params_path=None):
+    """Create the index manager of the given index files (backend, index type and query-time knobs come from the environment)"""
+    return create_index_manager(
+        index_path=index_path,
+        id_map_path=id_map_path,
+        params_path=params_path,
+        index_type=os.environ.get("FAISS_INDEX_TYPE", "flat"),
+        # Optional learned dimensionality reduction ("pca" or "opq") applied before indexing
+        index_params={
+            "transform": os.environ.get("FAISS_TRANSFORM") or None,
+            "transform_dim": int(os.environ["FAISS_TRANSFORM_DIM"]) if os.environ.get("FAISS_TRANSFORM_DIM") else None
+        },
+        nprobe=int(os.environ["FAISS_NPROBE"]) if os.environ.get("FAISS_NPROBE") else None,
+        ef_search=int(os.environ["FAISS_EF_SEARCH"]) if os.environ.get("FAISS_EF_SEARCH") else None,
+        rerank_factor=int(os.environ["FAISS_RERANK_FACTOR"]) if os.environ.get("FAISS_RERANK_FACTOR") else None,
+        mmap=os.environ.get("FAISS_MMAP", "false").lower() in ("1", "true", "yes"),
+        warmup=os.environ.get("FAISS_WARMUP", "false").lower() in ("1", "true", "yes")
+    )
+
+# Versioned index generations: searches pin the active generation,
+# rebuilds run in the background and are swapped in when complete
+index_generations = IndexGenerations(create_faiss_manager)
+
+# Per-field sub-indexes for fused multi-field scoring (python multi_field_index.py --build);
+# MULTI_FIELD_WEIGHTS makes fusion the default
+multi_field_index = MultiFieldIndex(index_dir=os.path.join(os.path.dirname(__file__), "multi_field_index"),
+                                    json_file_path=json_file_path)
+default_field_weights = parse_field_weights(os.environ.get("MULTI_FIELD_WEIGHTS"))
+
+# Complete /search responses keyed on the normalized query and its parameters,
+# dropped automatically when a rebuild swaps in a new index generation or documents
+# are added, updated or removed incrementally
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+    ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS))
+)
 
 # Global variable to store data from JSON file
 json_data = []
 
+# Description of every Section / Division / Group / Class code, for hierarchy roll-ups
+code_descriptions = {}
+
 # Cache all models at startup
 def cache_all_models():
-    """Pre-load and cache all embedding models"""
-    for model_name in EMBEDDING_MODELS:
+    """Pre-load the embedding models that fit the registry's limit of loaded models"""
+    max_resident = get_manager_registry().max_resident_models
+    preload = EMBEDDING_MODELS if max_resident <= 0 else EMBEDDING_MODELS[:max_resident]
+    for model_name in EMBEDDING_MODELS[len(preload):]:
+        logger.info(f"Not pre-loading {model_name}: EMBEDDING_MAX_MODELS={max_resident}, it is loaded on first use")
+    for model_name in preload:
         try:
             logger.info(f"Pre-caching embedding model: {model_name}")
             # This will force the model to be loaded and cached
@@ -62,11 +112,12 @@ def load_json_data():
     Returns:
         list: List of documents from the JSON file
     """
-    global json_data
+    global json_data, code_descriptions
     try:
         if os.path.exists(json_file_path):
-            with open(json_file_path, 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
+            # Documents are kept without their embeddings, the vectors live in the FAISS index
+            json_data = load_documents(json_file_path)
+            code_descriptions = hierarchy_descriptions(json_data)
             logger.info(f"Successfully loaded {len(json_data)} documents from {json_file_path}")
             return json_data
         else:
@@ -156,7 +207,7 @@ def validate_result_format(result):
             "similarity": 0.0
         }
 
-def perform_semantic_search(query, collection, top_n=10, search_mode="standard"):
+def perform_semantic_search(query, collection, top_n=10, search_mode="standard", filters=None, field_weights=None):
     """
     Perform semantic search using FAISS with cosine similarity.
     
@@ -165,6 +216,10 @@ def perform_semantic_search(query, collection, top_n=10, search_mode="standard")
         collection: Local data accessor that mimics MongoDB collection
         top_n (int): Number of results to return
         search_mode (str): Search mode - "standard", "strict", or "relaxed"
+        filters (dict): Optional NIC hierarchy codes to restrict the search to,
+                        e.g. {"section": "C", "division": "10"}; applied inside FAISS
+        field_weights (dict): Optional weights per vector field; ranks by the fused similarity
+                              of the multi-field index instead of the FAISS index
         
     Returns:
         list: List of search results
@@ -179,15 +234,13 @@ def perform_semantic_search(query, collection, top_n=10, search_mode="standard")
         }
         
         # Ensure FAISS index is loaded
+        faiss_manager = index_generations.active_manager
         if not faiss_manager.index:
+            # Single-flight: concurrent requests wait for one load (or build) instead of racing
             index_load_start = time.time()
-            success = faiss_manager.load_index()
-            if not success:
-                logger.warning("Failed to load FAISS index, building it now...")
-                success = faiss_manager.build_index()
-                if not success:
-                    logger.error("Failed to build FAISS index")
-                    return [], metrics
+            if not faiss_manager.ensure_index():
+                logger.error("Failed to load or build FAISS index")
+                return [], metrics
             metrics["index_time_ms"] = int((time.time() - index_load_start) * 1000)
         else:
             metrics["index_time_ms"] = 0  # Index was already loaded
@@ -196,7 +249,7 @@ def perform_semantic_search(query, collection, top_n=10, search_mode="standard")
         query = correct_words(query)
         
         # Use embeddings manager instead of direct model encoding
-        query_embedding = embeddings_manager.get_embedding(query)
+        query_embedding = embeddings_manager.get_embedding_batched(query)
         
         # Adjust search parameters based on mode
         if search_mode == "strict":
@@ -216,7 +269,12 @@ def perform_semantic_search(query, collection, top_n=10, search_mode="standard")
         search_start = time.time()
         
         # Search using FAISS (with cosine similarity)
-        search_results = faiss_manager.search(query_embedding, top_k=faiss_results)
+        if field_weights and multi_field_index.is_loaded:
+            search_results = multi_field_index.search(query_embedding, top_k=faiss_results,
+                                                      weights=field_weights, filters=filters)
+        else:
+            with index_generations.acquire() as faiss_manager:
+                search_results = faiss_manager.search(query_embedding, top_k=faiss_results, filters=filters)
         
         if not search_results:
             logger.warning("No search results returned from FAISS")
@@ -295,6 +353,32 @@ def perform_semantic_search(query, collection, top_n=10, search_mode="standard")
         metrics["total_time_ms"] = int((time.time() - start_time) * 1000)
         return [], metrics
 
+def perform_hierarchy_rollup(query, top_n=DEFAULT_ROLLUP_TOP_N, filters=None):
+    """
+    Find the best Sections, Divisions, Groups and Classes for a query by rolling the
+    scores of the nearest NIC codes up the hierarchy.
+    
+    Args:
+        query (str): The search query
+        top_n (int): Number of nodes to return per level
+        filters (dict): Optional NIC hierarchy codes to restrict the search to
+        
+    Returns:
+        dict: {level: [{"code", "description", "score", "hits"}, ...]}
+    """
+    try:
+        query_embedding = embeddings_manager.get_embedding_batched(correct_words(query))
+        with index_generations.acquire() as faiss_manager:
+            rollup = faiss_manager.search_rollup(query_embedding, top_n=top_n, filters=filters)
+        for level, nodes in rollup.items():
+            for node in nodes:
+                node["description"] = code_descriptions.get(level, {}).get(node["code"], "")
+        return rollup
+    except Exception as e:
+        logger.error(f"Error rolling up search results: {str(e)}")
+        logger.error(traceback.format_exc())
+        return {}
+
 @app.route('/')
 def index():
     """Render the main search page"""
@@ -309,12 +393,51 @@ def search():
         result_count = int(request.form.get('result_count', 10))
         search_mode = request.form.get('search_mode', 'standard')
         show_metrics = request.form.get('show_metrics', 'false') == 'true'
+        rollup = request.form.get('rollup', 'false') == 'true'
+        # Roll-up nodes per level, within the bounds of SearchRequest.rollup_top_n of the API
+        try:
+            rollup_top_n = int(request.form.get('rollup_top_n') or DEFAULT_ROLLUP_TOP_N)
+        except ValueError:
+            return jsonify({"error": "Invalid rollup_top_n: must be an integer", "results": []}), 400
+        rollup_top_n = min(max(rollup_top_n, 1), MAX_ROLLUP_TOP_N)
+        # Optional fusion weights, e.g. "description=0.7,class=0.3"
+        try:
+            field_weights = parse_field_weights(request.form.get('field_weights')) or default_field_weights
+        except ValueError as e:
+            return jsonify({"error": f"Invalid field_weights: {str(e)}", "results": []}), 400
+        
+        # Optional NIC hierarchy filters
+        filters = {
+            "section": request.form.get('section', '').strip(),
+            "division": request.form.get('division', '').strip(),
+            "group": request.form.get('group', '').strip(),
+            "class": request.form.get('class', '').strip()
+        }
+        filters = {level: code for level, code in filters.items() if code}
         
         if not query.strip():
             return jsonify({"error": "Empty query", "results": []})
         
         logger.info(f"Processing search query: '{query}' (mode: {search_mode}, results: {result_count})")
         
+        # Serve repeated queries from the response cache
+        cache_start = time.time()
+        cache_key = response_cache.make_key(query, result_count=result_count, search_mode=search_mode,
+                                            filters=filters, rollup=rollup_top_n if rollup else 0,
+                                            field_weights=field_weights)
+        index_version = index_generations.cache_version
+        cached_response = response_cache.get(cache_key, index_version)
+        if cached_response is not None:
+            response = dict(cached_response)
+            if show_metrics:
+                response["metrics"] = {
+                    "total_time_ms": int((time.time() - cache_start) * 1000),
+                    "index_time_ms": 0,
+                    "results_count": len(response["results"]),
+                    "cached": True
+                }
+            return jsonify(response)
+        
         # Get local data instead of MongoDB connection
         _, collection = connect_to_mongodb()
         
@@ -323,7 +446,9 @@ def search():
             query, 
             collection, 
             top_n=result_count,
-            search_mode=search_mode
+            search_mode=search_mode,
+            filters=filters,
+            field_weights=field_weights
         )
         
         logger.info(f"Found {len(results)} results for query: '{query}'")
@@ -331,6 +456,14 @@ def search():
         # Prepare response
         response = {"results": results}
         
+        # Add the best nodes of each hierarchy level if requested
+        if rollup:
+            rollup_start = time.time()
+            response["rollup"] = perform_hierarchy_rollup(query, top_n=rollup_top_n, filters=filters)
+            metrics["rollup_time_ms"] = int((time.time() - rollup_start) * 1000)
+        if results:
+            response_cache.put(cache_key, index_version, dict(response))
+        
         # Add performance metrics if requested
         if show_metrics:
             response["metrics"] = metrics
@@ -360,9 +493,18 @@ def rebuild_index():
         if not json_data:
             load_json_data()
             
-        success = faiss_manager.build_index(force_rebuild=True)
+        # Build a new index generation in the background, searches keep using the current one
+        future = index_generations.start_rebuild()
+        if future is None:
+            return jsonify({"status": "error", "message": "An index rebuild is already in progress"})
+        
+        if request.args.get("wait", "false").lower() not in ("1", "true", "yes"):
+            return jsonify({"status": "accepted", "message": "Index rebuild started in the background"})
+        
+        success = future.result()
         if success:
-            return jsonify({"status": "success", "message": "Index rebuilt successfully with cosine similarity"})
+            return jsonify({"status": "success", "message": "Index rebuilt successfully with cosine similarity",
+                            "version": index_generations.version})
         else:
             return jsonify({"status": "error", "message": "Failed to rebuild index"})
     except Exception as e:
@@ -370,26 +512,49 @@ def rebuild_index():
         logger.error(error_msg)
         return jsonify({"status": "error", "message": error_msg})
 
+@app.route('/index-status', methods=['GET'])
+def index_status():
+    """Admin endpoint to get the active index version and the background rebuild progress"""
+    return jsonify({"status": "success", "index": index_generations.get_status()})
+
+@app.route('/runtime-config', methods=['GET'])
+def runtime_config():
+    """Admin endpoint to get the effective FAISS and torch thread configuration"""
+    return jsonify({"status": "success", "runtime_config": get_runtime_config()})
+
 @app.route('/get-index-stats', methods=['GET'])
 def get_index_stats():
     """Admin endpoint to get FAISS index statistics"""
     try:
-        if not faiss_manager.index:
-            success = faiss_manager.load_index()
-            if not success:
-                return jsonify({
-                    "status": "error", 
-                    "message": "Index not loaded and could not be loaded from disk"
-                })
+        faiss_manager = index_generations.active_manager
+        if not faiss_manager.ensure_index(build=False):
+            return jsonify({
+                "status": "error", 
+                "message": "Index not loaded and could not be loaded from disk"
+            })
+        
+        index_info = faiss_manager.get_index_info()
         
         stats = {
             "vector_count": faiss_manager.index.ntotal,
-            "index_type": "Flat Inner Product (Cosine Similarity)",
+            "index_type": index_info.get("description", "Unknown"),
+            "index_params": index_info.get("build_params"),
             "dimension": faiss_manager.index.d,
             "index_file_exists": os.path.exists(faiss_manager.index_path),
-            "id_map_file_exists": os.path.exists(faiss_manager.id_map_path)
+            "id_map_file_exists": os.path.exists(faiss_manager.get_id_map_path())
         }
         
+        # Query-time parameters of approximate indexes
+        for knob in ("nprobe", "ef_search"):
+            if knob in index_info:
+                stats[knob] = index_info[knob]
+        
+        stats["index_load_stats"] = faiss_manager.get_memory_stats()
+        stats["index_version"] = index_generations.version
+        stats["response_cache"] = response_cache.get_stats()
+        if multi_field_index.is_loaded:
+            stats["multi_field_index"] = multi_field_index.get_stats()
+        
         if hasattr(faiss_manager.index, "id_map") and faiss_manager.index.id_map is not None:
             stats["id_map_size"] = len(faiss_manager.id_map)
         
@@ -417,11 +582,15 @@ if __name__ == '__main__':
     
     # Load the FAISS index on startup
     logger.info("Loading FAISS index...")
+    faiss_manager = index_generations.active_manager
     success = faiss_manager.load_index()
     if not success:
         logger.warning("FAISS index not found or could not be loaded. Building index...")
         faiss_manager.build_index()
     
+    # The multi-field index is optional
+    multi_field_index.load()
+    
     # Pre-cache all embedding models
     logger.info("Pre-caching embedding models...")
     cache_all_models()
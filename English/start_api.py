@@ -7,21 +7,50 @@ import argparse
 import os
 import sys
 import traceback
+from runtime_config import WORKERS_ENV, export_plan, plan_threads
 
 def main():
     parser = argparse.ArgumentParser(description='Start the NIC Code Semantic Search API')
     parser.add_argument('--host', default='0.0.0.0', help='Host IP (default: 0.0.0.0)')
     parser.add_argument('--port', type=int, default=8000, help='Port (default: 8000)')
     parser.add_argument('--reload', action='store_true', help='Enable auto-reload for development')
-    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (default: 1)')
+    parser.add_argument('--workers', type=int,
+                      help='Number of worker processes (default: derived from --cpu-budget, else 1)')
     parser.add_argument('--log-level', default='info', 
                       choices=['debug', 'info', 'warning', 'error', 'critical'], 
                       help='Log level (default: info)')
     parser.add_argument('--no-checks', action='store_true', 
                       help='Skip directory checks (use if running from a different directory)')
+    parser.add_argument('--mmap-index', action='store_true',
+                      help='Memory-map the FAISS index so worker processes share it through the page cache')
+    parser.add_argument('--warmup-index', action='store_true',
+                      help='Page the FAISS index into memory when a worker loads it')
+    parser.add_argument('--cpu-budget', type=int,
+                      help='CPUs for the whole server, split between the workers and their FAISS / torch threads')
+    parser.add_argument('--backend', choices=['faiss', 'numpy'],
+                      help='Vector search backend (default: INDEX_BACKEND environment variable, then faiss)')
     
     args = parser.parse_args()
     
+    # Worker processes import the app themselves, so index options are passed through the environment
+    if args.mmap_index:
+        os.environ['FAISS_MMAP'] = 'true'
+    if args.warmup_index:
+        os.environ['FAISS_WARMUP'] = 'true'
+    if args.backend:
+        os.environ['INDEX_BACKEND'] = args.backend
+    workers = args.workers or 1
+    if args.cpu_budget:
+        # Workers apply the plan on startup (see runtime_config.py)
+        plan = plan_threads(args.cpu_budget, args.workers)
+        export_plan(plan)
+        workers = plan['workers']
+        print(f"CPU budget {plan['cpu_budget']}: {workers} worker(s) x "
+              f"({plan['faiss_threads']} FAISS + {plan['torch_threads']} torch thread(s))")
+    else:
+        # Set before the workers load .env, which does not override it
+        os.environ[WORKERS_ENV] = str(workers)
+    
     # Check if API module exists
     if not os.path.exists("api.py") and not args.no_checks:
         print("Error: 'api.py' not found in the current directory")
@@ -45,7 +74,7 @@ def main():
             host=args.host, 
             port=args.port, 
             reload=args.reload,
-            workers=args.workers,
+            workers=workers,
             log_level=args.log_level
         )
         return 0
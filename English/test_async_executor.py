@@ -0,0 +1,104 @@
+"""
+Tests of the bounded executor of the async search handlers
+Checks that blocking calls run off the event loop, that calls beyond max_pending are
+rejected immediately and their slots freed afterwards, and that work tracked from the
+micro-batcher counts against the same limit
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from async_executor import BoundedExecutor, ExecutorSaturatedError
+from micro_batcher import MicroBatcher
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def blocking_square(value, delay=0.05):
+    """CPU-bound stand-in that blocks its thread"""
+    time.sleep(delay)
+    return value * value
+
+def test_loop_stays_responsive(num_calls=8):
+    """The event loop keeps running while calls block on the pool, and every call returns its result"""
+    executor = BoundedExecutor(max_workers=4, max_pending=num_calls)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(executor.run(blocking_square, value) for value in range(num_calls)))
+        tick_task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    executor.shutdown()
+    print(f"{num_calls} blocking calls: {ticks} event loop ticks while they ran")
+    assert results == [value * value for value in range(num_calls)], "calls returned wrong results"
+    assert ticks > 10, "the event loop was blocked"
+
+def test_backpressure(max_pending=4, num_calls=10):
+    """Exactly the calls beyond max_pending are rejected at once, and their slots are reused afterwards"""
+    executor = BoundedExecutor(max_workers=2, max_pending=max_pending)
+
+    async def main():
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(executor.run(blocking_square, value, 0.2) for value in range(num_calls)),
+                                        return_exceptions=True)
+        rejected = [outcome for outcome in outcomes if isinstance(outcome, ExecutorSaturatedError)]
+        later = await executor.run(blocking_square, 3, 0.0)
+        return outcomes, rejected, later, time.perf_counter() - start
+
+    outcomes, rejected, later, elapsed = asyncio.run(main())
+    stats = executor.get_stats()
+    executor.shutdown()
+    print(f"{num_calls} calls with max_pending={max_pending}: {len(rejected)} rejected, "
+          f"peak pending {stats['peak_pending']}, {elapsed:.2f}s")
+    assert len(rejected) == num_calls - max_pending, "wrong number of rejected calls"
+    assert stats["peak_pending"] == max_pending, "more calls admitted than max_pending"
+    assert stats["pending"] == 0, "slots were not released"
+    assert later == 9, "the executor did not accept calls after the burst"
+    # Rejected calls never waited for a slot: the admitted ones ran in about two rounds of 0.2 s
+    assert elapsed < 1.0, "rejected calls waited instead of failing immediately"
+
+def test_tracked_batches(num_callers=20):
+    """Micro-batched work admitted through track() is limited like pool calls: the excess items are rejected"""
+    executor = BoundedExecutor(max_workers=1, max_pending=num_callers // 2)
+    batcher = MicroBatcher(lambda items: [item * item for item in items], max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(*(executor.track(lambda value=value: batcher.submit(value))
+                                      for value in range(num_callers)), return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    batcher.close()
+    executor.shutdown()
+    admitted = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+    print(f"{num_callers} tracked items: {len(admitted)} admitted in {batcher.get_stats()['batches']} batches")
+    assert admitted == [value * value for value in range(num_callers // 2)], "admitted items returned wrong results"
+    rejected = [outcome for outcome in outcomes if isinstance(outcome, ExecutorSaturatedError)]
+    assert len(rejected) == num_callers - num_callers // 2, "the excess tracked items were not rejected"
+    assert executor.get_stats()["pending"] == 0, "slots of tracked items were not released"
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of the bounded executor')
+    parser.add_argument('--calls', type=int, default=8, help='Number of concurrent blocking calls (default: 8)')
+    args = parser.parse_args()
+
+    test_loop_stays_responsive(num_calls=args.calls)
+    test_backpressure()
+    test_tracked_batches()
+    print("All executor checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
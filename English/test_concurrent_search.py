@@ -0,0 +1,175 @@
+"""
+Multithreaded stress test of the index managers
+Starts many searches at once on a manager whose index is not loaded yet and checks
+that the index is loaded exactly once (single-flight initialization), that every
+search returns the same results as a single-threaded search, and that searches keep
+returning complete results while other threads reload the index. Runs under pytest
+on a synthetic corpus for both backends, or as a script on a given JSON data file
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import numpy as np
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from index_backend import INDEX_BACKENDS
+from embedding_sidecar import ENGLISH_EMBEDDING_FIELD
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def write_corpus(directory, num_docs=500, dimension=32, seed=3):
+    """
+    Write a JSON data file of random normalized embeddings
+
+    Returns:
+        Path to the JSON data file
+    """
+    os.makedirs(directory, exist_ok=True)
+    vectors = np.random.default_rng(seed).standard_normal((num_docs, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    documents = [{
+        "_id": f"{0x67d8e11f665335ccb674b000 + row:024x}",
+        "Section": "C",
+        "Division": "10",
+        "Group": f"10{row % 3}",
+        "Class": f"10{row % 3}{row % 2}",
+        "Description": f"document {row}",
+        ENGLISH_EMBEDDING_FIELD: vectors[row].tolist()
+    } for row in range(num_docs)]
+    json_path = os.path.join(directory, "output.json")
+    with open(json_path, 'w') as f:
+        json.dump(documents, f)
+    return json_path
+
+def create_manager(backend, json_path):
+    """Index manager of a backend whose index files are kept next to the JSON data file"""
+    directory = os.path.dirname(os.path.abspath(json_path))
+    if backend == "numpy":
+        from numpy_index_manager import NumpyIndexManager
+        return NumpyIndexManager(json_file_path=json_path, index_path=os.path.join(directory, "numpy_index.npy"),
+                                 id_map_path=os.path.join(directory, "numpy_id_map.npy"))
+    from faiss_index_manager import FAISSIndexManager
+    return FAISSIndexManager(json_file_path=json_path, index_path=os.path.join(directory, "faiss_index.bin"),
+                             id_map_path=os.path.join(directory, "faiss_id_map.npy"),
+                             params_path=os.path.join(directory, "faiss_index_params.json"))
+
+@pytest.fixture(params=INDEX_BACKENDS)
+def backend(request):
+    """Every index backend"""
+    return request.param
+
+@pytest.fixture
+def json_path(tmp_path):
+    """Synthetic JSON data file in a temporary directory"""
+    return write_corpus(str(tmp_path))
+
+def test_single_flight_load(backend, json_path, num_threads=32, top_k=10, seed=42):
+    """
+    Search from many threads at once before the index is loaded
+
+    Args:
+        backend: Index backend ("faiss" or "numpy")
+        json_path: Path to the JSON data file
+        num_threads: Number of concurrent searches
+        top_k: Number of results per search
+        seed: Random seed of the query vectors
+    """
+    # Make sure the index files exist, then search with a fresh manager
+    reference = create_manager(backend, json_path)
+    assert reference.build_index(), "failed to build the index"
+    queries = np.random.default_rng(seed).standard_normal((num_threads, reference.index.d)).astype('float32')
+    expected = [reference.search(query, top_k) for query in queries]
+
+    manager = create_manager(backend, json_path)
+    barrier = threading.Barrier(num_threads)
+
+    def search(query):
+        barrier.wait()
+        return manager.search(query, top_k)
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        results = list(executor.map(search, queries))
+    elapsed = time.time() - start_time
+
+    loads = manager.load_count
+    mismatches = sum(1 for got, want in zip(results, expected) if [doc_id for doc_id, _ in got] != [doc_id for doc_id, _ in want])
+    print(f"{num_threads} concurrent first searches: {loads} index load(s), {mismatches} mismatching results, {elapsed * 1000:.1f} ms")
+    assert loads == 1, f"expected exactly one index load, got {loads}"
+    assert mismatches == 0, f"{mismatches} searches returned different results than a single-threaded search"
+
+def test_search_during_reloads(backend, json_path, num_threads=8, num_searches=200, num_reloads=10, top_k=10):
+    """
+    Search from several threads while another thread reloads the index
+
+    Args:
+        backend: Index backend ("faiss" or "numpy")
+        json_path: Path to the JSON data file
+        num_threads: Number of searching threads
+        num_searches: Number of searches per thread
+        num_reloads: Number of reloads
+        top_k: Number of results per search
+    """
+    manager = create_manager(backend, json_path)
+    assert manager.ensure_index(build=True), "failed to build or load the index"
+    top_k = min(top_k, manager.index.ntotal)
+    queries = np.random.default_rng(7).standard_normal((num_searches, manager.index.d)).astype('float32')
+    stop = threading.Event()
+
+    def reload():
+        for _ in range(num_reloads):
+            if not manager.load_index():
+                raise RuntimeError("Reload failed")
+            time.sleep(0.01)
+        stop.set()
+
+    def search(thread_number):
+        short_pages = 0
+        for query in queries:
+            if len(manager.search(query, top_k)) != top_k:
+                short_pages += 1
+        return short_pages
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=num_threads + 1) as executor:
+        reloader = executor.submit(reload)
+        short_pages = sum(executor.map(search, range(num_threads)))
+        reloader.result()
+    elapsed = time.time() - start_time
+
+    print(f"{num_threads * num_searches} searches during {num_reloads} reloads: {short_pages} short pages, "
+          f"{manager.load_count} loads, {elapsed:.2f} s")
+    assert short_pages == 0, f"{short_pages} searches saw a partially loaded index"
+    assert manager.load_count >= num_reloads, "the reloads did not run"
+
+def main():
+    parser = argparse.ArgumentParser(description='Multithreaded stress test of the index managers')
+    parser.add_argument('--backend', choices=INDEX_BACKENDS, default='faiss', help='Index backend (default: faiss)')
+    parser.add_argument('--json', help='Path to the JSON data file, the index files are written next to it '
+                                       '(default: a synthetic corpus in a temporary directory)')
+    parser.add_argument('--threads', type=int, default=32, help='Number of concurrent searches (default: 32)')
+
+    args = parser.parse_args()
+
+    directory = None if args.json else tempfile.mkdtemp(prefix="concurrent_search_test_")
+    try:
+        json_path = args.json or write_corpus(directory)
+        test_single_flight_load(args.backend, json_path, num_threads=args.threads)
+        test_search_during_reloads(args.backend, json_path)
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+    print("All concurrency checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
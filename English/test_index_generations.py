@@ -0,0 +1,121 @@
+"""
+Tests of the versioned index generations
+Rebuilds the index in the background while the first generation is in use and checks
+that the new generation is built into its own files (the files of the active
+generation are not touched), that the pointer file names it so that a restarted
+worker serves it, that a retired generation releases its index and refuses searches
+instead of reloading it, and that only the last generations are kept on disk
+"""
+
+import os
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+import pytest
+from index_backend import INDEX_BACKENDS, create_index_manager
+from index_generation import IndexGenerations, read_pointer
+from test_concurrent_search import create_manager, write_corpus
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def manager_factory(backend, json_path):
+    """Factory of IndexGenerations: managers of the given files, or of the files next to the JSON data file"""
+    def create(**paths):
+        if not paths:
+            return create_manager(backend, json_path)
+        return create_index_manager(backend, json_file_path=json_path, **paths)
+    return create
+
+def file_states(paths):
+    """Size and modification time of every existing file"""
+    return {path: (os.path.getsize(path), os.stat(path).st_mtime_ns) for path in paths if os.path.exists(path)}
+
+@pytest.fixture(params=INDEX_BACKENDS)
+def backend(request):
+    """Every index backend"""
+    return request.param
+
+@pytest.fixture
+def json_path(tmp_path):
+    """Synthetic JSON data file in a temporary directory"""
+    return write_corpus(str(tmp_path))
+
+def test_rebuild_into_new_files(backend, json_path):
+    """
+    A rebuild writes a new generation directory and pointer, leaving the active files alone
+
+    Args:
+        backend: Index backend ("faiss" or "numpy")
+        json_path: Path to the JSON data file
+    """
+    generations = IndexGenerations(manager_factory(backend, json_path))
+    first = generations.active_manager
+    assert first.build_index(force_rebuild=True), "failed to build the first generation"
+    first_files = [path for path in os.listdir(os.path.dirname(json_path)) if path != "output.json"]
+    before = file_states(os.path.join(os.path.dirname(json_path), path) for path in first_files)
+    query = np.random.default_rng(0).standard_normal(first.index.d).astype('float32')
+
+    with generations.acquire() as pinned:
+        assert generations.start_rebuild().result(timeout=60), "the rebuild failed"
+        # The pinned search still runs on the first generation, whose files are untouched
+        assert len(pinned.search(query, 5)) == 5, "the pinned generation stopped serving"
+        assert file_states(before) == before, "the rebuild modified the files of the active generation"
+
+    second = generations.active_manager
+    print(f"{backend}: generation {generations.version} built into {second.index_path}")
+    assert generations.version == 2, "the rebuild did not swap in generation 2"
+    assert os.path.dirname(second.index_path) != os.path.dirname(first.index_path), "the rebuild reused the first files"
+    assert read_pointer(generations.pointer_path)["paths"]["index_path"] == second.index_path, "the pointer was not written"
+
+    # The retired generation released everything and does not load its index again
+    assert first.closed and first.index is None and first.id_map is None and first.hierarchy is None
+    assert first.search(query, 5) == [], "a closed manager searched"
+    assert first.index is None, "a closed manager loaded its index again"
+
+    # A worker started now serves the generation of the pointer
+    restarted = IndexGenerations(manager_factory(backend, json_path))
+    assert restarted.version == 2 and restarted.active_manager.index_path == second.index_path
+    assert restarted.active_manager.load_index(), "a restarted worker could not load generation 2"
+    assert len(restarted.active_manager.search(query, 5)) == 5
+    generations.shutdown()
+
+def test_old_generations_are_pruned(json_path, num_rebuilds=4):
+    """
+    Only the directories of the last keep_generations generations stay on disk
+
+    Args:
+        json_path: Path to the JSON data file
+        num_rebuilds: Number of rebuilds
+    """
+    generations = IndexGenerations(manager_factory("faiss", json_path), keep_generations=2)
+    assert generations.active_manager.build_index(force_rebuild=True), "failed to build the first generation"
+    for _ in range(num_rebuilds):
+        assert generations.start_rebuild().result(timeout=60), "a rebuild failed"
+    kept = sorted(int(name) for name in os.listdir(generations.generations_dir))
+    print(f"Generation directories after {num_rebuilds} rebuilds: {kept}")
+    assert generations.version == num_rebuilds + 1
+    assert kept == [num_rebuilds, num_rebuilds + 1], "old generation directories were not pruned"
+    assert os.path.exists(generations.base_paths["index_path"]), "the files of the first generation were deleted"
+    generations.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of the versioned index generations')
+    parser.add_argument('--backend', choices=INDEX_BACKENDS, default='faiss', help='Index backend (default: faiss)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="index_generations_test_")
+    try:
+        test_rebuild_into_new_files(args.backend, write_corpus(os.path.join(directory, "rebuild")))
+        test_old_generations_are_pruned(write_corpus(os.path.join(directory, "prune")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("All index generation checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Tests of hierarchy filters on a legacy positional index
+Writes a small corpus and an index in the format that predates stable ids (a flat
+index with positional ids 0..n-1 and a JSON ID map, no manifest or hierarchy file),
+loads it with FAISSIndexManager and checks that filtered searches return hits from
+the requested part of the hierarchy, also after a restart and when a hierarchy file
+keyed by stable ids (or covering only part of the index) was left behind by an earlier
+version, and that score roll-ups return Section and Division nodes
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+import faiss
+import pytest
+from faiss_index_manager import FAISSIndexManager
+from id_map import IDMap
+from nic_hierarchy import NICHierarchy
+from embedding_sidecar import ENGLISH_EMBEDDING_FIELD
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SECTIONS = {"A": ("01", "02"), "C": ("10", "11"), "G": ("46", "47")}
+
+def write_legacy_index(directory, num_docs=300, dimension=16, seed=7):
+    """
+    Write a JSON corpus and a positional-id flat index with a JSON ID map
+
+    Returns:
+        Tuple of (json path, index path, id map path, {doc_id: section}, vectors)
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_docs, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    documents, sections = [], {}
+    section_codes = sorted(SECTIONS)
+    for row in range(num_docs):
+        section = section_codes[row % len(section_codes)]
+        division = SECTIONS[section][(row // len(section_codes)) % 2]
+        doc_id = f"{0x67d8e11f665335ccb674a000 + row:024x}"
+        sections[doc_id] = section
+        documents.append({
+            "_id": doc_id,
+            "Section": section,
+            "Division": division,
+            "Group": f"{division}{row % 3}",
+            "Class": f"{division}{row % 3}{row % 2}",
+            "Description": f"document {row}",
+            ENGLISH_EMBEDDING_FIELD: vectors[row].tolist()
+        })
+
+    json_path = os.path.join(directory, "output.json")
+    with open(json_path, 'w') as f:
+        json.dump(documents, f)
+    index = faiss.IndexFlatIP(dimension)
+    index.add(vectors)
+    index_path = os.path.join(directory, "faiss_index.bin")
+    faiss.write_index(index, index_path)
+    id_map_path = os.path.join(directory, "faiss_id_map.json")
+    IDMap.from_doc_ids([doc["_id"] for doc in documents]).save(id_map_path)
+    return json_path, index_path, id_map_path, sections, vectors
+
+@pytest.fixture
+def legacy_index(tmp_path):
+    """Legacy positional index in a temporary directory (see write_legacy_index)"""
+    return write_legacy_index(str(tmp_path))
+
+def load_manager(json_path, index_path, id_map_path):
+    """Load the legacy index like the API does"""
+    manager = FAISSIndexManager(json_file_path=json_path, index_path=index_path, id_map_path=id_map_path)
+    assert manager.load_index(), "the legacy index did not load"
+    return manager
+
+def check_filtered_search(manager, sections, vectors, row):
+    """
+    Assert that a filtered search for a document returns hits of its Section only, led by the document
+
+    Returns:
+        List of (document ID, score) results
+    """
+    doc_id = list(sections)[row]
+    section = sections[doc_id]
+    results = manager.search(vectors[row], top_k=10, filters={"section": section})
+    assert results, f"filtered search on section {section} returned no hits"
+    assert all(sections[result_id] == section for result_id, _ in results), "filtered search returned other sections"
+    assert results[0][0] == doc_id, f"filtered search on section {section} missed the document it searched for"
+    return results
+
+def test_filtered_search(legacy_index):
+    """
+    Filtered searches on a legacy positional index return hits of the filter on first load,
+    after a restart, and with a stale or partial hierarchy file
+
+    Args:
+        legacy_index: Tuple returned by write_legacy_index
+    """
+    json_path, index_path, id_map_path, sections, vectors = legacy_index
+    manager = load_manager(json_path, index_path, id_map_path)
+    results = check_filtered_search(manager, sections, vectors, 1)
+    print(f"Legacy index, first load: {len(results)} hits for section C")
+
+    # The derived hierarchy is saved with the positional ids and reused after a restart
+    manager = load_manager(json_path, index_path, id_map_path)
+    check_filtered_search(manager, sections, vectors, 2)
+    print("Legacy index, after restart: filtered search returns hits")
+
+    # A hierarchy file keyed by stable ids (written by earlier versions) is replaced
+    with open(json_path, 'r') as f:
+        documents = json.load(f)
+    NICHierarchy.from_documents(documents).save(manager.hierarchy_path)
+    manager = load_manager(json_path, index_path, id_map_path)
+    check_filtered_search(manager, sections, vectors, 0)
+    print("Legacy index, stale hierarchy file: filtered search returns hits")
+
+    # So is a hierarchy file keyed by the right ids that lacks some of the documents
+    id_map = IDMap.load(id_map_path)
+    NICHierarchy.from_documents(documents[:len(documents) // 2], id_map=id_map).save(manager.hierarchy_path)
+    manager = load_manager(json_path, index_path, id_map_path)
+    check_filtered_search(manager, sections, vectors, len(documents) - 1)
+    assert manager.hierarchy is not None and len(manager.hierarchy) == len(documents), "the partial hierarchy was kept"
+    print("Legacy index, partial hierarchy file: filtered search finds every document")
+
+def test_rollup(legacy_index):
+    """
+    Roll-ups on a legacy positional index return Section and Division nodes, led by
+    the nodes of the best match
+
+    Args:
+        legacy_index: Tuple returned by write_legacy_index
+    """
+    json_path, index_path, id_map_path, sections, vectors = legacy_index
+    manager = load_manager(json_path, index_path, id_map_path)
+    rollup = manager.search_rollup(vectors[1], top_n=3)
+    print(f"Legacy index roll-up: {len(rollup.get('section', []))} sections, {len(rollup.get('division', []))} divisions")
+    assert rollup.get("section"), "the roll-up returned no Section nodes"
+    assert rollup.get("division"), "the roll-up returned no Division nodes"
+    assert all(node["code"] in SECTIONS for node in rollup["section"]), "the roll-up returned unknown sections"
+    # Document 1 matches the query exactly, so its Section scores highest
+    assert rollup["section"][0]["code"] == "C", "the roll-up is not led by the section of the best match"
+    assert rollup["division"][0]["code"] in SECTIONS["C"], "the roll-up is not led by a division of the best match"
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of hierarchy filters on a legacy positional index')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary directory')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="legacy_index_test_")
+    try:
+        test_filtered_search(write_legacy_index(os.path.join(directory, "filters")))
+        test_rollup(write_legacy_index(os.path.join(directory, "rollup")))
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+    print("All legacy index checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Tests of the registry of embeddings managers
+Checks that every model gets its own manager and cache file, that models load lazily,
+that loading a model beyond the resident limit unloads the least recently used one,
+and that idle models are unloaded. The sentence-transformers model is replaced by a
+lightweight encoder so that no weights are downloaded.
+"""
+
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+import vector_embeddings_manager
+from vector_embeddings_manager import EmbeddingsManagerRegistry
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class FakeModel:
+    """Deterministic encoder with the SentenceTransformer API used by the manager"""
+    loads = 0
+
+    def __init__(self, model_name):
+        FakeModel.loads += 1
+        self.seed = sum(model_name.encode('utf-8'))
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        vectors = np.array([np.random.default_rng(self.seed + len(text)).standard_normal(8) for text in texts],
+                           dtype=np.float32)
+        return vectors[0] if single else vectors
+
+def test_one_manager_per_model(cache_dir):
+    """
+    Different models get different managers, caches and vectors
+
+    Returns:
+        bool: True if the managers are separate and load lazily
+    """
+    registry = EmbeddingsManagerRegistry(max_resident_models=0, idle_unload_seconds=0, cache_dir=cache_dir)
+    english = registry.get("model-a")
+    hindi = registry.get("model-b")
+    assert registry.get("model-a") is english, "the same model returned a new manager"
+    assert english is not hindi, "two models share one manager"
+    assert not english.is_loaded and not hindi.is_loaded, "a model was loaded before first use"
+    assert english.store.path != hindi.store.path, "two models share one cache file"
+    assert not np.allclose(english.get_embedding("text"), hindi.get_embedding("text")), "two models returned the same vector"
+    print(f"Separate managers and cache files: {english.store.path}, {hindi.store.path}")
+    return True
+
+def test_resident_limit(cache_dir):
+    """
+    Loading a model beyond the limit unloads the least recently used one
+
+    Returns:
+        bool: True if at most max_resident_models stay loaded and evicted models reload on use
+    """
+    registry = EmbeddingsManagerRegistry(max_resident_models=2, idle_unload_seconds=0, cache_dir=cache_dir)
+    for name in ("model-a", "model-b"):
+        registry.get(name).get_embedding(f"first {name}")
+    registry.get("model-a").get_embedding("model-a is used again")
+    registry.get("model-c").get_embedding("first model-c")
+    resident = registry.resident_models()
+    print(f"Resident after loading a third model: {resident}, evictions {registry.evictions}")
+    assert sorted(resident) == ["model-a", "model-c"], "the least recently used model was not unloaded"
+    assert registry.evictions == 1, "wrong number of evictions"
+
+    # A cached text does not need the model, a new one loads it again
+    registry.get("model-b").get_embedding("first model-b")
+    assert not registry.get("model-b").is_loaded, "a cache hit loaded the model"
+    registry.get("model-b").get_embedding("a new text for model-b")
+    assert registry.get("model-b").is_loaded, "an unloaded model was not loaded again"
+    assert len(registry.resident_models()) == 2, "more models loaded than the limit"
+    return True
+
+def test_idle_unloading(cache_dir, idle_seconds=1):
+    """
+    Models unused for idle_unload_seconds are unloaded by the background thread
+
+    Returns:
+        bool: True if the idle model was unloaded
+    """
+    registry = EmbeddingsManagerRegistry(max_resident_models=0, idle_unload_seconds=idle_seconds, cache_dir=cache_dir)
+    manager = registry.get("model-idle")
+    manager.get_embedding("load the model")
+    assert manager.is_loaded, "the model was not loaded"
+    deadline = time.time() + idle_seconds + 5
+    while manager.is_loaded and time.time() < deadline:
+        time.sleep(0.2)
+    registry.close()
+    print(f"Idle model unloaded: {not manager.is_loaded} (idle unloads {registry.idle_unloads})")
+    assert not manager.is_loaded, "the idle model was not unloaded"
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of the registry of embeddings managers')
+    parser.add_argument('--idle-seconds', type=int, default=1, help='Idle time before unloading in the idle test (default: 1)')
+    args = parser.parse_args()
+
+    vector_embeddings_manager.SentenceTransformer = FakeModel
+    cache_dir = tempfile.mkdtemp(prefix="registry_test_")
+    try:
+        success = test_one_manager_per_model(f"{cache_dir}/separate")
+        success = success and test_resident_limit(f"{cache_dir}/limit")
+        success = success and test_idle_unloading(f"{cache_dir}/idle", args.idle_seconds)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print("All registry checks passed" if success else "Registry checks failed")
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Tests of the micro-batcher used to embed concurrent queries together
+Checks that concurrent submissions from threads and from asyncio tasks are grouped
+into batches, that every caller receives its own result, that a lone request is not
+held longer than the window, and that errors reach every caller of the batch
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from micro_batcher import MicroBatcher
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def slow_square(items, delay=0.02):
+    """Batch function with a fixed cost per call, like a model forward pass"""
+    time.sleep(delay)
+    return [item * item for item in items]
+
+def test_threaded_batching(num_callers=64, max_batch_size=16):
+    """Submit from many threads at once: every caller gets its own result, in batches of at most max_batch_size"""
+    batcher = MicroBatcher(slow_square, max_batch_size=max_batch_size, max_wait_ms=5)
+    barrier = threading.Barrier(num_callers)
+
+    def call(value):
+        barrier.wait()
+        return batcher.process(value)
+
+    with ThreadPoolExecutor(max_workers=num_callers) as executor:
+        results = list(executor.map(call, range(num_callers)))
+    stats = batcher.get_stats()
+    batcher.close()
+
+    print(f"{num_callers} threaded callers: {stats['batches']} batches, mean size {stats['mean_batch_size']:.1f}, "
+          f"largest {stats['largest_batch']}")
+    assert results == [value * value for value in range(num_callers)], "callers received wrong results"
+    assert stats["largest_batch"] <= max_batch_size, "a batch exceeded max_batch_size"
+    assert stats["batches"] < num_callers / 2, "concurrent callers were not batched"
+
+def test_async_batching(num_callers=50):
+    """Await results from many asyncio tasks of one event loop, which keeps running while the batch is encoded"""
+    batcher = MicroBatcher(slow_square, max_batch_size=64, max_wait_ms=5)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(batcher.aprocess(value) for value in range(num_callers)))
+        tick_task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    stats = batcher.get_stats()
+    batcher.close()
+
+    print(f"{num_callers} async callers: {stats['batches']} batches, {ticks} event loop ticks while waiting")
+    assert results == [value * value for value in range(num_callers)], "tasks received wrong results"
+    assert stats["batches"] <= 2, "concurrent tasks were not batched"
+    assert ticks > 0, "the event loop was blocked while the batch ran"
+
+def test_lone_request_latency(max_wait_ms=3.0):
+    """A single request is processed after at most the batching window (plus scheduling slack)"""
+    batcher = MicroBatcher(lambda items: items, max_wait_ms=max_wait_ms)
+    batcher.process(0)  # start the thread
+    start = time.perf_counter()
+    batcher.process(1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    batcher.close()
+
+    print(f"Lone request latency: {elapsed_ms:.2f} ms (window {max_wait_ms} ms)")
+    assert elapsed_ms < max_wait_ms + 20, "a lone request waited much longer than the window"
+
+def test_errors_reach_all_callers(num_callers=8):
+    """An exception of the batch function is raised to every caller of the batch, and the batcher keeps working"""
+    def failing(items):
+        if any(item < 0 for item in items):
+            raise ValueError("negative item")
+        return items
+
+    batcher = MicroBatcher(failing, max_wait_ms=20)
+    futures = [batcher.submit(-1)] + [batcher.submit(value) for value in range(num_callers - 1)]
+    errors = 0
+    for future in futures:
+        try:
+            future.result(timeout=5)
+        except ValueError:
+            errors += 1
+    recovered = batcher.process(5, timeout=5)
+    batcher.close()
+
+    print(f"Failing batch: {errors}/{num_callers} callers received the error, next batch returned {recovered}")
+    assert errors == num_callers, "not every caller of the failing batch received the error"
+    assert recovered == 5, "the batcher stopped working after an error"
+
+def test_cancelled_items_not_counted(max_wait_ms=50.0, num_items=4):
+    """Items cancelled before their batch runs count neither as items nor in the mean wait"""
+    batcher = MicroBatcher(lambda items: items, max_wait_ms=max_wait_ms)
+    futures = [batcher.submit(value) for value in range(num_items)]
+    cancelled = sum(future.cancel() for future in futures[:num_items // 2])
+    results = [future.result(timeout=5) for future in futures[cancelled:]]
+    stats = batcher.get_stats()
+    batcher.close()
+
+    print(f"{cancelled} of {num_items} items cancelled: {stats['items']} processed, mean wait {stats['mean_wait_ms']:.1f} ms")
+    assert cancelled == num_items // 2, "the items could not be cancelled before their batch ran"
+    assert results == list(range(cancelled, num_items)), "the remaining items returned wrong results"
+    assert stats["items"] == num_items - cancelled, "cancelled items were counted"
+    assert stats["mean_wait_ms"] < max_wait_ms + 20, "the waits of cancelled items inflated the mean wait"
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of the micro-batcher')
+    parser.add_argument('--callers', type=int, default=64, help='Number of concurrent threaded callers (default: 64)')
+    args = parser.parse_args()
+
+    test_threaded_batching(num_callers=args.callers)
+    test_async_batching()
+    test_lone_request_latency()
+    test_errors_reach_all_callers()
+    test_cancelled_items_not_counted()
+    print("All micro-batching checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
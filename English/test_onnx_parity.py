@@ -0,0 +1,124 @@
+"""
+Parity test of the ONNX Runtime query encoders against torch
+Encodes English and Hindi sample queries with the torch model and with its float32
+and int8 ONNX exports, and checks the cosine similarity of every pair of embeddings
+and that each query keeps its nearest neighbour among the samples
+"""
+
+import os
+import sys
+import logging
+import argparse
+import numpy as np
+from onnx_encoder import DEFAULT_ONNX_DIR, ENCODER_CONFIG_FILE, QUANTIZED_MODEL_FILE, OnnxEncoder, TorchEncoder, export_onnx, get_model_dir
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ENGLISH_QUERIES = [
+    "growing of rice",
+    "manufacture of cotton textiles",
+    "retail sale of mobile phones in specialised stores",
+    "software development and IT consulting services",
+    "construction of roads and railways",
+    "wholesale of agricultural raw materials and live animals",
+    "repair of motor vehicles",
+    "restaurants and mobile food service activities",
+    "manufacture of pharmaceuticals, medicinal chemical and botanical products",
+    "banking",
+]
+
+HINDI_QUERIES = [
+    "धान की खेती",
+    "सूती वस्त्रों का निर्माण",
+    "मोबाइल फोन की खुदरा बिक्री",
+    "सॉफ्टवेयर विकास और आईटी परामर्श सेवाएं",
+    "सड़कों और रेलवे का निर्माण",
+    "मोटर वाहनों की मरम्मत",
+    "रेस्टोरेंट और भोजन सेवा गतिविधियाँ",
+    "दवाइयों का निर्माण",
+    "बैंकिंग",
+    "पशुपालन",
+]
+
+DEFAULT_MODELS = {
+    "all-MiniLM-L6-v2": ENGLISH_QUERIES,
+    "krutrim-ai-labs/Vyakyarth": HINDI_QUERIES,
+}
+
+def cosine_rows(a, b):
+    """Cosine similarity of the matching rows of two matrices"""
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+def nearest_neighbours(embeddings):
+    """Nearest other sample of every sample"""
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argmax(similarity, axis=1)
+
+def test_model_parity(model_name, queries, onnx_dir=None, fp32_threshold=0.9999, int8_threshold=0.99):
+    """
+    Compare the ONNX exports of a model with the torch model
+
+    Args:
+        model_name: Model to test
+        queries: Sample queries in the model's language
+        onnx_dir: Directory of the exported models (exported first if missing)
+        fp32_threshold: Lowest accepted cosine similarity of the float32 export
+        int8_threshold: Lowest accepted cosine similarity of the int8 export
+
+    Returns:
+        bool: True if both exports agree with torch
+    """
+    model_dir = get_model_dir(model_name, onnx_dir)
+    exported = os.path.exists(os.path.join(model_dir, ENCODER_CONFIG_FILE)) and \
+        os.path.exists(os.path.join(model_dir, QUANTIZED_MODEL_FILE))
+    if not exported and not export_onnx(model_name, model_dir, quantize=True):
+        print(f"{model_name}: export failed")
+        return False
+
+    reference = TorchEncoder(model_name).encode(queries)
+    reference_neighbours = nearest_neighbours(reference)
+    success = True
+    for quantized, threshold in ((False, fp32_threshold), (True, int8_threshold)):
+        encoder = OnnxEncoder(model_dir, quantized=quantized)
+        embeddings = encoder.encode(queries)
+        cosines = cosine_rows(reference, embeddings)
+        neighbour_agreement = float(np.mean(nearest_neighbours(embeddings) == reference_neighbours))
+        label = "int8" if quantized else "float32"
+        print(f"{model_name} {label}: min cosine {cosines.min():.6f}, mean {cosines.mean():.6f}, "
+              f"nearest neighbour agreement {neighbour_agreement:.0%}")
+        if cosines.min() < threshold:
+            worst = int(np.argmin(cosines))
+            print(f"  FAILED: cosine {cosines[worst]:.6f} < {threshold} for '{queries[worst]}'")
+            success = False
+        if quantized and neighbour_agreement < 0.9:
+            print("  FAILED: int8 embeddings changed the nearest neighbour of more than one query in ten")
+            success = False
+        elif not quantized and neighbour_agreement < 1.0:
+            print("  FAILED: float32 embeddings changed a nearest neighbour")
+            success = False
+    return success
+
+def main():
+    parser = argparse.ArgumentParser(description='Parity test of the ONNX Runtime query encoders against torch')
+    parser.add_argument('--models', nargs='+', choices=sorted(DEFAULT_MODELS), default=sorted(DEFAULT_MODELS),
+                        help='Models to test (default: both query encoders)')
+    parser.add_argument('--onnx-dir', default=DEFAULT_ONNX_DIR, help=f'Directory of the exported models (default: {DEFAULT_ONNX_DIR})')
+    parser.add_argument('--fp32-threshold', type=float, default=0.9999, help='Lowest cosine of the float32 export (default: 0.9999)')
+    parser.add_argument('--int8-threshold', type=float, default=0.99, help='Lowest cosine of the int8 export (default: 0.99)')
+    args = parser.parse_args()
+
+    success = True
+    for model_name in args.models:
+        success = test_model_parity(model_name, DEFAULT_MODELS[model_name], args.onnx_dir,
+                                    args.fp32_threshold, args.int8_threshold) and success
+    print("ONNX parity checks passed" if success else "ONNX parity checks failed")
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Tests of the search response cache
+Caches a response under the version of the active index generation and checks that it
+is dropped when documents are updated or removed incrementally, and when a rebuild
+swaps in a new generation
+"""
+
+import sys
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+from index_generation import IndexGenerations
+from response_cache import ResponseCache
+from embedding_sidecar import ENGLISH_EMBEDDING_FIELD
+from test_concurrent_search import write_corpus
+from test_index_generations import manager_factory
+
+# Set up logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def cache_search(cache, generations, query):
+    """Search like the /search handler: from the cache, else from the index, caching the result"""
+    key = cache.make_key("query", result_count=5)
+    version = generations.cache_version
+    cached = cache.get(key, version)
+    if cached is not None:
+        return cached, True
+    with generations.acquire() as manager:
+        results = manager.search(query, 5)
+    cache.put(key, version, results)
+    return results, False
+
+def test_deltas_invalidate_cache(tmp_path):
+    """
+    Cached responses are not served after incremental updates, removals or a rebuild
+
+    Args:
+        tmp_path: Temporary directory (pytest fixture)
+    """
+    json_path = write_corpus(str(tmp_path))
+    generations = IndexGenerations(manager_factory("faiss", json_path))
+    manager = generations.active_manager
+    assert manager.build_index(force_rebuild=True), "failed to build the index"
+    cache = ResponseCache(max_entries=16, ttl_seconds=0)
+    query = np.random.default_rng(1).standard_normal(manager.index.d).astype('float32')
+
+    results, cached = cache_search(cache, generations, query)
+    assert not cached and cache_search(cache, generations, query) == (results, True), "the response was not cached"
+
+    # Removing the best match must not leave it in a cached response
+    best_id = results[0][0]
+    assert manager.remove_documents([best_id]) == 1, "the document was not removed"
+    results, cached = cache_search(cache, generations, query)
+    print(f"After removing {best_id}: cached {cached}, best match {results[0][0]}")
+    assert not cached, "a cached response was served after a removal"
+    assert best_id not in [doc_id for doc_id, _ in results], "the removed document was returned"
+
+    # An updated vector changes the best match
+    updated_id = results[-1][0]
+    assert manager.update_documents([{"_id": updated_id, ENGLISH_EMBEDDING_FIELD: query.tolist()}]) == 1
+    results, cached = cache_search(cache, generations, query)
+    assert not cached, "a cached response was served after an update"
+    assert results[0][0] == updated_id, "the updated document is not the best match"
+
+    # So does a new generation
+    cache_search(cache, generations, query)
+    assert generations.start_rebuild().result(timeout=60), "the rebuild failed"
+    _, cached = cache_search(cache, generations, query)
+    assert not cached, "a cached response was served after a rebuild"
+    print(f"Cache invalidations: {cache.get_stats()['invalidations']}")
+    generations.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Tests of the search response cache')
+    parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="response_cache_test_")
+    try:
+        test_deltas_invalidate_cache(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print("All response cache checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
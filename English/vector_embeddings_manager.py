@@ -3,39 +3,91 @@ Vector Embeddings Manager for the NIC Codes Semantic Search Application
 Handles generation, caching, and optimization of text embeddings
 """
 
+import gc
 import numpy as np
 import os
-import pickle
 import time
+import threading
 import hashlib
 from typing import List, Dict, Any, Union, Optional
 import logging
 from sentence_transformers import SentenceTransformer
 from functools import lru_cache
+from embedding_store import LEGACY_PICKLE_SUFFIX, EmbeddingStore, get_store_path
+from embedding_cache import EmbeddingCache, get_cache_config
+from micro_batcher import MicroBatcher, get_batching_config
+from async_executor import BoundedExecutor, get_search_executor
+from onnx_encoder import get_embedding_backend, get_encoder_info, get_onnx_encoder, use_quantized_model
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Models whose weights stay loaded at once (0: no limit), and seconds of inactivity
+# after which a model is unloaded (0: never)
+DEFAULT_MAX_RESIDENT_MODELS = 2
+DEFAULT_IDLE_UNLOAD_SECONDS = 0
+
+def get_registry_config() -> Dict[str, int]:
+    """
+    Get the model registry configuration from the environment
+
+    EMBEDDING_MAX_MODELS limits the models kept loaded at once and
+    EMBEDDING_IDLE_UNLOAD_SECONDS unloads models unused for that long.
+
+    Returns:
+        Dictionary with max_resident_models and idle_unload_seconds
+    """
+    return {
+        "max_resident_models": int(os.environ.get("EMBEDDING_MAX_MODELS", DEFAULT_MAX_RESIDENT_MODELS)),
+        "idle_unload_seconds": int(os.environ.get("EMBEDDING_IDLE_UNLOAD_SECONDS", DEFAULT_IDLE_UNLOAD_SECONDS))
+    }
+
 class VectorEmbeddingsManager:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache_dir: str = 'embedding_cache'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache_dir: str = 'embedding_cache',
+                 cache_policy: Optional[str] = None, cache_max_bytes: Optional[int] = None,
+                 cache_max_entries: Optional[int] = None, backend: Optional[str] = None):
         """
         Initialize the embeddings manager with model and caching
         
         Args:
             model_name: The sentence-transformers model to use
             cache_dir: Directory to store embedding cache
+            cache_policy: Eviction policy of the in-memory cache, "lru", "lfu" or "tinylfu"
+                          (default: EMBEDDING_CACHE_POLICY)
+            cache_max_bytes: Memory budget of the in-memory cache (default: EMBEDDING_CACHE_MB)
+            cache_max_entries: Maximum entries of the in-memory cache (default: EMBEDDING_CACHE_SIZE)
+            backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, int8 unless
+                     ONNX_QUANTIZE=false) (default: EMBEDDING_BACKEND)
         """
         self.model_name = model_name
         self.cache_dir = cache_dir
+        self.backend = backend or get_embedding_backend()
+        # Expected until the model loads; then set from the encoder that actually loaded
+        self.quantized = self.backend == "onnx" and use_quantized_model()
         self._model = None  # Lazy loading
+        self._model_lock = threading.Lock()
+        self.last_used = time.time()
+        # Called with the manager after its model is loaded (set by EmbeddingsManagerRegistry)
+        self.on_model_load = None
         
         # Ensure cache directory exists
         os.makedirs(cache_dir, exist_ok=True)
         
-        # Load cache from disk
-        self.cache_file = os.path.join(cache_dir, f"{model_name.replace('/', '_')}_cache.pkl")
-        self.embedding_cache = self._load_cache()
+        # Bounded cache of the embeddings used by this process, backed by the persistent
+        # store shared by all workers
+        cache_config = get_cache_config()
+        self.embedding_cache = EmbeddingCache(
+            max_bytes=cache_max_bytes or cache_config["max_bytes"],
+            max_entries=cache_max_entries or cache_config["max_entries"],
+            policy=cache_policy or cache_config["policy"]
+        )
+        self.store = self._open_store()
+        
+        # Concurrent single-text requests are embedded together (see micro_batcher.py)
+        self.batching = get_batching_config()
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
         
         # Stats
         self.cache_hits = 0
@@ -47,38 +99,108 @@ class VectorEmbeddingsManager:
     @property
     def model(self):
         """Lazy load the model only when needed"""
-        if self._model is None:
-            start_time = time.time()
-            logger.info(f"Loading embedding model '{self.model_name}'...")
-            self._model = SentenceTransformer(self.model_name)
-            logger.info(f"Model loaded in {time.time() - start_time:.2f} seconds")
-        return self._model
+        self.last_used = time.time()
+        model = self._model
+        if model is None:
+            loaded = False
+            with self._model_lock:
+                if self._model is None:
+                    start_time = time.time()
+                    logger.info(f"Loading embedding model '{self.model_name}' ({self.backend})...")
+                    if self.backend == "onnx":
+                        self._model = get_onnx_encoder(self.model_name)
+                    else:
+                        self._model = SentenceTransformer(self.model_name)
+                    logger.info(f"Model loaded in {time.time() - start_time:.2f} seconds")
+                    # The ONNX encoder falls back to float32 without an int8 model, whose
+                    # embeddings belong in the float store
+                    quantized = bool(getattr(self._model, "quantized", False))
+                    if quantized != self.quantized:
+                        self.quantized = quantized
+                        self._reopen_store()
+                    loaded = True
+                # Kept in a local so that a concurrent unload_model cannot hand out None
+                model = self._model
+            if loaded and self.on_model_load is not None:
+                self.on_model_load(self)
+        return model
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the model weights are in memory"""
+        return self._model is not None
+    
+    def unload_model(self) -> bool:
+        """
+        Release the model weights; the embedding caches are kept and the model is
+        loaded again on next use
+        
+        Returns:
+            bool: True if a loaded model was released
+        """
+        with self._model_lock:
+            if self._model is None:
+                return False
+            self._model = None
+        # Encodes already running keep their reference; the weights are freed when they finish
+        gc.collect()
+        logger.info(f"Unloaded embedding model '{self.model_name}'")
+        return True
     
     def _get_cache_key(self, text: str) -> str:
         """Generate a unique cache key for text"""
         return hashlib.md5(text.encode('utf-8')).hexdigest()
     
-    def _load_cache(self) -> Dict[str, np.ndarray]:
-        """Load embedding cache from disk"""
+    def _open_store(self) -> Optional[EmbeddingStore]:
+        """
+        Open the persistent embedding store of the current model
+        
+        A pickled cache left by earlier versions is imported into the float store once.
+        
+        Returns:
+            EmbeddingStore, or None if it cannot be opened (embeddings are then only cached in memory)
+        """
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'rb') as f:
-                    cache = pickle.load(f)
-                logger.info(f"Loaded embedding cache with {len(cache)} entries")
-                return cache
+            # int8 embeddings differ slightly from the float ones and are stored apart
+            store_name = f"{self.model_name}.int8" if self.quantized else self.model_name
+            store = EmbeddingStore(get_store_path(self.cache_dir, store_name))
+            # The pickle holds embeddings of the float torch encoder; the int8 store leaves it
+            # in place for the float store
+            if not self.quantized:
+                store.migrate_pickle(os.path.join(self.cache_dir, f"{self.model_name.replace('/', '_')}{LEGACY_PICKLE_SUFFIX}"))
+            return store
         except Exception as e:
-            logger.warning(f"Error loading embedding cache: {str(e)}")
-        
-        return {}
+            logger.warning(f"Error opening embedding store: {str(e)}")
+            return None
+    
+    def _reopen_store(self) -> None:
+        """Switch to the store of the current model and encoder, dropping the embeddings cached in memory"""
+        if self.store is not None:
+            self.store.close()
+        self.embedding_cache.clear()
+        self.store = self._open_store()
+        logger.info(f"Using the {'int8' if self.quantized else 'float'} embedding store of '{self.model_name}'")
     
-    def _save_cache(self) -> None:
-        """Save embedding cache to disk"""
+    def _lookup(self, cache_key: str) -> Optional[np.ndarray]:
+        """Look up an embedding in memory, then in the persistent store"""
+        embedding = self.embedding_cache.get(cache_key)
+        if embedding is None and self.store is not None:
+            try:
+                embedding = self.store.get(cache_key)
+            except Exception as e:
+                logger.warning(f"Error reading embedding store: {str(e)}")
+            if embedding is not None:
+                self.embedding_cache.put(cache_key, embedding)
+        return embedding
+    
+    def _persist(self, items: List[tuple]) -> None:
+        """Append new (cache key, embedding) pairs to the persistent store"""
+        if self.store is None or not items:
+            return
         try:
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(self.embedding_cache, f)
-            logger.info(f"Saved {len(self.embedding_cache)} entries to embedding cache")
+            self.store.put_many(items)
         except Exception as e:
-            logger.warning(f"Error saving embedding cache: {str(e)}")
+            logger.warning(f"Error writing embedding store: {str(e)}")
     
     def get_embedding(self, text: str) -> np.ndarray:
         """
@@ -100,9 +222,10 @@ class VectorEmbeddingsManager:
         
         # Check cache
         cache_key = self._get_cache_key(text)
-        if cache_key in self.embedding_cache:
+        embedding = self._lookup(cache_key)
+        if embedding is not None:
             self.cache_hits += 1
-            return self.embedding_cache[cache_key]
+            return embedding
         
         # Cache miss - generate embedding
         self.cache_misses += 1
@@ -110,15 +233,106 @@ class VectorEmbeddingsManager:
         embedding = self.model.encode(text, show_progress_bar=False, convert_to_numpy=True)
         self.total_embedding_time += time.time() - start_time
         
-        # Update cache
-        self.embedding_cache[cache_key] = embedding
-        
-        # Periodically save cache to disk (every 100 new embeddings)
-        if self.cache_misses % 100 == 0:
-            self._save_cache()
+        # Update cache; the store appends the single new entry
+        self.embedding_cache.put(cache_key, embedding)
+        self._persist([(cache_key, embedding)])
         
         return embedding
     
+    def _get_batcher(self) -> MicroBatcher:
+        """Get the micro-batcher of this manager, creating it on first use"""
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(
+                        lambda texts: self._encode_and_cache(texts, batch_size=len(texts)),
+                        max_batch_size=self.batching["max_batch_size"],
+                        max_wait_ms=self.batching["max_wait_ms"],
+                        name=f"embedding-batcher-{self.model_name}"
+                    )
+        return self._batcher
+    
+    def get_embedding_batched(self, text: str) -> np.ndarray:
+        """
+        Get the embedding of a single text, encoding cache misses together with
+        those of concurrent callers in one batched model.encode call
+        
+        Blocks the calling thread until the embedding is ready (threaded Flask handlers).
+        
+        Args:
+            text: Text to generate embedding for
+            
+        Returns:
+            numpy array of embedding vector
+        """
+        if not self.batching["enabled"] or not text or not isinstance(text, str):
+            return self.get_embedding(text)
+        embedding = self._lookup(self._get_cache_key(text))
+        if embedding is not None:
+            self.cache_hits += 1
+            return embedding
+        return self._get_batcher().process(text)
+    
+    async def aget_embedding(self, text: str, executor: Optional[BoundedExecutor] = None) -> np.ndarray:
+        """
+        Get the embedding of a single text without blocking the event loop
+        
+        Cache hits are answered directly. Cache misses are micro-batched like in
+        get_embedding_batched, or computed on the executor with micro-batching disabled;
+        either way they count against the executor's limit of pending requests.
+        
+        Args:
+            text: Text to generate embedding for
+            executor: Executor bounding the pending requests (default: get_search_executor())
+            
+        Returns:
+            numpy array of embedding vector
+            
+        Raises:
+            ExecutorSaturatedError: If the executor already holds its maximum of pending requests
+        """
+        executor = executor or get_search_executor()
+        if not self.batching["enabled"] or not text or not isinstance(text, str):
+            return await executor.run(self.get_embedding, text)
+        embedding = self._lookup(self._get_cache_key(text))
+        if embedding is not None:
+            self.cache_hits += 1
+            return embedding
+        batcher = self._get_batcher()
+        return await executor.track(lambda: batcher.submit(text))
+    
+    def _encode_and_cache(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """
+        Encode texts missing from the cache and add them to the cache and the store
+        
+        Args:
+            texts: Valid texts (duplicates are encoded once)
+            batch_size: Size of batches for processing
+            
+        Returns:
+            List of numpy arrays with embeddings, in the order of texts
+        """
+        self.cache_misses += len(texts)
+        unique_texts = list(dict.fromkeys(texts))
+        encoded = {}
+        new_entries = []
+        for i in range(0, len(unique_texts), batch_size):
+            batch_texts = unique_texts[i:i+batch_size]
+            
+            start_time = time.time()
+            batch_embeddings = self.model.encode(batch_texts, show_progress_bar=False, convert_to_numpy=True)
+            self.total_embedding_time += time.time() - start_time
+            
+            for text, embedding in zip(batch_texts, batch_embeddings):
+                cache_key = self._get_cache_key(text)
+                encoded[text] = embedding
+                self.embedding_cache.put(cache_key, embedding)
+                new_entries.append((cache_key, embedding))
+        
+        # Append the new embeddings to the store in one transaction
+        self._persist(new_entries)
+        return [encoded[text] for text in texts]
+    
     def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
         """
         Get embeddings for a batch of texts with efficient batching and caching
@@ -134,7 +348,26 @@ class VectorEmbeddingsManager:
         texts_to_embed = []
         indices_to_embed = []
         
-        # Check cache first for all texts
+        # Check the in-memory cache first, then read the entries missing there from the store at once
+        cached = {}
+        for text in texts:
+            if text and isinstance(text, str):
+                cache_key = self._get_cache_key(text)
+                if cache_key not in cached:
+                    embedding = self.embedding_cache.get(cache_key)
+                    if embedding is not None:
+                        cached[cache_key] = embedding
+        if self.store is not None:
+            missing_keys = [self._get_cache_key(text) for text in texts
+                            if text and isinstance(text, str) and self._get_cache_key(text) not in cached]
+            if missing_keys:
+                try:
+                    for cache_key, embedding in self.store.get_many(missing_keys).items():
+                        cached[cache_key] = embedding
+                        self.embedding_cache.put(cache_key, embedding)
+                except Exception as e:
+                    logger.warning(f"Error reading embedding store: {str(e)}")
+        
         for i, text in enumerate(texts):
             if not text or not isinstance(text, str):
                 # Handle invalid inputs
@@ -145,9 +378,9 @@ class VectorEmbeddingsManager:
                 continue
                 
             cache_key = self._get_cache_key(text)
-            if cache_key in self.embedding_cache:
+            if cache_key in cached:
                 self.cache_hits += 1
-                results.append(self.embedding_cache[cache_key])
+                results.append(cached[cache_key])
             else:
                 # Mark for embedding
                 results.append(None)  # Placeholder
@@ -156,32 +389,26 @@ class VectorEmbeddingsManager:
         
         # Process texts not in cache in batches
         if texts_to_embed:
-            self.cache_misses += len(texts_to_embed)
-            
-            # Process in batches for efficiency
-            for i in range(0, len(texts_to_embed), batch_size):
-                batch_texts = texts_to_embed[i:i+batch_size]
-                batch_indices = indices_to_embed[i:i+batch_size]
-                
-                start_time = time.time()
-                batch_embeddings = self.model.encode(batch_texts, show_progress_bar=False, convert_to_numpy=True)
-                self.total_embedding_time += time.time() - start_time
-                
-                # Update results and cache
-                for j, (idx, embedding) in enumerate(zip(batch_indices, batch_embeddings)):
-                    results[idx] = embedding
-                    cache_key = self._get_cache_key(texts_to_embed[i+j])
-                    self.embedding_cache[cache_key] = embedding
-            
-            # Save cache if we processed new embeddings
-            self._save_cache()
+            for idx, embedding in zip(indices_to_embed, self._encode_and_cache(texts_to_embed, batch_size)):
+                results[idx] = embedding
         
         return results
     
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the embedding cache and performance"""
+        store_stats = {}
+        if self.store is not None:
+            try:
+                store_stats = self.store.get_stats()
+            except Exception as e:
+                logger.warning(f"Error reading embedding store stats: {str(e)}")
         return {
             "cache_size": len(self.embedding_cache),
+            "store_size": store_stats.get("entries"),
+            "store_bytes": store_stats.get("file_bytes"),
+            "memory_cache": self.embedding_cache.get_stats(),
+            "encoder": get_encoder_info(self._model) if self._model is not None else {"backend": self.backend},
+            "micro_batching": self._batcher.get_stats() if self._batcher is not None else None,
             "cache_hits": self.cache_hits,
             "cache_misses": self.cache_misses,
             "hit_rate": self.cache_hits / max(1, self.cache_hits + self.cache_misses),
@@ -190,16 +417,19 @@ class VectorEmbeddingsManager:
         }
     
     def clear_cache(self) -> None:
-        """Clear the embedding cache"""
-        self.embedding_cache = {}
-        if os.path.exists(self.cache_file):
-            os.remove(self.cache_file)
+        """Clear the embedding cache, including the persistent store shared with other workers"""
+        self.embedding_cache.clear()
+        if self.store is not None:
+            self.store.clear()
         logger.info("Embedding cache cleared")
     
     def change_model(self, new_model_name: str) -> bool:
         """
         Change the embedding model
         
+        Managers of the registry serve one model each; use get_embeddings_manager(model_name)
+        to embed with another model instead.
+        
         Args:
             new_model_name: Name of the new model to use
             
@@ -207,17 +437,15 @@ class VectorEmbeddingsManager:
             bool: True if model changed successfully, False otherwise
         """
         try:
-            # Save current cache if different model
+            # Switch to the store of the new model; new entries are already persisted
             if new_model_name != self.model_name:
-                self._save_cache()
-                
-                # Update model name and path
+                # Update model name
                 self.model_name = new_model_name
-                self.cache_file = os.path.join(self.cache_dir, f"{new_model_name.replace('/', '_')}_cache.pkl")
                 
-                # Unload current model and load new cache
+                # Unload current model and open the new store
                 self._model = None
-                self.embedding_cache = self._load_cache()
+                self.quantized = self.backend == "onnx" and use_quantized_model()
+                self._reopen_store()
                 
                 # Reset stats
                 self.cache_hits = 0
@@ -231,15 +459,160 @@ class VectorEmbeddingsManager:
             logger.error(f"Error changing model: {str(e)}")
             return False
 
-# Singleton instance for application-wide use
-embeddings_manager = None
+class EmbeddingsManagerRegistry:
+    """
+    One embeddings manager per model, with a bound on the models kept in memory
+    
+    Managers are created on first request and load their model lazily. When a model is
+    loaded and more than max_resident_models would be in memory, the least recently used
+    other model is unloaded. A background thread unloads models unused for
+    idle_unload_seconds. Unloading only drops the weights: each manager keeps its
+    in-memory cache and its own persistent store (embedding_cache/<model>_cache.sqlite3).
+    """
+    
+    def __init__(self, max_resident_models: Optional[int] = None, idle_unload_seconds: Optional[int] = None,
+                 cache_dir: str = 'embedding_cache'):
+        """
+        Initialize the registry
+        
+        Args:
+            max_resident_models: Models kept loaded at once, 0 for no limit (default: EMBEDDING_MAX_MODELS)
+            idle_unload_seconds: Unload models unused for this long, 0 to never (default: EMBEDDING_IDLE_UNLOAD_SECONDS)
+            cache_dir: Directory of the embedding caches of all models
+        """
+        config = get_registry_config()
+        self.max_resident_models = config["max_resident_models"] if max_resident_models is None else max_resident_models
+        self.idle_unload_seconds = config["idle_unload_seconds"] if idle_unload_seconds is None else idle_unload_seconds
+        self.cache_dir = cache_dir
+        self.managers: Dict[str, VectorEmbeddingsManager] = {}
+        self._lock = threading.RLock()
+        self._reaper = None
+        self._stop = threading.Event()
+        
+        # Stats
+        self.evictions = 0
+        self.idle_unloads = 0
+    
+    def get(self, model_name: str) -> VectorEmbeddingsManager:
+        """
+        Get the manager of a model, creating it on first request
+        
+        Args:
+            model_name: Name of the embedding model
+            
+        Returns:
+            VectorEmbeddingsManager of the model (its model is loaded on first use)
+        """
+        with self._lock:
+            manager = self.managers.get(model_name)
+            if manager is None:
+                manager = VectorEmbeddingsManager(model_name=model_name, cache_dir=self.cache_dir)
+                manager.on_model_load = self._on_model_load
+                self.managers[model_name] = manager
+                self._start_reaper()
+            return manager
+    
+    def resident_models(self) -> List[str]:
+        """Names of the models whose weights are loaded, least recently used first"""
+        with self._lock:
+            resident = sorted((m for m in self.managers.values() if m.is_loaded), key=lambda m: m.last_used)
+        return [manager.model_name for manager in resident]
+    
+    def _on_model_load(self, loaded_manager: VectorEmbeddingsManager) -> None:
+        """Unload the least recently used other models beyond the resident limit"""
+        if self.max_resident_models <= 0:
+            return
+        with self._lock:
+            others = sorted((m for m in self.managers.values() if m is not loaded_manager and m.is_loaded),
+                            key=lambda m: m.last_used)
+            excess = len(others) - (self.max_resident_models - 1)
+            for manager in others[:max(0, excess)]:
+                if manager.unload_model():
+                    self.evictions += 1
+                    logger.info(f"Unloaded '{manager.model_name}' to keep {self.max_resident_models} models loaded")
+    
+    def unload_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """
+        Unload the models that were not used recently
+        
+        Args:
+            idle_seconds: Inactivity after which a model is unloaded (default: idle_unload_seconds)
+            
+        Returns:
+            int: Number of models unloaded
+        """
+        idle_seconds = self.idle_unload_seconds if idle_seconds is None else idle_seconds
+        cutoff = time.time() - idle_seconds
+        unloaded = 0
+        with self._lock:
+            for manager in list(self.managers.values()):
+                if manager.is_loaded and manager.last_used < cutoff and manager.unload_model():
+                    unloaded += 1
+                    logger.info(f"Unloaded '{manager.model_name}' after {idle_seconds}s without use")
+            self.idle_unloads += unloaded
+        return unloaded
+    
+    def _start_reaper(self) -> None:
+        """Start the idle unloading thread once, if enabled"""
+        if self.idle_unload_seconds > 0 and self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, name="embedding-model-reaper", daemon=True)
+            self._reaper.start()
+    
+    def _reap(self) -> None:
+        """Check for idle models until closed"""
+        interval = min(60.0, max(1.0, self.idle_unload_seconds / 4))
+        while not self._stop.wait(interval):
+            try:
+                self.unload_idle()
+            except Exception as e:
+                logger.error(f"Error unloading idle models: {str(e)}")
+    
+    def clear_caches(self) -> None:
+        """Clear the embedding caches of every model"""
+        with self._lock:
+            for manager in self.managers.values():
+                manager.clear_cache()
+    
+    def close(self) -> None:
+        """Stop the idle unloading thread"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the registered and loaded models and the number of unloads"""
+        now = time.time()
+        with self._lock:
+            models = {
+                name: {"loaded": manager.is_loaded, "idle_seconds": round(now - manager.last_used, 1)}
+                for name, manager in self.managers.items()
+            }
+        return {
+            "models": models,
+            "resident_models": self.resident_models(),
+            "max_resident_models": self.max_resident_models,
+            "idle_unload_seconds": self.idle_unload_seconds,
+            "evictions": self.evictions,
+            "idle_unloads": self.idle_unloads
+        }
+
+# Registry instance for application-wide use
+manager_registry = None
+_registry_lock = threading.Lock()
+
+def get_manager_registry() -> EmbeddingsManagerRegistry:
+    """Get the application-wide registry of embeddings managers"""
+    global manager_registry
+    if manager_registry is None:
+        with _registry_lock:
+            if manager_registry is None:
+                manager_registry = EmbeddingsManagerRegistry()
+    return manager_registry
 
 def get_embeddings_manager(model_name: str = 'all-MiniLM-L6-v2') -> VectorEmbeddingsManager:
-    """Get the singleton instance of the embeddings manager"""
-    global embeddings_manager
-    if embeddings_manager is None:
-        embeddings_manager = VectorEmbeddingsManager(model_name=model_name)
-    return embeddings_manager
+    """Get the embeddings manager of a model (one shared instance per model)"""
+    return get_manager_registry().get(model_name)
 
 # Cached version of get_embedding for repeated queries
 @lru_cache(maxsize=1024)
@@ -0,0 +1,88 @@
+"""
+Learned dimensionality-reduction transforms for FAISS indexes
+Wraps an index in a faiss.IndexPreTransform so that vectors are projected to a lower
+dimension before they are stored, and queries are projected automatically at search
+time. The transform is part of the index and is saved and loaded with it.
+"""
+import numpy as np
+import faiss
+from typing import Optional
+
+# pca: principal component projection, works with every index type
+# opq: rotation (and optional reduction) learned to minimize the PQ error, for ivf_pq indexes
+TRANSFORM_TYPES = ("pca", "opq")
+
+def create_transform(transform_type: str, dimension: int, output_dim: int, pq_m: Optional[int] = None) -> faiss.VectorTransform:
+    """
+    Create an untrained transform
+
+    Args:
+        transform_type: "pca" or "opq"
+        dimension: Dimension of the input vectors
+        output_dim: Dimension of the transformed vectors
+        pq_m: Number of PQ sub-quantizers (opq only, must divide output_dim)
+
+    Returns:
+        faiss.VectorTransform instance
+    """
+    if transform_type not in TRANSFORM_TYPES:
+        raise ValueError(f"Unknown transform {transform_type}, expected one of {', '.join(TRANSFORM_TYPES)}")
+    if not 0 < output_dim <= dimension:
+        raise ValueError(f"Transform dimension {output_dim} must be between 1 and {dimension}")
+    if transform_type == "opq":
+        return faiss.OPQMatrix(dimension, int(pq_m), output_dim)
+    return faiss.PCAMatrix(dimension, output_dim)
+
+def train_transform(transform: faiss.VectorTransform, training_sample: np.ndarray) -> None:
+    """
+    Train a transform on a sample of the (normalized) vectors
+
+    PCA subtracts the mean of its training vectors, which would distort inner products.
+    It is therefore trained on the sample together with its negation: that set has a
+    zero mean, so the PCA finds the directions of largest uncentered energy and the
+    transform is a plain orthogonal projection. The inner product of two projected
+    vectors then approximates their cosine similarity.
+
+    Args:
+        transform: Transform created by create_transform
+        training_sample: Float32 training vectors
+    """
+    transform = faiss.downcast_VectorTransform(transform)
+    if isinstance(transform, faiss.PCAMatrix):
+        transform.train(np.concatenate([training_sample, -training_sample]))
+        # Clear the rounding residue of the (zero) mean
+        faiss.copy_array_to_vector(np.zeros(transform.d_out, dtype='float32'), transform.b)
+    else:
+        transform.train(training_sample)
+
+def get_transform(index: faiss.Index) -> Optional[faiss.VectorTransform]:
+    """
+    Get the transform of an index, looking through an IndexIDMap
+
+    Args:
+        index: FAISS index
+
+    Returns:
+        The first transform of the index, or None if it has none
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform) and index.chain.size() > 0:
+        return faiss.downcast_VectorTransform(index.chain.at(0))
+    return None
+
+def train_index(index: faiss.Index, training_sample: np.ndarray) -> None:
+    """
+    Train an index and its transform, if any
+
+    Args:
+        index: Untrained FAISS index, optionally an IndexPreTransform
+        training_sample: Float32 training vectors of the input dimension
+    """
+    transform = get_transform(index)
+    if transform is not None and not transform.is_trained:
+        train_transform(transform, training_sample)
+    if not index.is_trained:
+        # IndexPreTransform skips trained transforms and trains the index on the projected sample
+        index.train(training_sample)